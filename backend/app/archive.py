@@ -0,0 +1,229 @@
+"""Retention for the audit log: old events move to compressed segment files.
+
+``auditevent`` holds the hot range. Events older than
+``audit_retention_days`` are claimed with ``DELETE ... RETURNING`` (so two
+workers never archive the same rows), grouped by month and written as
+gzip NDJSON segments under ``<archive dir>/<YYYY-MM>/`` (each tenant has
+its own archive dir, ``<archive dir>/tenants/<slug>``). Segments are never
+rewritten; each one has a row in ``auditsegment`` with its id and time
+range, and ``auditsegmentkey`` lists the entities, actions and users it
+holds. That is all a query reads to decide whether the file is needed.
+
+``audit_page`` pages over both: the hot page comes from the table and only
+segments whose time range can still reach that page, and whose keys match
+the filters, are opened.
+"""
+import gzip
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby
+from pathlib import Path
+from uuid import uuid4
+import orjson
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+from .config import settings
+from .db import current_tenant, engine
+from .models import AuditEvent, AuditSegment, AuditSegmentKey
+from .pagination import decode_cursor, encode_cursor, paginate
+from .serialization import columns
+from .uploads import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(settings.audit_archive_dir) if settings.audit_archive_dir else BASE_DIR / "audit_archive"
+
+# Filters answered by ``auditsegmentkey``; entity_id is only ever narrowed by entity.
+KEYS = ("entity", "action", "user_id")
+
+
+def archive_dir(tenant: str | None = None) -> Path:
+    return ARCHIVE_DIR if tenant is None else ARCHIVE_DIR / "tenants" / tenant
+
+
+def read_segment(path: str) -> tuple[dict, ...]:
+    """Rows of the segment at ``path``, in the current tenant's archive."""
+    full = str(archive_dir(current_tenant.get()) / path)
+    try:
+        return _read_file(full)
+    except FileNotFoundError:
+        # Not cached, so a segment restored from backup is found again.
+        logger.warning("Segmento de auditoria ausente: %s", full)
+        return ()
+
+
+@lru_cache(maxsize=8)
+def _read_file(path: str) -> tuple[dict, ...]:
+    with gzip.open(path, "rb") as fh:
+        rows = [orjson.loads(line) for line in fh]
+    for row in rows:
+        row["happened_at"] = datetime.fromisoformat(row["happened_at"])
+    return tuple(rows)
+
+
+def _key(row: dict) -> tuple:
+    return row["happened_at"], row["id"]
+
+
+def segment_keys(segment_id: int, rows) -> list[dict]:
+    """``auditsegmentkey`` rows for a segment holding ``rows``."""
+    values = {(name, str(row[name])) for row in rows for name in KEYS if row[name] is not None}
+    return [{"segment_id": segment_id, "name": name, "value": value} for name, value in sorted(values)]
+
+
+def audit_page(
+    session: Session,
+    *,
+    cursor: str | None,
+    limit: int,
+    entity: str | None = None,
+    entity_id: int | None = None,
+    user_id: int | None = None,
+    action: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+) -> dict:
+    """Newest-first keyset page of audit events from the table and the archive."""
+    equal = {name: value for name, value in (("entity", entity), ("entity_id", entity_id), ("user_id", user_id), ("action", action)) if value is not None}
+    q = select(*columns(AuditEvent)).where(*(getattr(AuditEvent, name) == value for name, value in equal.items()))
+    if date_from is not None:
+        q = q.where(AuditEvent.happened_at >= date_from)
+    if date_to is not None:
+        q = q.where(AuditEvent.happened_at < date_to)
+    page = paginate(session, q, AuditEvent, cursor=cursor, limit=limit, sort=AuditEvent.happened_at, descending=True)
+    items = page["items"]
+    after = decode_cursor(cursor, AuditEvent.happened_at) if cursor else None
+
+    segments = select(AuditSegment).order_by(AuditSegment.last_at.desc(), AuditSegment.id.desc())
+    if page["next_cursor"]:
+        # The table has more rows, so archived rows can only enter this page if
+        # they are newer than its last row. Without a cursor the table is
+        # exhausted and the archive continues the listing.
+        segments = segments.where(AuditSegment.last_at >= items[-1]["happened_at"])
+    for name in KEYS:
+        if name in equal:
+            keys = select(AuditSegmentKey.segment_id).where(AuditSegmentKey.name == name, AuditSegmentKey.value == str(equal[name]))
+            segments = segments.where(AuditSegment.id.in_(keys))
+    if date_from is not None:
+        segments = segments.where(AuditSegment.last_at >= date_from)
+    if date_to is not None:
+        segments = segments.where(AuditSegment.first_at < date_to)
+    if after is not None:
+        segments = segments.where(AuditSegment.first_at <= after[0])
+
+    def match(row: dict) -> bool:
+        if any(row[name] != value for name, value in equal.items()):
+            return False
+        if date_from is not None and row["happened_at"] < date_from:
+            return False
+        if date_to is not None and row["happened_at"] >= date_to:
+            return False
+        return after is None or _key(row) < after
+
+    merged = items
+    for segment in session.exec(segments).all():
+        if len(merged) > limit and segment.last_at < merged[limit]["happened_at"]:
+            break
+        rows = [row for row in read_segment(segment.path) if match(row)]
+        if rows:
+            merged = sorted(merged + rows, key=_key, reverse=True)[: limit + 1]
+    if not (len(merged) > limit or page["next_cursor"]):
+        return {"items": merged, "next_cursor": None}
+    merged = merged[:limit]
+    return {"items": merged, "next_cursor": encode_cursor(merged[-1]["happened_at"], merged[-1]["id"])}
+
+
+class AuditArchiver:
+    """Background thread that moves expired audit events to segment files."""
+
+    def __init__(self, bind, directory: Path, retention_days: int, segment_rows: int = 10000, interval: float = 86400.0):
+        self.bind = bind
+        self.directory = directory
+        self.retention_days = retention_days
+        self.segment_rows = segment_rows
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def archive(self, now: datetime | None = None) -> int:
+        """Archive every event older than the retention; returns how many were moved."""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.retention_days)
+        total = 0
+        while True:
+            moved = self._archive_batch(cutoff)
+            total += moved
+            if moved < self.segment_rows:
+                return total
+
+    def _write(self, month: str, rows: list[dict]) -> AuditSegment:
+        ids = [row["id"] for row in rows]
+        path = f"{month}/{min(ids)}-{max(ids)}.ndjson.gz"
+        target = self.directory / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{uuid4().hex}.tmp")
+        with gzip.open(tmp, "wb") as fh:
+            for row in rows:
+                fh.write(orjson.dumps(row) + b"\n")
+        tmp.replace(target)
+        return AuditSegment(
+            month=month, path=path, first_id=min(ids), last_id=max(ids), first_at=rows[0]["happened_at"], last_at=rows[-1]["happened_at"], rows=len(rows), size=target.stat().st_size
+        )
+
+    def _archive_batch(self, cutoff: datetime) -> int:
+        written: list[Path] = []
+        with Session(self.bind) as session:
+            expired = select(AuditEvent.id).where(AuditEvent.happened_at < cutoff).order_by(AuditEvent.id).limit(self.segment_rows)
+            claimed = session.exec(
+                delete(AuditEvent).where(AuditEvent.id.in_(expired)).returning(*columns(AuditEvent)).execution_options(synchronize_session=False)
+            ).all()
+            if not claimed:
+                return 0
+            # The rows stay deleted only if every segment is written and indexed.
+            try:
+                rows = sorted((row._asdict() for row in claimed), key=_key)
+                for month, group in groupby(rows, key=lambda row: row["happened_at"].strftime("%Y-%m")):
+                    group = list(group)
+                    segment = self._write(month, group)
+                    written.append(self.directory / segment.path)
+                    session.add(segment)
+                    session.flush()
+                    session.exec(insert(AuditSegmentKey), params=segment_keys(segment.id, group))
+                session.commit()
+            except BaseException:
+                session.rollback()
+                for path in written:
+                    path.unlink(missing_ok=True)
+                raise
+        return len(claimed)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                moved = self.archive()
+                if moved:
+                    logger.info("%d eventos de auditoria arquivados", moved)
+            except Exception:
+                logger.exception("Falha ao arquivar eventos de auditoria")
+            self._stopping.wait(self.interval)
+
+
+audit_archiver = AuditArchiver(engine, ARCHIVE_DIR, settings.audit_retention_days, settings.audit_segment_rows, settings.audit_archive_interval)
+
+
+if __name__ == "__main__":
+    print(f"archived {audit_archiver.archive()} events to {ARCHIVE_DIR}")
@@ -0,0 +1,222 @@
+"""Automatic assignment of coverages to guards.
+
+Each process keeps a load index of active ``funcionario`` users: open
+coverages, open tickets assigned to them and rounds of the last
+``assignment_round_hours`` hours, weighted by ``WEIGHTS``. Committed ORM
+writes to those tables adjust the index in place; statement writes (bulk
+UPDATEs, imports) and user changes make it reload, and it is reloaded at
+least every ``assignment_index_ttl`` seconds so writes from other workers
+are picked up. In multi-tenant mode every tenant has its own index.
+
+Strategies pick a guard for one coverage from the index. ``least_loaded``
+takes the guard with the lowest load; ``round_robin`` rotates each unit
+through the guards. Register more in ``STRATEGIES``.
+"""
+import threading
+import time as clock
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import chain
+from sqlalchemy import event, inspect, or_, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, func, select
+from .config import settings
+from .db import current_tenant
+from .events import record
+from .models import Coverage, CoverageStatus, Role, Round, Ticket, TicketStatus, User
+from .serialization import columns
+
+WEIGHTS = {"coverage": 1.0, "ticket": 1.0, "round": 0.25}
+
+TRACKED_TABLES = {"coverage", "ticket", "round", "user"}
+
+
+class LoadIndex:
+    """Current load of every active guard, keyed by user id."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.loads: dict[int, float] = {}
+        self.guards: list[int] = []
+        # Next guard position per unit, for ``RoundRobin``.
+        self.positions: dict[int, int] = {}
+        self.lock = threading.RLock()
+        self._loaded_at = 0.0
+        self._stale = True
+
+    def reload(self, session: Session) -> None:
+        since = datetime.utcnow() - timedelta(hours=settings.assignment_round_hours)
+        guards = session.exec(select(User.id).where(User.role == Role.funcionario, User.active == True).order_by(User.id)).all()
+        loads = dict.fromkeys(guards, 0.0)
+        counts = (
+            ("coverage", select(Coverage.assigned_to, func.count()).where(Coverage.status != CoverageStatus.concluida, Coverage.assigned_to.is_not(None)).group_by(Coverage.assigned_to)),
+            ("ticket", select(Ticket.assigned_to, func.count()).where(Ticket.status != TicketStatus.resolvido, Ticket.assigned_to.is_not(None)).group_by(Ticket.assigned_to)),
+            ("round", select(Round.employee_id, func.count()).where(Round.happened_at >= since).group_by(Round.employee_id)),
+        )
+        for kind, query in counts:
+            for guard, count in session.exec(query).all():
+                if guard in loads:
+                    loads[guard] += count * WEIGHTS[kind]
+        with self.lock:
+            self.loads, self.guards = loads, list(guards)
+            self._loaded_at = clock.monotonic()
+            self._stale = False
+
+    def ensure(self, session: Session) -> None:
+        if self._stale or clock.monotonic() - self._loaded_at >= self.ttl:
+            self.reload(session)
+
+    def add(self, guard: int | None, weight: float) -> None:
+        with self.lock:
+            if guard in self.loads:
+                self.loads[guard] += weight
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+
+class LeastLoaded:
+    def choose(self, index: LoadIndex, unit_id: int) -> int | None:
+        if not index.loads:
+            return None
+        return min(index.loads.items(), key=lambda item: (item[1], item[0]))[0]
+
+
+class RoundRobin:
+    """Each unit cycles through the guards, starting at a unit-specific offset."""
+
+    def choose(self, index: LoadIndex, unit_id: int) -> int | None:
+        if not index.guards:
+            return None
+        position = index.positions.get(unit_id, unit_id)
+        index.positions[unit_id] = position + 1
+        return index.guards[position % len(index.guards)]
+
+
+STRATEGIES = {"least_loaded": LeastLoaded, "round_robin": RoundRobin}
+
+load_index = LoadIndex(settings.assignment_index_ttl)
+_tenant_indexes: dict[str, LoadIndex] = {}
+_indexes_lock = threading.Lock()
+strategy = STRATEGIES[settings.coverage_assignment]() if settings.coverage_assignment in STRATEGIES else None
+
+
+def loads() -> LoadIndex:
+    """Load index of the current tenant; ``load_index`` in single-tenant mode."""
+    tenant = current_tenant.get()
+    if tenant is None:
+        return load_index
+    with _indexes_lock:
+        return _tenant_indexes.setdefault(tenant, LoadIndex(settings.assignment_index_ttl))
+
+
+def assign_coverages(session: Session, coverages: list[Coverage]) -> None:
+    """Set ``assigned_to`` on new, unassigned ``coverages``; the caller commits."""
+    if strategy is None or not coverages:
+        return
+    reserved = session.info.setdefault("coverages_reserved", set())
+    index = loads()
+    with index.lock:
+        index.ensure(session)
+        for cov in coverages:
+            if cov.assigned_to is not None:
+                continue
+            cov.assigned_to = strategy.choose(index, cov.unit_id)
+            # Counted now so concurrent requests see it; the flush hook skips it.
+            index.add(cov.assigned_to, WEIGHTS["coverage"])
+            reserved.add(id(cov))
+
+
+def rebalance(session: Session, batch_size: int = 1000) -> int:
+    """Reassign open coverages that are unassigned or held by inactive guards.
+
+    Coverages are grouped by their new guard and moved with one UPDATE per
+    group and batch. Returns how many were reassigned; the caller commits.
+    """
+    if strategy is None:
+        return 0
+    session.flush()
+    inactive = select(User.id).where(User.active == False)
+    rows = session.exec(
+        select(*columns(Coverage))
+        .where(Coverage.status != CoverageStatus.concluida, or_(Coverage.assigned_to.is_(None), Coverage.assigned_to.in_(inactive)))
+        .order_by(Coverage.id)
+    ).all()
+    moves: dict[int, list[dict]] = defaultdict(list)
+    index = loads()
+    with index.lock:
+        index.reload(session)
+        for row in rows:
+            guard = strategy.choose(index, row.unit_id)
+            if guard is None:
+                break
+            index.add(guard, WEIGHTS["coverage"])
+            moves[guard].append({**row._asdict(), "assigned_to": guard})
+    for guard, moved in moves.items():
+        for start in range(0, len(moved), batch_size):
+            batch = moved[start : start + batch_size]
+            session.exec(update(Coverage).where(Coverage.id.in_([c["id"] for c in batch])).values(assigned_to=guard).execution_options(synchronize_session=False))
+            record(session, "coverage", "update", [{**c, "status": c["status"].value} for c in batch])
+    return sum(len(moved) for moved in moves.values())
+
+
+def _previous(obj, attr: str):
+    history = inspect(obj).attrs[attr].history
+    return history.deleted[0] if history.deleted else getattr(obj, attr)
+
+
+def _keep_previous(target, value, oldvalue, initiator) -> None:
+    """No-op; registered with ``active_history`` so a set on an expired row loads the old value first."""
+
+
+for _attr in (Coverage.assigned_to, Coverage.status, Ticket.assigned_to, Ticket.status):
+    event.listen(_attr, "set", _keep_previous, active_history=True)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _track_loads(session, flush_context) -> None:
+    reserved = session.info.get("coverages_reserved", ())
+    deltas = []
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, (Coverage, Ticket)):
+            if id(obj) in reserved:
+                continue
+            kind, done = ("coverage", CoverageStatus.concluida) if isinstance(obj, Coverage) else ("ticket", TicketStatus.resolvido)
+            if obj not in session.new:
+                guard = _previous(obj, "assigned_to")
+                if guard is not None and _previous(obj, "status") != done:
+                    deltas.append((guard, -WEIGHTS[kind]))
+            if obj not in session.deleted and obj.assigned_to is not None and obj.status != done:
+                deltas.append((obj.assigned_to, WEIGHTS[kind]))
+        elif isinstance(obj, Round) and obj in session.new:
+            deltas.append((obj.employee_id, WEIGHTS["round"]))
+        elif isinstance(obj, User) and (obj in session.new or session.is_modified(obj)):
+            session.info["loads_stale"] = True
+    if deltas:
+        session.info.setdefault("load_deltas", []).extend(deltas)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _track_statements(state) -> None:
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None and table.name in TRACKED_TABLES:
+            state.session.info["loads_stale"] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _apply_loads(session) -> None:
+    session.info.pop("coverages_reserved", None)
+    index = loads()
+    for guard, weight in session.info.pop("load_deltas", ()):
+        index.add(guard, weight)
+    if session.info.pop("loads_stale", None):
+        index.invalidate()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard_loads(session) -> None:
+    session.info.pop("load_deltas", None)
+    session.info.pop("loads_stale", None)
+    if session.info.pop("coverages_reserved", None):
+        loads().invalidate()
@@ -0,0 +1,168 @@
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+from uuid import uuid4
+import orjson
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+from .archive import archive_dir
+from .config import settings
+from .db import current_tenant, engine, tenant_engines
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 60.0
+
+
+class AuditSink:
+    """Queues audit events and writes them in bulk from a background thread.
+
+    A flush is triggered when ``batch_size`` events are pending or every
+    ``flush_interval`` seconds, whichever comes first. Events still queued
+    when the process stops are written by ``stop()``. Events remember the
+    tenant that queued them and are written to its database.
+
+    A tenant's batch that fails to insert goes back to the head of the queue
+    and is retried with exponential backoff; after ``max_attempts`` failures
+    in a row it is written to a dead-letter file under the tenant's archive
+    dir (``deadletter/*.ndjson``) instead. Events that find ``max_pending``
+    already queued, or still queued when a shutdown flush fails, go to the
+    dead-letter file too, so the queue stays bounded and nothing is dropped.
+    """
+
+    def __init__(self, bind, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 100_000, max_attempts: int = 5):
+        self.bind = bind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self._pending: deque[tuple[str | None, dict]] = deque()
+        self._failures: dict[str | None, int] = {}
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def enqueue(self, **values) -> None:
+        values.setdefault("happened_at", datetime.utcnow())
+        tenant = current_tenant.get()
+        if len(self._pending) >= self.max_pending:
+            logger.warning("Fila de auditoria cheia (%d eventos)", len(self._pending))
+            self._dead_letter(tenant, [values])
+            return
+        self._pending.append((tenant, values))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            rows = defaultdict(list)
+            while self._pending:
+                tenant, values = self._pending.popleft()
+                rows[tenant].append(values)
+            written = 0
+            retry = []
+            for tenant, values in rows.items():
+                try:
+                    self._insert(tenant, values)
+                except Exception:
+                    attempts = self._failures.get(tenant, 0) + 1
+                    logger.exception("Falha ao gravar %d eventos de auditoria (tentativa %d de %d)", len(values), attempts, self.max_attempts)
+                    if attempts >= self.max_attempts:
+                        self._failures.pop(tenant, None)
+                        self._dead_letter(tenant, values)
+                    else:
+                        self._failures[tenant] = attempts
+                        retry.extend((tenant, v) for v in values)
+                else:
+                    self._failures.pop(tenant, None)
+                    written += len(values)
+            # Back at the head, ahead of anything queued meanwhile.
+            self._pending.extendleft(reversed(retry))
+            return written
+
+    def _insert(self, tenant: str | None, values: list[dict]) -> None:
+        token = current_tenant.set(tenant)
+        try:
+            with Session(self.bind if tenant is None else tenant_engines.get(tenant)[0]) as session:
+                session.exec(insert(AuditEvent), params=values)
+                session.commit()
+        finally:
+            current_tenant.reset(token)
+
+    def _dead_letter(self, tenant: str | None, values: list[dict]) -> None:
+        target = archive_dir(tenant) / "deadletter" / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid4().hex[:8]}.ndjson"
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(b"".join(orjson.dumps(row) + b"\n" for row in values))
+        except OSError:
+            logger.exception("Eventos de auditoria perdidos: %s", orjson.dumps(values).decode())
+            return
+        logger.error("%d eventos de auditoria gravados em %s", len(values), target)
+
+    def _backoff(self) -> float:
+        return min(self.flush_interval * 2 ** max(self._failures.values()), MAX_BACKOFF)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        with self._flush_lock:
+            rows = defaultdict(list)
+            while self._pending:
+                tenant, values = self._pending.popleft()
+                rows[tenant].append(values)
+            for tenant, values in rows.items():
+                self._dead_letter(tenant, values)
+            self._failures.clear()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            if self._failures:
+                # A full queue keeps setting _wakeup; wait out the backoff instead.
+                self._stopping.wait(self._backoff())
+            else:
+                self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Falha ao gravar eventos de auditoria")
+
+
+audit_sink = AuditSink(
+    engine,
+    batch_size=settings.audit_batch_size,
+    flush_interval=settings.audit_flush_interval,
+    max_pending=settings.audit_max_pending,
+    max_attempts=settings.audit_max_attempts,
+)
+
+
+def defer_audit(session, rows: list[dict]) -> None:
+    """Queue ``rows`` on the sink once ``session`` commits; a rollback drops them."""
+    session.info.setdefault("audit_pending", []).extend(rows)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _enqueue_committed(session) -> None:
+    for values in session.info.pop("audit_pending", ()):
+        audit_sink.enqueue(**values)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _drop_rolled_back(session) -> None:
+    session.info.pop("audit_pending", None)
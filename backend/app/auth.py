@@ -1,81 +1,152 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-import hashlib
-import base64
-import bcrypt
+import threading
+import time
+from collections import OrderedDict
 from jose import jwt, JWTError
-from jose import jwt, JWTError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlmodel import Session, select
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession, object_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import settings
-from .db import get_session
+from .db import current_tenant, get_async_session
+from .metrics import observe
 from .models import User, Role
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 
-def _prehash(password: str) -> bytes:
-    digest = hashlib.sha256(password.encode("utf-8")).digest()
-    return base64.b64encode(digest)
+def create_access_token(subject: str, expires_delta: Optional[timedelta] = None, user_id: Optional[int] = None, tenant: Optional[str] = None) -> str:
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
+    payload = {"sub": subject, "exp": expire}
+    if user_id is not None:
+        payload["uid"] = user_id
+    if tenant is not None:
+        payload["tid"] = tenant
+    return jwt.encode(payload, settings.secret_key, algorithm=settings.algorithm)
 
 
-def hash_password(password: str) -> str:
-    prehashed = _prehash(password)
-    hashed = bcrypt.hashpw(prehashed, bcrypt.gensalt()).decode("utf-8")
-    return f"sha256_bcrypt${hashed}"
-pwd_context = CryptContext(schemes=["bcrypt_sha256", "bcrypt"], deprecated="auto")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+class UserCache:
+    """Bounded LRU of active users keyed by tenant and token subject, with a TTL.
 
+    Entries are column snapshots; each hit builds a fresh detached ``User``
+    so requests never share an ORM instance. Writes to ``User`` evict their
+    entries when the transaction commits, in this process only: other
+    workers keep serving theirs until the TTL expires.
+    """
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[object, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
 
+    def get(self, key) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return User(**data)
 
-def verify_password(password: str, hash_: str) -> bool:
-    try:
-        if hash_.startswith("sha256_bcrypt$"):
-            stored = hash_.split("$", 1)[1].encode("utf-8")
-            return bcrypt.checkpw(_prehash(password), stored)
+    def put(self, key, user: User) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user.model_dump())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
 
-        # backward compatibility with plain bcrypt hashes
-        if hash_.startswith("$2"):
-            return bcrypt.checkpw(password.encode("utf-8"), hash_.encode("utf-8"))
+    def invalidate(self, *keys) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
 
-        return False
-    except ValueError:
-        return False
-        return pwd_context.verify(password, hash_)
-    except ValueError:
-        return False
-    return pwd_context.verify(password, hash_)
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
 
 
-def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
-    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=settings.access_token_expire_minutes))
-    payload = {"sub": subject, "exp": expire}
-    return jwt.encode(payload, settings.secret_key, algorithm=settings.algorithm)
+user_cache = UserCache(settings.user_cache_size, settings.user_cache_ttl)
+
+
+def _user_keys(user: User) -> tuple:
+    tenant = current_tenant.get()
+    return (tenant, user.id), (tenant, user.email)
+
+
+def invalidate_user(user: User) -> None:
+    user_cache.invalidate(*_user_keys(user))
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_write(mapper, connection, target: User) -> None:
+    # Evicting at flush would let a concurrent request cache the old row again
+    # before the commit; the keys are evicted once the write is visible.
+    session = object_session(target)
+    if session is None:
+        invalidate_user(target)
+    else:
+        session.info.setdefault("users_written", set()).update(_user_keys(target))
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _evict_committed(session) -> None:
+    keys = session.info.pop("users_written", None)
+    if keys:
+        user_cache.invalidate(*keys)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_rolled_back(session) -> None:
+    session.info.pop("users_written", None)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)) -> User:
+    t0 = time.perf_counter()
+    try:
+        return await _resolve_user(token, session)
+    finally:
+        observe("auth_seconds", time.perf_counter() - t0)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)) -> User:
+async def _resolve_user(token: str, session: AsyncSession) -> User:
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         sub = payload.get("sub")
-        if not sub:
+        # A token is only valid for the tenant that issued it.
+        if not sub or payload.get("tid") != current_tenant.get():
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = session.exec(select(User).where(User.email == sub)).first()
+    # Tokens issued before "uid" was added are still resolved by e-mail.
+    uid = payload.get("uid")
+    key = (current_tenant.get(), uid if uid is not None else sub)
+    if settings.user_cache_enabled:
+        cached = user_cache.get(key)
+        if cached is not None:
+            return cached
+    if uid is not None:
+        user = await session.get(User, uid)
+    else:
+        user = (await session.exec(select(User).where(User.email == sub))).first()
     if not user or not user.active:
         raise credentials_exception
+    if settings.user_cache_enabled:
+        user_cache.put(key, user)
     return user
 
 
 def require_roles(*roles: Role):
-    def checker(user: User = Depends(get_current_user)) -> User:
+    async def checker(user: User = Depends(get_current_user)) -> User:
         if user.role not in roles:
             raise HTTPException(status_code=403, detail="Sem permissão para este recurso")
         return user
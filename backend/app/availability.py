@@ -0,0 +1,83 @@
+"""Free intervals of the agenda, per unit, across a date range.
+
+Active single bookings of a unit never overlap, so a unit's busy time in
+[start, end) is the bookings starting inside the range plus, at most, the
+last booking starting before it. Both come from range seeks on
+``ix_agenda_unit_start_end``: one query for the bookings inside the range
+of every requested unit, and one correlated lookup per unit for the
+booking that may run into it. Recurring series touching the range add
+their occurrences (``app.recurrence``). A single sweep per unit over the
+sorted rows yields the gaps, which are then cut at lock-window edges.
+"""
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlmodel import Session, select
+from .lockwindows import LockSchedule
+from .models import Agenda, AgendaStatus, LockWindow, Unit
+from .recurrence import cancelled_starts, occurrences, series_in
+from .serialization import columns
+
+
+def free_intervals(busy: list[tuple[datetime, datetime]], start: datetime, end: datetime) -> list[tuple[datetime, datetime]]:
+    """Gaps of [start, end) not covered by ``busy`` (sorted by start, may overlap)."""
+    gaps, cursor = [], start
+    for s, e in busy:
+        if s > cursor:
+            gaps.append((cursor, min(s, end)))
+        cursor = max(cursor, e)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def availability(session: Session, unit_ids: list[int] | None, start: datetime, end: datetime, min_minutes: int = 0) -> list[dict]:
+    """Free intervals of ``unit_ids`` (every unit when None) in [start, end).
+
+    Gaps shorter than ``min_minutes`` are dropped; the rest are split into
+    pieces flagged ``locked`` when they lie inside an enabled lock window,
+    where a ``visita`` needs approval.
+    """
+    active = Agenda.status != AgendaStatus.recusado
+    single = Agenda.recurrence == None
+    before = (
+        select(Agenda.end_at)
+        .where(Agenda.unit_id == Unit.id, active, single, Agenda.start_at < start)
+        .order_by(Agenda.start_at.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    units = select(Unit.id, before).order_by(Unit.id)
+    inside = select(Agenda.unit_id, Agenda.start_at, Agenda.end_at).where(active, single, Agenda.start_at >= start, Agenda.start_at < end).order_by(Agenda.unit_id, Agenda.start_at)
+    series = series_in(select(*columns(Agenda)).where(active), start, end)
+    if unit_ids is not None:
+        units = units.where(Unit.id.in_(unit_ids))
+        inside = inside.where(Agenda.unit_id.in_(unit_ids))
+        series = series.where(Agenda.unit_id.in_(unit_ids))
+    spill = dict(session.exec(units).all())
+    busy = {unit_id: [(s, e) for _, s, e in rows] for unit_id, rows in groupby(session.exec(inside).all(), key=lambda row: row[0])}
+    recurring = session.exec(series).all()
+    if recurring:
+        cancelled = cancelled_starts(session, [row.id for row in recurring], start - max(row.end_at - row.start_at for row in recurring), end)
+        for row in recurring:
+            busy.setdefault(row.unit_id, []).extend(occurrences(row, start, end, cancelled.get(row.id, ())))
+        for unit_id in {row.unit_id for row in recurring}:
+            busy[unit_id].sort()
+    # Read directly rather than through the TTL cache, so a cached response is
+    # never built from windows older than the version it is tagged with.
+    schedule = LockSchedule(session.exec(select(LockWindow).where(LockWindow.enabled == True)).all())
+    shortest = timedelta(minutes=min_minutes)
+
+    result = []
+    for unit_id, previous_end in spill.items():
+        rows = busy.get(unit_id, [])
+        if previous_end is not None and previous_end > start:
+            rows.insert(0, (start, previous_end))
+        free = []
+        for gap_start, gap_end in free_intervals(rows, start, end):
+            if gap_end - gap_start < shortest:
+                continue
+            free.extend({"start_at": a, "end_at": b, "locked": locked} for a, b, locked in schedule.split(gap_start, gap_end))
+        result.append({"unit_id": unit_id, "free": free})
+    return result
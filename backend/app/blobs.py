@@ -0,0 +1,230 @@
+"""Content-addressed blob store for uploads.
+
+Files live at ``storage/blobs/<aa>/<bb>/<sha256><ext>``, so identical bytes
+are stored once; in multi-tenant mode under ``storage/tenants/<slug>/``,
+next to the tenant's own database. ``Blob.ref_count`` counts the rows pointing at a blob;
+``python -m app.blobs gc`` removes unreferenced blobs and orphaned files.
+"""
+import argparse
+import hashlib
+import os
+import time
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable
+from uuid import uuid4
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+from .config import settings
+from .metrics import observe
+from .models import Blob
+from .uploads import CHUNK_SIZE, STORAGE_DIR, storage_prefix, storage_root
+
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/heic": ".heic",
+    "image/svg+xml": ".svg",
+}
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size: int
+    content_type: str
+    path: str
+    created: bool
+
+    @property
+    def url(self) -> str:
+        return f"/storage/{self.path}"
+
+
+def blob_relpath(sha256: str, ext: str) -> str:
+    return f"{storage_prefix()}blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}{ext}"
+
+
+def _store(source: BinaryIO, content_type: str, ext: str, max_bytes: int) -> StoredBlob:
+    tmp_dir = storage_root() / "tmp"
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp = tmp_dir / uuid4().hex
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp.open("wb") as out:
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, f"Arquivo excede o limite de {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    sha256 = digest.hexdigest()
+    rel = blob_relpath(sha256, ext)
+    target = STORAGE_DIR / rel
+    if target.exists():
+        tmp.unlink()
+        # Refresh mtime so a concurrent gc treats the blob as recently used.
+        os.utime(target)
+        return StoredBlob(sha256, size, content_type, rel, created=False)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, target)
+    return StoredBlob(sha256, size, content_type, rel, created=True)
+
+
+async def store_upload(upload: UploadFile, max_bytes: int | None = None) -> StoredBlob:
+    """Hash ``upload`` while streaming it to the blob store on a worker thread.
+
+    When a blob with the same digest already exists the new bytes are
+    discarded and the existing file is reused.
+    """
+    content_type = (upload.content_type or "").lower()
+    ext = EXTENSIONS.get(content_type) or Path(upload.filename or "").suffix.lower()
+    blob = await run_in_threadpool(_store, upload.file, content_type, ext, max_bytes or settings.upload_max_bytes)
+    observe("upload_bytes", blob.size)
+    return blob
+
+
+async def store_uploads(uploads: list[UploadFile]) -> list[StoredBlob]:
+    """``store_upload`` each of ``uploads``; if one fails, the files created for the others are removed."""
+    stored: list[StoredBlob] = []
+    try:
+        for upload in uploads:
+            stored.append(await store_upload(upload))
+    except BaseException:
+        for blob in stored:
+            if blob.created:
+                (STORAGE_DIR / blob.path).unlink(missing_ok=True)
+        raise
+    return stored
+
+
+def _insert_missing(session: Session):
+    dialect = session.get_bind().dialect.name
+    if dialect == "sqlite":
+        return sqlite_insert(Blob.__table__).on_conflict_do_nothing(index_elements=["sha256"])
+    if dialect == "postgresql":
+        return pg_insert(Blob.__table__).on_conflict_do_nothing(index_elements=["sha256"])
+    return None
+
+
+def add_blob_refs(session: Session, blobs: Iterable[StoredBlob]) -> None:
+    """Register ``blobs`` and add one reference per occurrence, in the caller's transaction."""
+    counts = Counter()
+    by_sha = {}
+    for blob in blobs:
+        counts[blob.sha256] += 1
+        by_sha[blob.sha256] = blob
+    if not counts:
+        return
+    rows = [{"sha256": b.sha256, "path": b.path, "size": b.size, "content_type": b.content_type, "ref_count": 0} for b in by_sha.values()]
+    stmt = _insert_missing(session)
+    if stmt is not None:
+        session.exec(stmt, params=rows)
+    else:
+        known = set(session.exec(select(Blob.sha256).where(Blob.sha256.in_(list(by_sha)))).all())
+        missing = [row for row in rows if row["sha256"] not in known]
+        if missing:
+            session.exec(insert(Blob), params=missing)
+    for sha256, count in counts.items():
+        session.exec(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + count))
+
+
+def release_blob_refs(session: Session, sha256s: Iterable[str | None]) -> None:
+    """Drop one reference per occurrence; unreferenced blobs are removed by ``gc``."""
+    for sha256, count in Counter(s for s in sha256s if s).items():
+        session.exec(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - count))
+
+
+def gc(session: Session, grace_seconds: float = 3600, dry_run: bool = False) -> dict:
+    """Delete unreferenced blobs and files the database does not know about.
+
+    Files modified within ``grace_seconds`` are kept, which covers uploads
+    whose transaction has not committed yet.
+    """
+    cutoff = time.time() - grace_seconds
+    root = storage_root()
+    stats = {"rows": 0, "files": 0, "bytes": 0}
+
+    def remove(path: Path) -> None:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_mtime > cutoff:
+            return
+        stats["files"] += 1
+        stats["bytes"] += stat.st_size
+        if not dry_run:
+            path.unlink(missing_ok=True)
+
+    for blob in session.exec(select(Blob).where(Blob.ref_count <= 0)).all():
+        path = STORAGE_DIR / blob.path
+        if path.exists() and path.stat().st_mtime > cutoff:
+            continue
+        stats["rows"] += 1
+        if not dry_run:
+            session.exec(delete(Blob).where(Blob.sha256 == blob.sha256, Blob.ref_count <= 0))
+        remove(path)
+        for derived in (root / "derived").glob(f"{blob.sha256}_*"):
+            remove(derived)
+    if not dry_run:
+        session.commit()
+
+    if (root / "blobs").exists():
+        for shard in sorted((root / "blobs").glob("*/*")):
+            files = {path.name.split(".", 1)[0]: path for path in shard.iterdir() if path.is_file()}
+            if not files:
+                continue
+            known = set(session.exec(select(Blob.sha256).where(Blob.sha256.in_(list(files)))).all())
+            for sha256, path in files.items():
+                if sha256 not in known:
+                    remove(path)
+    if (root / "tmp").exists():
+        for path in (root / "tmp").iterdir():
+            remove(path)
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.blobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gc_cmd = commands.add_parser("gc", help="remove unreferenced blobs and orphaned files")
+    gc_cmd.add_argument("--grace-minutes", type=float, default=60)
+    gc_cmd.add_argument("--dry-run", action="store_true")
+    gc_cmd.add_argument("--tenant", action="append", help="multi-tenant mode: only this tenant (repeatable; default all active)")
+    args = parser.parse_args()
+
+    from .db import current_tenant, engine, open_tenant_engine
+
+    prefix = "would remove" if args.dry_run else "removed"
+    if not settings.tenant_database_url:
+        with Session(engine) as session:
+            stats = gc(session, grace_seconds=args.grace_minutes * 60, dry_run=args.dry_run)
+        print(f"{prefix} {stats['rows']} blob rows, {stats['files']} files ({stats['bytes']} bytes)")
+        return
+    from .tenants import catalog
+
+    for tenant in args.tenant or sorted(catalog.active()):
+        bind = open_tenant_engine(tenant, pooled=False)
+        token = current_tenant.set(tenant)
+        try:
+            with Session(bind) as session:
+                stats = gc(session, grace_seconds=args.grace_minutes * 60, dry_run=args.dry_run)
+        finally:
+            current_tenant.reset(token)
+            bind.dispose()
+        print(f"{tenant}: {prefix} {stats['rows']} blob rows, {stats['files']} files ({stats['bytes']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
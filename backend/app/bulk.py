@@ -0,0 +1,324 @@
+"""Bulk CSV/NDJSON import and streaming export.
+
+Imports validate each row with the ``schemas`` model of the entity and write
+valid rows in batches of ``bulk_batch_size``, one transaction per batch.
+Invalid rows are skipped and reported by line number. Exports read the table
+in keyset batches, so memory use does not depend on the table size.
+"""
+import codecs
+import csv
+import io
+import json
+import orjson
+from datetime import date, datetime, time
+from enum import Enum
+from typing import BinaryIO, Iterable, Iterator
+from fastapi import HTTPException
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from .assignment import assign_coverages
+from .config import settings
+from .dashboards import FINANCE, refresh_payment_months, _month
+from .lockwindows import get_lock_schedule
+from .passwords import password_pool
+from .models import Agenda, AgendaStatus, AgendaType, Coverage, Payment, Unit, User
+from .schemas import AgendaCreate, PaymentCreate, UnitCreate, UserCreate
+from .recurrence import last_end, overlaps, rule_error
+from .services import add_audit, has_conflict
+
+
+class BulkEntity(str, Enum):
+    units = "units"
+    users = "users"
+    payments = "payments"
+    agenda = "agenda"
+
+
+class BulkFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+SCHEMAS = {
+    BulkEntity.units: UnitCreate,
+    BulkEntity.users: UserCreate,
+    BulkEntity.payments: PaymentCreate,
+    BulkEntity.agenda: AgendaCreate,
+}
+
+MODELS = {
+    BulkEntity.units: Unit,
+    BulkEntity.users: User,
+    BulkEntity.payments: Payment,
+    BulkEntity.agenda: Agenda,
+}
+
+# Columns never exported.
+HIDDEN = {"password_hash"}
+
+MEDIA_TYPES = {BulkFormat.csv: "text/csv; charset=utf-8", BulkFormat.ndjson: "application/x-ndjson"}
+
+
+def detect_format(fmt: BulkFormat | None, filename: str | None, content_type: str | None) -> BulkFormat:
+    if fmt is not None:
+        return fmt
+    name = (filename or "").lower()
+    kind = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in kind:
+        return BulkFormat.csv
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in kind or "jsonl" in kind:
+        return BulkFormat.ndjson
+    raise HTTPException(415, "Formato não suportado (use CSV ou NDJSON)")
+
+
+def read_rows(source: BinaryIO, fmt: BulkFormat) -> Iterator[tuple[int, dict | None, str | None]]:
+    """Yield ``(line, row, error)`` for each record of ``source`` without reading it all.
+
+    Empty CSV cells are dropped so optional fields fall back to their
+    defaults.
+    """
+    text = codecs.getreader("utf-8-sig")(source)
+    if fmt == BulkFormat.csv:
+        reader = csv.DictReader(text)
+        try:
+            for record in reader:
+                extra = record.pop(None, None)
+                if extra:
+                    yield reader.line_num, None, "Colunas a mais na linha"
+                    continue
+                yield reader.line_num, {k: v for k, v in record.items() if k and v not in ("", None)}, None
+        except (csv.Error, UnicodeDecodeError) as exc:
+            yield reader.line_num + 1, None, f"Arquivo inválido: {exc}"
+        return
+    line = 0
+    try:
+        for raw in text:
+            line += 1
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                yield line, None, "JSON inválido"
+                continue
+            if not isinstance(row, dict):
+                yield line, None, "Cada linha deve ser um objeto JSON"
+                continue
+            yield line, row, None
+    except UnicodeDecodeError as exc:
+        yield line + 1, None, f"Arquivo inválido: {exc}"
+
+
+def _validation_errors(exc: ValidationError) -> list[dict]:
+    return [{"field": ".".join(str(p) for p in err["loc"]), "message": err["msg"]} for err in exc.errors()]
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def fail(self, line: int, message: str, field: str | None = None) -> None:
+        self.failed += 1
+        if len(self.errors) < settings.bulk_max_errors:
+            self.errors.append({"line": line, "errors": [{"field": field, "message": message}]})
+
+    def fail_validation(self, line: int, exc: ValidationError) -> None:
+        self.failed += 1
+        if len(self.errors) < settings.bulk_max_errors:
+            self.errors.append({"line": line, "errors": _validation_errors(exc)})
+
+    def as_dict(self) -> dict:
+        self.errors.sort(key=lambda e: e["line"])
+        return {"inserted": self.inserted, "failed": self.failed, "errors": self.errors, "errors_truncated": self.failed > len(self.errors)}
+
+
+def _existing_units(session: Session, ids: Iterable[int]) -> set[int]:
+    ids = set(ids)
+    if not ids:
+        return set()
+    return set(session.exec(select(Unit.id).where(Unit.id.in_(ids))).all())
+
+
+def _check_units(session: Session, batch: list, report: ImportReport) -> list:
+    known = _existing_units(session, (data.unit_id for _, data in batch if data.unit_id is not None))
+    kept = []
+    for line, data in batch:
+        if data.unit_id is not None and data.unit_id not in known:
+            report.fail(line, "Unidade não encontrada", "unit_id")
+        else:
+            kept.append((line, data))
+    return kept
+
+
+def _write_units(session: Session, batch: list, report: ImportReport, user: User) -> list[int]:
+    codes = {data.code for _, data in batch}
+    taken = set(session.exec(select(Unit.code).where(Unit.code.in_(codes))).all())
+    rows, lines = [], []
+    for line, data in batch:
+        if data.code in taken:
+            report.fail(line, "Código de unidade já cadastrado", "code")
+            continue
+        taken.add(data.code)
+        rows.append(data.model_dump())
+        lines.append(line)
+    if rows:
+        session.exec(insert(Unit), params=rows)
+    return lines
+
+
+def _write_users(session: Session, batch: list, report: ImportReport, user: User) -> list[int]:
+    batch = _check_units(session, batch, report)
+    emails = {data.email for _, data in batch}
+    taken = set(session.exec(select(User.email).where(User.email.in_(emails))).all())
+    fresh, lines = [], []
+    for line, data in batch:
+        if data.email in taken:
+            report.fail(line, "E-mail já cadastrado", "email")
+            continue
+        taken.add(data.email)
+        fresh.append(data)
+        lines.append(line)
+    if fresh:
+        hashes = password_pool.hash_many([data.password for data in fresh])
+        rows = [{"name": d.name, "email": d.email, "password_hash": h, "role": d.role, "unit_id": d.unit_id, "active": True} for d, h in zip(fresh, hashes)]
+        session.exec(insert(User), params=rows)
+    return lines
+
+
+def _write_payments(session: Session, batch: list, report: ImportReport, user: User) -> list[int]:
+    batch = _check_units(session, batch, report)
+    if batch:
+        session.exec(insert(Payment), params=[data.model_dump() for _, data in batch])
+        # Core inserts bypass the flush hook that maintains the rollup.
+        refresh_payment_months(session.connection(), {_month(data.due_date) for _, data in batch})
+        session.info.setdefault("dashboards_touched", set()).add(FINANCE)
+    return [line for line, _ in batch]
+
+
+def _write_agenda(session: Session, batch: list, report: ImportReport, user: User) -> list[int]:
+    batch = _check_units(session, batch, report)
+    schedule = get_lock_schedule(session)
+    accepted: dict[int, list[AgendaCreate]] = {}
+    bookings, lines = [], []
+    for line, data in batch:
+        if data.end_at <= data.start_at:
+            report.fail(line, "Data final deve ser posterior à inicial", "end_at")
+            continue
+        invalid = rule_error(data)
+        if invalid:
+            report.fail(line, invalid[1], invalid[0])
+            continue
+        # Rows of this batch are not in the database yet, so they are checked
+        # against each other in memory.
+        same_batch = accepted.setdefault(data.unit_id, [])
+        if any(overlaps(data, other) for other in same_batch) or has_conflict(session, data):
+            report.fail(line, "Conflito de agenda para a unidade (interval overlap)", "start_at")
+            continue
+        same_batch.append(data)
+        requires = data.type in [AgendaType.mudanca, AgendaType.prestador] or (data.type == AgendaType.visita and schedule.blocks(data.start_at, data.end_at))
+        status = AgendaStatus.pendente if requires else AgendaStatus.aprovado
+        bookings.append(Agenda(**data.model_dump(), requester_id=user.id, requires_approval=bool(requires), status=status, series_end_at=last_end(data) if data.recurrence else None))
+        lines.append(line)
+    session.add_all(bookings); session.flush()
+    coverages = [Coverage(unit_id=ag.unit_id, from_agenda_id=ag.id, title=f"Cobertura automática da saída #{ag.id}") for ag in bookings if ag.type == AgendaType.saida]
+    if coverages:
+        assign_coverages(session, coverages)
+        session.add_all(coverages); session.flush()
+    return lines
+
+
+WRITERS = {
+    BulkEntity.units: _write_units,
+    BulkEntity.users: _write_users,
+    BulkEntity.payments: _write_payments,
+    BulkEntity.agenda: _write_agenda,
+}
+
+
+def import_rows(session: Session, entity: BulkEntity, rows: Iterable[tuple[int, dict | None, str | None]], user: User, batch_size: int | None = None) -> dict:
+    """Validate and insert ``rows``, committing every ``batch_size`` valid rows.
+
+    Each committed batch gets one audit event. A batch that fails to commit
+    (e.g. a unit code inserted concurrently) is rolled back and all of its
+    rows are reported as failed.
+    """
+    schema: type[BaseModel] = SCHEMAS[entity]
+    writer = WRITERS[entity]
+    batch_size = batch_size or settings.bulk_batch_size
+    report = ImportReport()
+    batch: list[tuple[int, BaseModel]] = []
+
+    def flush() -> None:
+        failed, errors = report.failed, len(report.errors)
+        try:
+            lines = writer(session, batch, report, user)
+            if lines:
+                add_audit(session, user.id, "import", entity.value, None, f"{len(lines)} linhas ({lines[0]}-{lines[-1]})")
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            # Drop what the writer already reported for this batch, so no line counts twice.
+            report.failed = failed
+            del report.errors[errors:]
+            for line, _ in batch:
+                report.fail(line, "Conflito ao gravar o lote")
+        else:
+            report.inserted += len(lines)
+        batch.clear()
+
+    for line, row, error in rows:
+        if error:
+            report.fail(line, error)
+            continue
+        try:
+            batch.append((line, schema.model_validate(row)))
+        except ValidationError as exc:
+            report.fail_validation(line, exc)
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report.as_dict()
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def export_rows(bind, entity: BulkEntity, fmt: BulkFormat, batch_size: int | None = None) -> Iterator[bytes]:
+    """Yield the whole table as CSV or NDJSON, one keyset batch at a time.
+
+    Opens its own session: the response is streamed after the request's
+    dependencies have been closed.
+    """
+    model = MODELS[entity]
+    columns = [c for c in model.__table__.columns if c.name not in HIDDEN]
+    names = [c.name for c in columns]
+    batch_size = batch_size or settings.bulk_batch_size
+    if fmt == BulkFormat.csv:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+        yield buffer.getvalue().encode("utf-8")
+    last_id = 0
+    with Session(bind) as session:
+        while True:
+            rows = session.exec(select(*columns).where(model.id > last_id).order_by(model.id).limit(batch_size)).all()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            if fmt == BulkFormat.csv:
+                buffer.seek(0); buffer.truncate()
+                writer.writerows([[_plain(v) for v in row] for row in rows])
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield b"".join(orjson.dumps(dict(zip(names, row))) + b"\n" for row in rows)
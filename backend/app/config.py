@@ -7,7 +7,96 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 60
     cors_origin: str = "http://localhost:5173"
+    # Any SQLAlchemy URL; the async engine swaps in the matching async driver
+    # (aiosqlite, asyncpg, aiomysql) unless one is given explicitly.
     database_url: str = "sqlite:///app.db"
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    sqlite_busy_timeout_ms: int = 5000
+    # Multi-tenant mode: one database per condominium, named by substituting
+    # the tenant slug in tenant_database_url (e.g. sqlite:///tenants/{tenant}.db).
+    # database_url then only holds the tenant catalog. At most
+    # tenant_engine_cache tenants keep an engine open, least recently used
+    # first out, each with a pool of tenant_pool_size connections.
+    tenant_database_url: str = ""
+    tenant_engine_cache: int = 32
+    tenant_pool_size: int = 2
+    tenant_catalog_ttl: float = 30.0
+    # Demo units, users and bookings, inserted once by the demo_seed migration.
+    seed_demo_data: bool = True
+    # "durable" writes audit events in the caller's transaction; "batched"
+    # hands them to a background sink that bulk-inserts them.
+    audit_mode: str = "durable"
+    audit_batch_size: int = 500
+    audit_flush_interval: float = 1.0
+    # Batches failing audit_max_attempts times in a row, and events beyond
+    # audit_max_pending queued ones, go to a dead-letter file instead.
+    audit_max_pending: int = 100_000
+    audit_max_attempts: int = 5
+    # Events older than audit_retention_days are moved to gzip segment files
+    # under audit_archive_dir every audit_archive_interval seconds; 0 keeps
+    # everything in the table.
+    audit_retention_days: int = 90
+    audit_archive_dir: str = ""  # defaults to backend/audit_archive
+    audit_archive_interval: float = 86400.0
+    audit_segment_rows: int = 10000
+    # Overdue transitions and next month's charges, every
+    # payment_schedule_interval seconds. Off by default: it creates financial
+    # records (3600 runs it hourly).
+    payment_schedule_interval: float = 0.0
+    payment_batch_size: int = 1000
+    payment_grace_days: int = 0
+    payment_due_day: int = 10
+    payment_monthly_amount: float = 550.0
+    # Strategy for new coverages: "least_loaded", "round_robin" or "none".
+    coverage_assignment: str = "least_loaded"
+    assignment_index_ttl: float = 60.0
+    assignment_round_hours: int = 24
+    # Bearer token required by /metrics; empty serves it to local clients only.
+    metrics_token: str = ""
+    # Requests slower than profile_slow_ms get their sampled stacks written
+    # to profile_dir (defaults to backend/profiles); 0 disables sampling.
+    profile_slow_ms: float = 0.0
+    profile_interval_ms: float = 5.0
+    profile_dir: str = ""
+    page_size_default: int = 50
+    page_size_max: int = 500
+    user_cache_enabled: bool = True
+    user_cache_size: int = 1024
+    user_cache_ttl: float = 30.0
+    dashboard_cache_ttl: float = 10.0
+    lock_window_cache_ttl: float = 60.0
+    availability_max_days: int = 31
+    agenda_recurrence_max_days: int = 366
+    storage_dir: str = ""  # defaults to backend/storage
+    upload_max_bytes: int = 20 * 1024 * 1024
+    upload_max_files: int = 20
+    thumbnail_size: int = 320
+    thumbnail_quality: int = 75
+    web_variant_size: int = 1600
+    web_variant_quality: int = 82
+    thumbnail_workers: int = 1
+    thumbnail_max_attempts: int = 3
+    bcrypt_rounds: int = 12
+    # Processes hashing passwords; None uses one per CPU, 0 hashes on the
+    # request threadpool. Jobs beyond password_hash_queue get a 503.
+    password_hash_workers: int | None = None
+    password_hash_queue: int = 128
+    # "local" streams events of this process only; "database" shares them
+    # between workers through the streamevent table.
+    event_backend: str = "local"
+    event_buffer_size: int = 1000
+    event_poll_interval: float = 0.5
+    event_retention: int = 10000
+    event_heartbeat: float = 15.0
+    response_cache_enabled: bool = True
+    response_cache_size: int = 512
+    public_config_max_age: int = 60
+    static_max_age: int = 3600
+    bulk_batch_size: int = 1000
+    bulk_max_errors: int = 1000
+    transition_batch_max: int = 1000
 
 
 settings = Settings()
@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import date, datetime, timedelta
+from itertools import chain
+from sqlalchemy import Date, case, delete, event, insert, inspect, literal
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, func, select
+from .config import settings
+from .db import current_tenant
+from .models import Coverage, CoverageStatus, Payment, PaymentMonthly, PaymentStatus, Round, Ticket, TicketStatus
+
+FINANCE = "finance"
+OPERATIONS = "operations"
+
+_cache: dict[tuple, tuple[float, dict]] = {}
+_cache_lock = threading.Lock()
+
+
+def cache_get(key: tuple) -> dict | None:
+    with _cache_lock:
+        entry = _cache.get((current_tenant.get(), *key))
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def cache_put(key: tuple, value: dict) -> None:
+    with _cache_lock:
+        _cache[(current_tenant.get(), *key)] = (time.monotonic() + settings.dashboard_cache_ttl, value)
+
+
+def invalidate_dashboards(*names: str) -> None:
+    """Drop the cached dashboards ``names`` (all when empty) of the current tenant."""
+    tenant = current_tenant.get()
+    with _cache_lock:
+        for key in list(_cache):
+            if key[0] == tenant and (not names or key[1] in names):
+                del _cache[key]
+
+
+def _month(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _status_count(status: PaymentStatus):
+    return func.coalesce(func.sum(case((Payment.status == status, 1), else_=0)), 0)
+
+
+def refresh_payment_months(connection, months) -> None:
+    """Recompute the ``PaymentMonthly`` rows of the given months from ``Payment``."""
+    table = PaymentMonthly.__table__
+    for month in sorted(months):
+        totals = select(
+            literal(month, Date),
+            _status_count(PaymentStatus.pago),
+            _status_count(PaymentStatus.pendente),
+            _status_count(PaymentStatus.atrasado),
+            func.coalesce(func.sum(Payment.amount), 0.0),
+            func.coalesce(func.sum(case((Payment.status == PaymentStatus.atrasado, Payment.amount), else_=0.0)), 0.0),
+        ).where(Payment.due_date >= month, Payment.due_date < _next_month(month))
+        connection.execute(delete(table).where(table.c.month == month))
+        connection.execute(insert(table).from_select(["month", "paid", "pending", "late", "total_amount", "late_amount"], totals))
+
+
+def ensure_payment_rollup(session: Session) -> None:
+    """Build the monthly rollup for databases that predate it."""
+    if session.exec(select(PaymentMonthly.month).limit(1)).first() or not session.exec(select(Payment.id).limit(1)).first():
+        return
+    months = {_month(d) for d in session.exec(select(Payment.due_date).distinct()).all()}
+    refresh_payment_months(session.connection(), months)
+    session.commit()
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _track_writes(session, flush_context) -> None:
+    # Keeps the rollup inside the writer's transaction and remembers which
+    # dashboards to invalidate once that transaction commits.
+    months = set()
+    touched = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Payment):
+            touched.add(FINANCE)
+            if obj.due_date:
+                months.add(_month(obj.due_date))
+            months.update(_month(d) for d in inspect(obj).attrs.due_date.history.deleted if d)
+        elif isinstance(obj, (Ticket, Round, Coverage)):
+            touched.add(OPERATIONS)
+    if months:
+        refresh_payment_months(session.connection(), months)
+    if touched:
+        session.info.setdefault("dashboards_touched", set()).update(touched)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_on_commit(session) -> None:
+    touched = session.info.pop("dashboards_touched", None)
+    if touched:
+        invalidate_dashboards(*touched)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_on_rollback(session) -> None:
+    session.info.pop("dashboards_touched", None)
+
+
+def finance_summary(session: Session, months: int) -> dict:
+    counts = {status: 0 for status in PaymentStatus}
+    for status, total in session.exec(select(Payment.status, func.count(Payment.id)).group_by(Payment.status)).all():
+        counts[PaymentStatus(status)] = total
+    first = _month(date.today())
+    for _ in range(months - 1):
+        first = _month(first - timedelta(days=1))
+    rows = session.exec(select(PaymentMonthly).where(PaymentMonthly.month >= first).order_by(PaymentMonthly.month)).all()
+    series = []
+    for row in rows:
+        total = row.paid + row.pending + row.late
+        series.append({
+            "month": row.month.strftime("%Y-%m"),
+            "late": row.late,
+            "total": total,
+            "rate": round(row.late / total, 4) if total else 0.0,
+            "late_amount": row.late_amount,
+        })
+    return {
+        "paid": counts[PaymentStatus.pago],
+        "pending": counts[PaymentStatus.pendente],
+        "late": counts[PaymentStatus.atrasado],
+        "inadimplencia_mensal": series,
+    }
+
+
+def operations_summary(session: Session, days: int) -> dict:
+    since = datetime.utcnow() - timedelta(days=days)
+    rounds, tickets_open, coverages_pending = session.exec(
+        select(
+            select(func.count(Round.id)).where(Round.happened_at >= since).scalar_subquery(),
+            select(func.count(Ticket.id)).where(Ticket.status == TicketStatus.aberto).scalar_subquery(),
+            select(func.count(Coverage.id)).where(Coverage.status == CoverageStatus.pendente).scalar_subquery(),
+        )
+    ).one()
+    return {"rounds_period": rounds, "period_days": days, "tickets_open": tickets_open, "coverages_pending": coverages_pending}
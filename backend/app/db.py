@@ -1,13 +1,230 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from .config import settings
 
-engine = create_engine(settings.database_url, connect_args={"check_same_thread": False})
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
 
 
-def create_db_and_tables() -> None:
-    SQLModel.metadata.create_all(engine)
+def _async_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if "+" in parsed.drivername or backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def _engine_kwargs(url: str, pool_size: int | None = None) -> dict:
+    parsed = make_url(url)
+    pool_size = settings.db_pool_size if pool_size is None else pool_size
+    if parsed.get_backend_name() != "sqlite":
+        return {
+            "pool_size": pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+            "pool_pre_ping": True,
+        }
+    kwargs = {"connect_args": {"check_same_thread": False}}
+    if parsed.database and parsed.database != ":memory:":
+        kwargs.update(pool_size=pool_size, max_overflow=settings.db_max_overflow, pool_timeout=settings.db_pool_timeout)
+    return kwargs
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # busy_timeout first: switching to WAL needs a lock another worker may hold.
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+engine = create_engine(settings.database_url, **_engine_kwargs(settings.database_url))
+async_engine = create_async_engine(_async_url(settings.database_url), **_engine_kwargs(settings.database_url))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# Slug of the condominium being served; None in single-tenant mode and for
+# work on the main database (the tenant catalog in multi-tenant mode).
+current_tenant: ContextVar[str | None] = ContextVar("current_tenant", default=None)
+
+
+def tenant_url(tenant: str) -> str:
+    return settings.tenant_database_url.replace("{tenant}", tenant)
+
+
+def open_tenant_engine(tenant: str, pooled: bool = True):
+    """Sync engine of ``tenant``, migrated to the current schema.
+
+    Unpooled engines are for background passes that should not keep the
+    tenant's connections open afterwards.
+    """
+    from .migrations import migrate
+
+    url = tenant_url(tenant)
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database and parsed.database != ":memory:":
+        Path(parsed.database).parent.mkdir(parents=True, exist_ok=True)
+    kwargs = _engine_kwargs(url, settings.tenant_pool_size) if pooled else {"connect_args": {"check_same_thread": False}, "poolclass": NullPool}
+    bind = create_engine(url, **kwargs)
+    if bind.dialect.name == "sqlite":
+        event.listen(bind, "connect", _sqlite_pragmas)
+    token = current_tenant.set(tenant)
+    try:
+        migrate(bind)
+    finally:
+        current_tenant.reset(token)
+    return bind
+
+
+class TenantEngines:
+    """LRU of per-tenant (sync, async) engine pairs.
+
+    Opening a tenant migrates its database. The least recently used pair is
+    disposed when more than ``maxsize`` are open; connections checked out at
+    that moment are closed when returned. Async pools can only be closed on
+    the event loop, so their disposal is scheduled there.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._engines: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self._opening: dict[str, threading.Lock] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def cached(self, tenant: str) -> tuple | None:
+        with self._lock:
+            pair = self._engines.get(tenant)
+            if pair is not None:
+                self._engines.move_to_end(tenant)
+            return pair
+
+    async def aget(self, tenant: str) -> tuple:
+        """``get`` for the event loop: opening and migrating run on the threadpool."""
+        pair = self.cached(tenant)
+        if pair is None:
+            self._loop = asyncio.get_running_loop()
+            pair = await run_in_threadpool(self.get, tenant)
+        return pair
+
+    def get(self, tenant: str) -> tuple:
+        with self._lock:
+            pair = self._engines.get(tenant)
+            if pair is not None:
+                self._engines.move_to_end(tenant)
+                return pair
+            opening = self._opening.setdefault(tenant, threading.Lock())
+        # One thread opens (and migrates) a tenant while the others wait.
+        with opening:
+            with self._lock:
+                pair = self._engines.get(tenant)
+            if pair is None:
+                try:
+                    self._loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    pass
+                bind = open_tenant_engine(tenant)
+                url = tenant_url(tenant)
+                async_bind = create_async_engine(_async_url(url), **_engine_kwargs(url, settings.tenant_pool_size))
+                if bind.dialect.name == "sqlite":
+                    event.listen(async_bind.sync_engine, "connect", _sqlite_pragmas)
+                pair = (bind, async_bind)
+                with self._lock:
+                    self._engines[tenant] = pair
+                    self._opening.pop(tenant, None)
+                    evicted = []
+                    while len(self._engines) > self.maxsize:
+                        evicted.append(self._engines.popitem(last=False)[1])
+                for old in evicted:
+                    self._dispose(old)
+        return pair
+
+    def _dispose(self, pair: tuple) -> None:
+        bind, async_bind = pair
+        bind.dispose()
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(async_bind.dispose(), self._loop)
+        else:
+            async_bind.sync_engine.dispose(close=False)
+
+    def open(self) -> list[str]:
+        with self._lock:
+            return list(self._engines)
+
+    async def dispose(self) -> None:
+        with self._lock:
+            pairs = list(self._engines.values())
+            self._engines.clear()
+        for bind, async_bind in pairs:
+            bind.dispose()
+            await async_bind.dispose()
+
+
+tenant_engines = TenantEngines(settings.tenant_engine_cache) if settings.tenant_database_url else None
+
+
+def current_engines() -> tuple:
+    """(sync, async) engines of the tenant being served, or the main ones."""
+    tenant = current_tenant.get()
+    if tenant is None or tenant_engines is None:
+        return engine, async_engine
+    return tenant_engines.get(tenant)
+
+
+def _add_missing_columns(conn) -> None:
+    # Nullable columns added to a model after its table was created.
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            ddl = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {ddl}"))
+
+
+def create_db_and_tables(conn) -> None:
+    """Bring a database created by any earlier release up to the current models.
+
+    Used by the baseline migration; later schema changes are migrations of
+    their own.
+    """
+    _add_missing_columns(conn)
+    SQLModel.metadata.create_all(conn)
+    # create_all skips tables that already exist, so indexes added to a model
+    # after its table was created must be created explicitly.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(current_engines()[0]) as session:
+        yield session
+
+
+async def get_async_session():
+    tenant = current_tenant.get()
+    bind = async_engine if tenant is None or tenant_engines is None else (await tenant_engines.aget(tenant))[1]
+    # Objects are returned after commit and serialized outside the session,
+    # where an async session cannot lazy-load expired attributes.
+    async with AsyncSession(bind, expire_on_commit=False) as session:
         yield session
@@ -0,0 +1,342 @@
+"""Change events for agenda, tickets and coverages, streamed over SSE.
+
+Writes are captured by session hooks (like the dashboard cache) and
+delivered only after the transaction commits. Each event gets an increasing
+id; subscribers keep a bounded queue and can resume with ``Last-Event-ID``
+from the recent-event buffer. When the requested id is no longer available
+the stream sends a ``reset`` event and the client reloads its lists.
+
+Backends:
+
+- ``local``: events reach the subscribers of the process that committed them.
+- ``database``: events are written to ``streamevent`` in the writer's
+  transaction and every worker tails that table, so subscribers see writes
+  made by any worker and ids are shared between workers. Sequence ids can
+  commit out of order, so ids skipped by a poll are looked for again for
+  ``gap_timeout`` seconds before they are given up as rolled back.
+
+A ticket or coverage whose assignee changes also sends a ``remove`` event
+(``{"id", "from", "to"}``) to the funcionários who no longer see it, so
+their lists drop the row.
+
+In multi-tenant mode events carry the tenant that wrote them and reach only
+that tenant's subscribers; ``database`` is then not supported, since every
+tenant has its own database.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time as clock
+from collections import deque
+from itertools import chain
+from sqlalchemy import delete, event, func, insert, inspect, or_, select
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session
+from .config import settings
+from .db import current_tenant, engine
+from .models import Agenda, Coverage, Role, StreamEvent, Ticket, User
+
+logger = logging.getLogger(__name__)
+
+ENTITIES = {Agenda: "agenda", Ticket: "ticket", Coverage: "coverage"}
+
+RESET = {"id": None, "entity": "reset", "op": "reset", "data": None}
+
+
+def visible(user: User, item: dict) -> bool:
+    """Same scoping as the list endpoints of each entity."""
+    data = item["data"]
+    if item["op"] == "remove":
+        # The lists the row left: its previous assignee's, or every
+        # funcionário's for a ticket that was unassigned.
+        if user.role != Role.funcionario or data["to"] == user.id:
+            return False
+        return data["from"] == user.id or (data["from"] is None and item["entity"] == "ticket")
+    if user.role == Role.admin:
+        return True
+    if user.role == Role.morador:
+        return data.get("unit_id") == user.unit_id
+    if item["entity"] == "ticket":
+        return data.get("assigned_to") in (user.id, None)
+    if item["entity"] == "coverage":
+        return data.get("assigned_to") == user.id
+    return True
+
+
+class Subscription:
+    def __init__(self, broker: "EventBroker", user: User, maxsize: int):
+        self.broker = broker
+        self.user = user
+        self.tenant = current_tenant.get()
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize)
+        self.loop = asyncio.get_running_loop()
+
+    def offer(self, item: dict) -> None:
+        # Runs on the subscriber's loop. A client that falls this far behind
+        # is told to reload instead of stalling the publisher.
+        if item is not RESET and (item.get("tenant") != self.tenant or not visible(self.user, item)):
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESET)
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Fans committed events out to SSE subscribers in this process."""
+
+    def __init__(self, buffer_size: int):
+        self._buffer: deque[dict] = deque(maxlen=buffer_size)
+        self._subscribers: set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.backend = None
+
+    def deliver(self, items: list[dict]) -> None:
+        """Buffer ``items`` (already numbered) and hand them to every subscriber."""
+        with self._lock:
+            self._buffer.extend(items)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                for item in items:
+                    sub.loop.call_soon_threadsafe(sub.offer, item)
+            except RuntimeError:
+                # The subscriber's event loop is gone.
+                self.unsubscribe(sub)
+
+    def subscribe(self, user: User, last_event_id: int | None) -> tuple[Subscription, list[dict]]:
+        """Register a subscriber and return the events it missed since ``last_event_id``."""
+        sub = Subscription(self, user, settings.event_buffer_size)
+        # Registering and snapshotting under one lock means each event is
+        # either in the snapshot or offered to the new queue, never both.
+        with self._lock:
+            self._subscribers.add(sub)
+            buffered = list(self._buffer)
+        if last_event_id is None:
+            return sub, []
+        newest = self.backend.last_id()
+        if last_event_id > newest:
+            # An id this process never issued, e.g. from before a restart.
+            return sub, [RESET]
+        if last_event_id == newest:
+            return sub, []
+        if buffered and buffered[0]["id"] <= last_event_id + 1:
+            missed = [item for item in buffered if item["id"] > last_event_id]
+        else:
+            missed = self.backend.replay(last_event_id)
+            if missed is None:
+                return sub, [RESET]
+        return sub, [item for item in missed if item.get("tenant") == sub.tenant and visible(user, item)]
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+
+
+class LocalBackend:
+    """Numbers events in memory and delivers them after the writer commits."""
+
+    def __init__(self, broker: EventBroker):
+        self.broker = broker
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def record(self, session, items: list[dict]) -> None:
+        tenant = current_tenant.get()
+        for item in items:
+            item["tenant"] = tenant
+        session.info.setdefault("events_pending", []).extend(items)
+
+    def committed(self, session) -> None:
+        items = session.info.pop("events_pending", None)
+        if not items:
+            return
+        with self._lock:
+            for item in items:
+                item["id"] = self._next_id
+                self._next_id += 1
+            self.broker.deliver(items)
+
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def replay(self, last_event_id: int) -> list[dict] | None:
+        return None
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class DatabaseBackend:
+    """Outbox in ``streamevent``, tailed by one thread per worker."""
+
+    def __init__(self, broker: EventBroker, bind, poll_interval: float, retention: int, gap_timeout: float = 60.0):
+        self.broker = broker
+        self.bind = bind
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.gap_timeout = gap_timeout
+        self._last_id = 0
+        self._gaps: dict[int, float] = {}  # skipped id -> when it was first missed
+        self._since_trim = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def record(self, session, items: list[dict]) -> None:
+        rows = [{"entity": i["entity"], "op": i["op"], "payload": json.dumps(i["data"], ensure_ascii=False)} for i in items]
+        session.connection().execute(insert(StreamEvent), rows)
+        session.info["events_written"] = True
+
+    def committed(self, session) -> None:
+        if session.info.pop("events_written", None):
+            self._wakeup.set()
+
+    def last_id(self) -> int:
+        return self._last_id
+
+    @staticmethod
+    def _item(row: StreamEvent) -> dict:
+        return {"id": row.id, "entity": row.entity, "op": row.op, "data": json.loads(row.payload)}
+
+    def replay(self, last_event_id: int) -> list[dict] | None:
+        with Session(self.bind) as session:
+            first = session.exec(select(func.min(StreamEvent.id))).one()[0]
+            if first is None or first > last_event_id + 1:
+                return None
+            rows = session.exec(select(StreamEvent).where(StreamEvent.id > last_event_id, StreamEvent.id <= self._last_id).order_by(StreamEvent.id)).scalars().all()
+        return [self._item(row) for row in rows]
+
+    def poll(self) -> int:
+        now = clock.monotonic()
+        self._gaps = {row_id: since for row_id, since in self._gaps.items() if now - since < self.gap_timeout}
+        newer = StreamEvent.id > self._last_id
+        with Session(self.bind) as session:
+            rows = session.exec(
+                select(StreamEvent).where(or_(newer, StreamEvent.id.in_(self._gaps)) if self._gaps else newer).order_by(StreamEvent.id).limit(500)
+            ).scalars().all()
+            for row in rows:
+                if row.id <= self._last_id:
+                    del self._gaps[row.id]
+                    continue
+                for missing in range(self._last_id + 1, row.id):
+                    self._gaps[missing] = now
+                self._last_id = row.id
+            if rows:
+                self._since_trim += len(rows)
+                if self._since_trim >= 100:
+                    self._since_trim = 0
+                    session.exec(delete(StreamEvent).where(StreamEvent.id <= self._last_id - self.retention))
+                    session.commit()
+        if rows:
+            self.broker.deliver([self._item(row) for row in rows])
+        return len(rows)
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        with Session(self.bind) as session:
+            self._last_id = session.exec(select(func.max(StreamEvent.id))).one()[0] or 0
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="event-tail", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                while self.poll() == 500:
+                    pass
+            except Exception:
+                logger.exception("Falha ao ler eventos do banco")
+
+
+broker = EventBroker(settings.event_buffer_size)
+if settings.event_backend == "database" and settings.tenant_database_url:
+    raise RuntimeError("EVENT_BACKEND=database não é suportado no modo multi-condomínio")
+if settings.event_backend == "database":
+    broker.backend = DatabaseBackend(broker, engine, settings.event_poll_interval, settings.event_retention)
+else:
+    broker.backend = LocalBackend(broker)
+
+
+def record(session, entity: str, op: str, rows: list[dict]) -> None:
+    """Queue events for rows written outside the ORM (e.g. bulk UPDATEs)."""
+    broker.backend.record(session, [{"id": None, "entity": entity, "op": op, "data": row} for row in rows])
+
+
+def removal(entity: str, row_id: int, previous: int | None, current: int | None) -> dict | None:
+    """``remove`` event for a ticket or coverage reassigned from ``previous`` to ``current``, if a list loses it."""
+    if previous == current or (entity == "ticket" and current is None) or (entity == "coverage" and previous is None):
+        return None
+    return {"id": None, "entity": entity, "op": "remove", "data": {"id": row_id, "from": previous, "to": current}}
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _capture(session, flush_context) -> None:
+    items = []
+    for obj in chain(session.new, session.dirty):
+        entity = ENTITIES.get(type(obj))
+        if entity is None or (obj not in session.new and not session.is_modified(obj)):
+            continue
+        if entity != "agenda" and obj not in session.new:
+            previous = inspect(obj).attrs.assigned_to.history.deleted
+            removed = removal(entity, obj.id, previous[0], obj.assigned_to) if previous else None
+            if removed is not None:
+                items.append(removed)
+        items.append({"id": None, "entity": entity, "op": "create" if obj in session.new else "update", "data": obj.model_dump(mode="json", warnings=False)})
+    if items:
+        broker.backend.record(session, items)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish(session) -> None:
+    broker.backend.committed(session)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _discard(session) -> None:
+    session.info.pop("events_pending", None)
+    session.info.pop("events_written", None)
+
+
+def _sse(item: dict) -> str:
+    lines = [f"event: {item['entity']}"]
+    if item["id"] is not None:
+        lines.insert(0, f"id: {item['id']}")
+    lines.append("data: " + json.dumps({"op": item["op"], "data": item["data"]}, ensure_ascii=False))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_stream(sub: Subscription, backlog: list[dict]):
+    """Server-sent events for ``sub``, with a comment line as heartbeat."""
+    try:
+        yield "retry: 3000\n\n"
+        for item in backlog:
+            yield _sse(item)
+        while True:
+            try:
+                item = await asyncio.wait_for(sub.queue.get(), settings.event_heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield _sse(item)
+    finally:
+        sub.close()
@@ -0,0 +1,165 @@
+"""Conditional GETs and a response cache driven by per-table change counters.
+
+``tableversion`` holds one counter per cached table. Session hooks note the
+tables a transaction writes to and bump their counters with one UPDATE just
+before it commits, so all workers see the same versions and the counter rows
+stay locked only for the commit itself. Cached responses are keyed by tenant,
+path, query string and caller scope, and tagged with the versions they were built
+from: a request whose ``If-None-Match`` still matches gets ``304`` after
+reading only the counters, and an unchanged list is served from memory.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from itertools import chain
+from typing import Callable
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+from sqlalchemy import event, update
+from sqlalchemy.orm import Session as OrmSession
+from sqlmodel import Session, select
+from .config import settings
+from .db import current_tenant
+from .models import Role, TableVersion, User
+from .serialization import dumps
+
+# Tables whose reads are cached; writes to any other table are not tracked.
+CACHED_TABLES = ("user", "unit", "payment", "agenda", "coverage", "ticket", "round", "auditevent", "publicconfig", "lockwindow", "agendaexception")
+
+LIST_CACHE_CONTROL = "private, no-cache"
+
+
+def table_versions(session: Session, tables: tuple[str, ...]) -> tuple[int, ...]:
+    rows = dict(session.exec(select(TableVersion.name, TableVersion.version).where(TableVersion.name.in_(tables))).all())
+    return tuple(rows.get(name, 0) for name in tables)
+
+
+def _bump(session, tables: set[str]) -> None:
+    # Sorted so the primary key scan locks the rows in the same order in every
+    # transaction.
+    tables = sorted(tables & set(CACHED_TABLES))
+    if tables:
+        session.connection().execute(update(TableVersion).where(TableVersion.name.in_(tables)).values(version=TableVersion.version + 1))
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _track_flushed(session, flush_context) -> None:
+    tables = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        tables.add(obj.__table__.name)
+    if tables:
+        session.info.setdefault("tables_written", set()).update(tables)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _track_statements(state) -> None:
+    # Bulk INSERT/UPDATE/DELETE statements bypass the flush.
+    if state.is_insert or state.is_update or state.is_delete:
+        table = getattr(state.statement, "table", None)
+        if table is not None and table.name != TableVersion.__tablename__:
+            state.session.info.setdefault("tables_written", set()).add(table.name)
+
+
+@event.listens_for(OrmSession, "before_commit")
+def _bump_written(session) -> None:
+    if session.in_nested_transaction():
+        return
+    # commit() flushes pending objects only after this hook runs.
+    session.flush()
+    tables = session.info.pop("tables_written", None)
+    if tables:
+        _bump(session, tables)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_statements(session) -> None:
+    session.info.pop("tables_written", None)
+
+
+class ResponseCache:
+    """LRU of encoded response bodies, each tagged with its ETag."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple, tuple[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, etag: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, etag: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = ResponseCache(settings.response_cache_size)
+
+
+def scope(user: User | None) -> str:
+    """Callers that the list endpoints show the same rows to."""
+    if user is None:
+        return "public"
+    if user.role == Role.admin:
+        return "admin"
+    if user.role == Role.morador:
+        return f"morador:{user.unit_id}"
+    return f"funcionario:{user.id}"
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    return bool(header) and (header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")])
+
+
+async def cached_response(request: Request, session, user: User | None, tables: tuple[str, ...], build: Callable[[Session], object], cache_control: str = LIST_CACHE_CONTROL) -> Response:
+    """Answer a GET from the counters of ``tables``, running ``build`` only on a miss.
+
+    ``build`` receives a sync session (it runs under ``run_sync``) and
+    returns the JSON-compatible payload.
+    """
+    # Versions are read before the data, so a write landing in between only
+    # makes the cached body newer than its tag, never older.
+    versions = await session.run_sync(table_versions, tables)
+    key = (current_tenant.get(), request.url.path, scope(user), str(request.url.query))
+    etag = '"' + hashlib.sha1(repr((key, versions)).encode()).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if user is not None:
+        headers["Vary"] = "Authorization"
+    if _matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(key, etag) if settings.response_cache_enabled else None
+    if body is None:
+        data = await session.run_sync(build)
+        body = dumps(data)
+        if settings.response_cache_enabled:
+            response_cache.put(key, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that adds a ``Cache-Control`` header to the files it serves."""
+
+    def __init__(self, *args, cache_control: Callable[[str], str | None], **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        value = self.cache_control(str(full_path))
+        if value:
+            response.headers["Cache-Control"] = value
+        return response
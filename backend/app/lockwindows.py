@@ -0,0 +1,143 @@
+import threading
+import time as clock
+from bisect import bisect_left
+from datetime import datetime, time, timedelta
+from sqlalchemy import update
+from sqlmodel import Session, select
+from .config import settings
+from .db import current_tenant
+from .events import record
+from .models import Agenda, AgendaStatus, AgendaType, LockWindow
+
+DAY = 86400
+
+
+def _seconds(t: time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+class LockSchedule:
+    """Enabled lock windows as merged, sorted second-of-day intervals.
+
+    Windows that wrap midnight (22:00-06:00) are split in two. A booking is
+    blocked when [start, end) shares any instant with a window on any day it
+    touches; bookings lasting a full day or more always are.
+    """
+
+    def __init__(self, windows: list[LockWindow]):
+        spans = []
+        for w in windows:
+            if not w.enabled:
+                continue
+            s, e = _seconds(w.start_time), _seconds(w.end_time)
+            if s < e:
+                spans.append((s, e))
+            elif s > e:
+                spans.append((s, DAY))
+                if e:
+                    spans.append((0, e))
+        spans.sort()
+        merged: list[list[int]] = []
+        for s, e in spans:
+            if merged and s <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], e)
+            else:
+                merged.append([s, e])
+        # The same intervals shifted by one day, so a booking crossing
+        # midnight is checked against both days with one bisect.
+        self.intervals = [(s, e) for s, e in merged] + [(s + DAY, e + DAY) for s, e in merged]
+        self.starts = [s for s, _ in self.intervals]
+
+    def blocks(self, start: datetime, end: datetime) -> bool:
+        if not self.intervals or end <= start:
+            return False
+        length = (end - start).total_seconds()
+        if length >= DAY:
+            return True
+        offset = start.hour * 3600 + start.minute * 60 + start.second + start.microsecond / 1e6
+        finish = offset + length
+        # Intervals are disjoint, so the last one starting before ``finish``
+        # is the only one that can still reach past ``offset``.
+        i = bisect_left(self.starts, finish) - 1
+        return i >= 0 and self.intervals[i][1] > offset
+
+    def blocks_many(self, spans: list[tuple[datetime, datetime]]) -> list[bool]:
+        return [self.blocks(start, end) for start, end in spans]
+
+    def split(self, start: datetime, end: datetime) -> list[tuple[datetime, datetime, bool]]:
+        """Cut [start, end) at window edges; each piece is flagged when it lies inside a window."""
+        daily = self.intervals[: len(self.intervals) // 2]
+        locked: list[list[datetime]] = []
+        day = datetime.combine(start.date(), time())
+        while day < end:
+            for s, e in daily:
+                a, b = max(start, day + timedelta(seconds=s)), min(end, day + timedelta(seconds=e))
+                if a >= b:
+                    continue
+                # Windows wrapping midnight end one day where they start the next.
+                if locked and locked[-1][1] >= a:
+                    locked[-1][1] = max(locked[-1][1], b)
+                else:
+                    locked.append([a, b])
+            day += timedelta(days=1)
+        pieces, cursor = [], start
+        for a, b in locked:
+            if cursor < a:
+                pieces.append((cursor, a, False))
+            pieces.append((a, b, True))
+            cursor = b
+        if cursor < end:
+            pieces.append((cursor, end, False))
+        return pieces
+
+
+# (schedule, loaded_at) per tenant; None is the single-tenant database.
+_schedules: dict[str | None, tuple[LockSchedule, float]] = {}
+_lock = threading.Lock()
+
+
+def get_lock_schedule(session: Session) -> LockSchedule:
+    """Return the cached schedule, loading it at most every ``lock_window_cache_ttl`` seconds."""
+    tenant = current_tenant.get()
+    with _lock:
+        entry = _schedules.get(tenant)
+        if entry is not None and clock.monotonic() - entry[1] < settings.lock_window_cache_ttl:
+            return entry[0]
+    schedule = LockSchedule(session.exec(select(LockWindow).where(LockWindow.enabled == True)).all())
+    with _lock:
+        _schedules[tenant] = (schedule, clock.monotonic())
+    return schedule
+
+
+def invalidate_lock_schedule() -> None:
+    with _lock:
+        _schedules.pop(current_tenant.get(), None)
+
+
+def reevaluate_pending_agendas(session: Session, schedule: LockSchedule, batch_size: int = 1000) -> int:
+    """Approve future pending visits that the current windows no longer block.
+
+    Only ``visita`` bookings held for approval by a window are considered;
+    other types always need approval. Rows are evaluated in batches and approved with one UPDATE per
+    batch. Returns the number of approved bookings; the caller commits.
+    """
+    approved = 0
+    last_id = 0
+    now = datetime.now()
+    while True:
+        rows = session.exec(
+            select(Agenda.id, Agenda.start_at, Agenda.end_at)
+            .where(Agenda.id > last_id, Agenda.type == AgendaType.visita, Agenda.status == AgendaStatus.pendente, Agenda.requires_approval == True, Agenda.start_at >= now)
+            .order_by(Agenda.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return approved
+        last_id = rows[-1][0]
+        blocked = schedule.blocks_many([(start, end) for _, start, end in rows])
+        ids = [row[0] for row, is_blocked in zip(rows, blocked) if not is_blocked]
+        if ids:
+            session.exec(update(Agenda).where(Agenda.id.in_(ids)).values(status=AgendaStatus.aprovado, requires_approval=False))
+            approved += len(ids)
+            changed = session.exec(select(Agenda).where(Agenda.id.in_(ids))).all()
+            record(session, "agenda", "update", [ag.model_dump(mode="json") for ag in changed])
@@ -1,58 +1,128 @@
 from pathlib import Path
-from uuid import uuid4
-from fastapi import Depends, FastAPI, HTTPException, UploadFile, File
+from datetime import datetime, date, timedelta
+from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlmodel import Session, select, func
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import insert
+from sqlmodel import Session, select
 from .config import settings
-from .db import create_db_and_tables, get_session, engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .db import current_engines, current_tenant, get_session, get_async_session, engine, async_engine, tenant_engines
 from .models import *
 from .schemas import *
-from .auth import create_access_token, verify_password, hash_password, get_current_user, require_roles
-from .seed import seed_data
-from .services import add_audit, has_overlap, in_lock_window
-
-app = FastAPI(title="Vigilância Patrimonial API", version="1.0.0")
+from .auth import create_access_token, get_current_user, require_roles
+from .passwords import needs_rehash, password_pool
+from .migrations import migrate
+from .services import add_audit, has_conflict
+from .recurrence import agenda_page, last_end, rule_error, starts
+from .lockwindows import get_lock_schedule, invalidate_lock_schedule, reevaluate_pending_agendas
+from .audit import audit_sink
+from .archive import audit_archiver, audit_page
+from .scheduler import payment_scheduler
+from .assignment import assign_coverages, rebalance
+from .transitions import ROLES, apply_transitions
+from .availability import availability
+from .metrics import LOCAL_CLIENTS, MetricsMiddleware, profiler, registry
+from .pagination import paginate
+from .uploads import STORAGE_DIR, check_image, uploaded_files
+from .blobs import add_blob_refs, release_blob_refs, store_upload, store_uploads
+from .thumbnails import thumbnail_worker
+from .events import broker, sse_stream
+from .serialization import columns
+from .httpcache import CachedStaticFiles, cached_response
+from .bulk import BulkEntity, BulkFormat, MEDIA_TYPES, detect_format, export_rows, import_rows, read_rows
+from .dashboards import FINANCE, OPERATIONS, cache_get, cache_put, finance_summary, operations_summary
+from .tenants import TenantMiddleware, tenant_jobs
+
+app = FastAPI(title="Vigilância Patrimonial API", version="1.0.0", default_response_class=ORJSONResponse)
+if settings.tenant_database_url:
+    app.add_middleware(TenantMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.cors_origin, "http://127.0.0.1:5173", "http://localhost:4173", "http://127.0.0.1:4173"],
     allow_origin_regex=r"http://(localhost|127\.0\.0\.1)(:\d+)?",
-    allow_origins=[settings.cors_origin],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 BASE = Path(__file__).resolve().parents[1]
-storage = BASE / "storage"
+storage = STORAGE_DIR
 public = BASE / "public"
 storage.mkdir(exist_ok=True)
 public.mkdir(exist_ok=True)
-app.mount("/storage", StaticFiles(directory=str(storage)), name="storage")
-app.mount("/public", StaticFiles(directory=str(public)), name="public")
+
+
+def _storage_cache_control(path: str) -> str:
+    # Blobs and their derivatives are named by content hash and never change.
+    if "/blobs/" in path or "/derived/" in path:
+        return "public, max-age=31536000, immutable"
+    return f"public, max-age={settings.static_max_age}"
+
+
+app.mount("/storage", CachedStaticFiles(directory=str(storage), cache_control=_storage_cache_control), name="storage")
+app.mount("/public", CachedStaticFiles(directory=str(public), cache_control=lambda path: f"public, max-age={settings.static_max_age}"), name="public")
+
+PageLimit = Query(settings.page_size_default, ge=1, le=settings.page_size_max)
 
 
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
-    with Session(engine) as s:
-        seed_data(s)
+    migrate(engine)
+    if settings.audit_mode == "batched":
+        audit_sink.start()
+    thumbnail_worker.start()
+    password_pool.start()
+    broker.backend.start()
+    if settings.tenant_database_url:
+        # Per-tenant passes over the tenant databases; the main one is only the catalog.
+        tenant_jobs.start()
+    else:
+        thumbnail_worker.backfill()
+        if settings.audit_retention_days > 0:
+            audit_archiver.start()
+        if settings.payment_schedule_interval > 0:
+            payment_scheduler.start()
+    if profiler is not None:
+        profiler.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await run_in_threadpool(audit_sink.stop)
+    await run_in_threadpool(audit_archiver.stop)
+    await run_in_threadpool(payment_scheduler.stop)
+    await run_in_threadpool(tenant_jobs.stop)
+    if profiler is not None:
+        await run_in_threadpool(profiler.stop)
+    await run_in_threadpool(thumbnail_worker.stop)
+    await run_in_threadpool(password_pool.stop)
+    await run_in_threadpool(broker.backend.stop)
+    await async_engine.dispose()
+    if tenant_engines is not None:
+        await tenant_engines.dispose()
 
 
 @app.post("/auth/login", response_model=TokenResponse)
-def login(data: LoginRequest, session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.email == data.email)).first()
-    if not user or not verify_password(data.password, user.password_hash):
+async def login(data: LoginRequest, session: AsyncSession = Depends(get_async_session)):
+    user = (await session.exec(select(User).where(User.email == data.email))).first()
+    if not user or not await password_pool.verify(data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Credenciais inválidas")
-    token = create_access_token(user.email)
+    if needs_rehash(user.password_hash):
+        user.password_hash = await password_pool.hash(data.password)
+        session.add(user)
+    token = create_access_token(user.email, user_id=user.id, tenant=current_tenant.get())
     add_audit(session, user.id, "login", "auth", user.id)
+    await session.commit()
     return TokenResponse(access_token=token)
 
 
 @app.get("/public-config")
-def get_public_config(session: Session = Depends(get_session)):
-    cfg = session.exec(select(PublicConfig)).first()
-    return cfg
+async def get_public_config(request: Request, session: AsyncSession = Depends(get_async_session)):
+    build = lambda s: s.exec(select(PublicConfig)).first()
+    return await cached_response(request, session, None, ("publicconfig",), build, cache_control=f"public, max-age={settings.public_config_max_age}")
 
 
 @app.put("/admin/public-config")
@@ -60,240 +130,544 @@ def update_public_config(data: PublicConfigUpdate, user: User = Depends(require_
     cfg = session.exec(select(PublicConfig)).first()
     cfg.brand_name, cfg.primary_color, cfg.secondary_color = data.brand_name, data.primary_color, data.secondary_color
     session.add(cfg)
-    session.commit()
     add_audit(session, user.id, "update", "public_config", cfg.id)
+    session.commit(); session.refresh(cfg)
     return cfg
 
 
 @app.post("/admin/public-config/logo")
-def upload_logo(file: UploadFile = File(...), user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    ext = Path(file.filename).suffix or ".svg"
-    rel = f"logo{ext}"
-    target = public / rel
-    target.write_bytes(file.file.read())
-    cfg = session.exec(select(PublicConfig)).first()
-    cfg.logo_path = f"/public/{rel}"
+async def upload_logo(file: UploadFile = File(...), user: User = Depends(require_roles(Role.admin)), session: AsyncSession = Depends(get_async_session)):
+    check_image(file)
+    blob = await store_upload(file)
+    cfg = (await session.exec(select(PublicConfig))).first()
+    if cfg.logo_blob != blob.sha256:
+        await session.run_sync(add_blob_refs, [blob])
+        await session.run_sync(release_blob_refs, [cfg.logo_blob])
+    cfg.logo_path, cfg.logo_blob = blob.url, blob.sha256
     session.add(cfg)
-    session.commit()
     add_audit(session, user.id, "upload", "logo", cfg.id)
+    await session.commit()
     return {"logo_path": cfg.logo_path}
 
 
 
 
 @app.get("/me")
-def me(user: User = Depends(get_current_user)):
+async def me(user: User = Depends(get_current_user)):
     return user
 
 @app.post("/users", response_model=UserOut)
-def create_user(data: UserCreate, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    if session.exec(select(User).where(User.email == data.email)).first():
+async def create_user(data: UserCreate, user: User = Depends(require_roles(Role.admin)), session: AsyncSession = Depends(get_async_session)):
+    if (await session.exec(select(User).where(User.email == data.email))).first():
         raise HTTPException(400, "E-mail já cadastrado")
-    db_u = User(name=data.name, email=data.email, password_hash=hash_password(data.password), role=data.role, unit_id=data.unit_id)
-    session.add(db_u)
-    session.commit(); session.refresh(db_u)
+    db_u = User(name=data.name, email=data.email, password_hash=await password_pool.hash(data.password), role=data.role, unit_id=data.unit_id)
+    session.add(db_u); await session.flush()
     add_audit(session, user.id, "create", "user", db_u.id)
+    await session.commit()
     return UserOut(id=db_u.id, name=db_u.name, email=db_u.email, role=db_u.role, unit_id=db_u.unit_id)
 
 
+@app.patch("/users/{user_id}/active")
+def set_user_active(user_id: int, data: UserActive, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
+    target = session.get(User, user_id)
+    if not target:
+        raise HTTPException(404, "Usuário não encontrado")
+    target.active = data.active
+    session.add(target)
+    add_audit(session, user.id, "update", "user", target.id, "ativo" if data.active else "inativo")
+    if not data.active and target.role == Role.funcionario:
+        # Open coverages of the guard go to the remaining guards in the same transaction.
+        moved = rebalance(session)
+        if moved:
+            add_audit(session, user.id, "rebalance", "coverage", None, f"{moved} coberturas redistribuídas")
+    session.commit(); session.refresh(target)
+    return target.model_dump(exclude={"password_hash"})
+
+
 @app.get("/users")
-def list_users(user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    return session.exec(select(User)).all()
+async def list_users(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    role: Role | None = None,
+    unit_id: int | None = None,
+    active: bool | None = None,
+    user: User = Depends(require_roles(Role.admin)),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(User, exclude=("password_hash",)))
+    if role is not None:
+        q = q.where(User.role == role)
+    if unit_id is not None:
+        q = q.where(User.unit_id == unit_id)
+    if active is not None:
+        q = q.where(User.active == active)
+    return await cached_response(request, session, user, ("user",), lambda s: paginate(s, q, User, cursor=cursor, limit=limit))
 
 
 @app.post("/units")
 def create_unit(data: UnitCreate, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
     unit = Unit(**data.model_dump())
-    session.add(unit); session.commit(); session.refresh(unit)
+    session.add(unit); session.flush()
     add_audit(session, user.id, "create", "unit", unit.id)
+    session.commit(); session.refresh(unit)
     return unit
 
 
 @app.get("/units")
-def list_units(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+async def list_units(request: Request, user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
     if user.role == Role.morador and user.unit_id:
-        return [session.get(Unit, user.unit_id)]
-    return session.exec(select(Unit)).all()
+        build = lambda s: [s.get(Unit, user.unit_id)]
+    else:
+        build = lambda s: s.exec(select(Unit)).all()
+    return await cached_response(request, session, user, ("unit",), build)
 
 
 @app.post("/payments")
 def create_payment(data: PaymentCreate, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
     p = Payment(**data.model_dump())
-    session.add(p); session.commit(); session.refresh(p)
+    session.add(p); session.flush()
     add_audit(session, user.id, "create", "payment", p.id)
+    session.commit(); session.refresh(p)
     return p
 
 
 @app.get("/payments")
-def list_payments(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    q = select(Payment)
+async def list_payments(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    unit_id: int | None = None,
+    status: PaymentStatus | None = None,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(Payment))
     if user.role == Role.morador:
         q = q.where(Payment.unit_id == user.unit_id)
-    return session.exec(q).all()
+    if unit_id is not None:
+        q = q.where(Payment.unit_id == unit_id)
+    if status is not None:
+        q = q.where(Payment.status == status)
+    if date_from is not None:
+        q = q.where(Payment.due_date >= date_from)
+    if date_to is not None:
+        q = q.where(Payment.due_date < date_to)
+    return await cached_response(request, session, user, ("payment",), lambda s: paginate(s, q, Payment, cursor=cursor, limit=limit))
 
 
 @app.post("/agenda")
-def create_agenda(data: AgendaCreate, user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+async def create_agenda(data: AgendaCreate, user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
     if user.role == Role.morador and user.unit_id != data.unit_id:
         raise HTTPException(403, "Morador só pode criar agenda da própria unidade")
     if data.end_at <= data.start_at:
         raise HTTPException(400, "Data final deve ser posterior à inicial")
-    if has_overlap(session, data.unit_id, data.start_at, data.end_at):
+    invalid = rule_error(data)
+    if invalid:
+        raise HTTPException(400, invalid[1])
+    if await session.run_sync(has_conflict, data):
         raise HTTPException(400, "Conflito de agenda para a unidade (interval overlap)")
 
-    lock = session.exec(select(LockWindow).where(LockWindow.enabled == True)).first()
-    blocked = lock and in_lock_window(data.start_at, data.end_at, lock)
+    schedule = await session.run_sync(get_lock_schedule)
+    blocked = schedule.blocks(data.start_at, data.end_at)
     requires = data.type in [AgendaType.mudanca, AgendaType.prestador] or (data.type == AgendaType.visita and blocked)
     status = AgendaStatus.pendente if requires else AgendaStatus.aprovado
 
-    ag = Agenda(**data.model_dump(), requester_id=user.id, requires_approval=bool(requires), status=status)
-    session.add(ag); session.commit(); session.refresh(ag)
+    ag = Agenda(**data.model_dump(), requester_id=user.id, requires_approval=bool(requires), status=status, series_end_at=last_end(data) if data.recurrence else None)
+    session.add(ag); await session.flush()
     add_audit(session, user.id, "create", "agenda", ag.id)
 
     if data.type == AgendaType.saida:
         cov = Coverage(unit_id=ag.unit_id, from_agenda_id=ag.id, title=f"Cobertura automática da saída #{ag.id}")
-        session.add(cov); session.commit(); add_audit(session, user.id, "create", "coverage", cov.id, "Gerada automaticamente por saída")
+        await session.run_sync(assign_coverages, [cov])
+        session.add(cov); await session.flush(); add_audit(session, user.id, "create", "coverage", cov.id, "Gerada automaticamente por saída")
 
+    await session.commit()
     return ag
 
 
 @app.get("/agenda")
-def list_agenda(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    q = select(Agenda)
+async def list_agenda(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    unit_id: int | None = None,
+    status: AgendaStatus | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(Agenda))
     if user.role == Role.morador:
         q = q.where(Agenda.unit_id == user.unit_id)
-    return session.exec(q).all()
+    if unit_id is not None:
+        q = q.where(Agenda.unit_id == unit_id)
+    if status is not None:
+        q = q.where(Agenda.status == status)
+    return await cached_response(request, session, user, ("agenda", "agendaexception"), lambda s: agenda_page(s, q, cursor=cursor, limit=limit, date_from=date_from, date_to=date_to))
+
+
+@app.get("/agenda/availability")
+async def agenda_availability(
+    request: Request,
+    date_from: datetime,
+    date_to: datetime,
+    unit_id: list[int] | None = Query(None),
+    min_minutes: int = Query(0, ge=0),
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    if date_to <= date_from:
+        raise HTTPException(400, "Data final deve ser posterior à inicial")
+    if date_to - date_from > timedelta(days=settings.availability_max_days):
+        raise HTTPException(400, f"Intervalo máximo de {settings.availability_max_days} dias")
+    if user.role == Role.morador:
+        if unit_id and set(unit_id) != {user.unit_id}:
+            raise HTTPException(403, "Morador só pode consultar a própria unidade")
+        unit_id = [user.unit_id]
+    return await cached_response(request, session, user, ("agenda", "agendaexception", "unit", "lockwindow"), lambda s: {"date_from": date_from, "date_to": date_to, "units": availability(s, unit_id, date_from, date_to, min_minutes)})
+
+
+@app.post("/agenda/{agenda_id}/exceptions")
+def cancel_occurrence(agenda_id: int, data: AgendaExceptionCreate, user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+    ag = session.get(Agenda, agenda_id)
+    if not ag:
+        raise HTTPException(404, "Agenda não encontrada")
+    if user.role == Role.morador and user.unit_id != ag.unit_id:
+        raise HTTPException(403, "Morador só pode alterar agenda da própria unidade")
+    if ag.recurrence is None:
+        raise HTTPException(400, "Agenda não é recorrente")
+    if next(starts(ag, data.occurrence_at), None) != data.occurrence_at:
+        raise HTTPException(400, "Data não corresponde a uma ocorrência da série")
+    exc = session.exec(select(AgendaException).where(AgendaException.agenda_id == agenda_id, AgendaException.occurrence_at == data.occurrence_at)).first()
+    if exc is None:
+        exc = AgendaException(agenda_id=agenda_id, occurrence_at=data.occurrence_at)
+        session.add(exc); session.flush()
+        add_audit(session, user.id, "cancel_occurrence", "agenda", agenda_id, data.occurrence_at.isoformat())
+        session.commit(); session.refresh(exc)
+    return exc
 
 
 @app.patch("/agenda/{agenda_id}/approve")
-def approve_agenda(agenda_id: int, data: AgendaApprove, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
+def approve_agenda(agenda_id: int, data: AgendaApprove, user: User = Depends(require_roles(*ROLES["agenda"])), session: Session = Depends(get_session)):
     ag = session.get(Agenda, agenda_id)
     if not ag:
         raise HTTPException(404, "Agenda não encontrada")
+    if ag.status == AgendaStatus.recusado and data.status != AgendaStatus.recusado:
+        if has_conflict(session, ag, exclude_id=ag.id):
+            raise HTTPException(400, "Conflito de agenda para a unidade (interval overlap)")
     ag.status = data.status
-    session.add(ag); session.commit()
+    session.add(ag)
     add_audit(session, user.id, "approve", "agenda", agenda_id, data.status)
+    session.commit(); session.refresh(ag)
     return ag
 
 
 @app.get("/coverages")
-def list_coverages(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    q = select(Coverage)
+async def list_coverages(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    unit_id: int | None = None,
+    status: CoverageStatus | None = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(Coverage))
     if user.role == Role.funcionario:
         q = q.where(Coverage.assigned_to == user.id)
     if user.role == Role.morador:
         q = q.where(Coverage.unit_id == user.unit_id)
-    return session.exec(q).all()
+    if unit_id is not None:
+        q = q.where(Coverage.unit_id == unit_id)
+    if status is not None:
+        q = q.where(Coverage.status == status)
+    return await cached_response(request, session, user, ("coverage",), lambda s: paginate(s, q, Coverage, cursor=cursor, limit=limit))
 
 
 @app.patch("/coverages/{coverage_id}")
-def assign_coverage(coverage_id: int, data: CoverageAssign, user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: Session = Depends(get_session)):
+def assign_coverage(coverage_id: int, data: CoverageAssign, user: User = Depends(require_roles(*ROLES["coverage"])), session: Session = Depends(get_session)):
     c = session.get(Coverage, coverage_id)
     if not c:
         raise HTTPException(404, "Cobertura não encontrada")
     c.assigned_to = data.assigned_to
     c.status = data.status
-    session.add(c); session.commit()
+    session.add(c)
     add_audit(session, user.id, "update", "coverage", c.id)
+    session.commit(); session.refresh(c)
     return c
 
 
+@app.post("/coverages/rebalance")
+def rebalance_coverages(user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
+    moved = rebalance(session)
+    if moved:
+        add_audit(session, user.id, "rebalance", "coverage", None, f"{moved} coberturas redistribuídas")
+    session.commit()
+    return {"reassigned": moved}
+
+
 @app.post("/tickets")
 def create_ticket(data: TicketCreate, user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     if user.role == Role.morador and user.unit_id != data.unit_id:
         raise HTTPException(403, "Morador só pode abrir ticket da própria unidade")
     t = Ticket(unit_id=data.unit_id, opened_by=user.id, title=data.title, description=data.description)
-    session.add(t); session.commit(); session.refresh(t)
+    session.add(t); session.flush()
     add_audit(session, user.id, "create", "ticket", t.id)
+    session.commit(); session.refresh(t)
     return t
 
 
 @app.get("/tickets")
-def list_tickets(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    q = select(Ticket)
+async def list_tickets(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    unit_id: int | None = None,
+    status: TicketStatus | None = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(Ticket))
     if user.role == Role.funcionario:
         q = q.where((Ticket.assigned_to == user.id) | (Ticket.assigned_to == None))
     if user.role == Role.morador:
         q = q.where(Ticket.unit_id == user.unit_id)
-    return session.exec(q).all()
+    if unit_id is not None:
+        q = q.where(Ticket.unit_id == unit_id)
+    if status is not None:
+        q = q.where(Ticket.status == status)
+    return await cached_response(request, session, user, ("ticket",), lambda s: paginate(s, q, Ticket, cursor=cursor, limit=limit))
 
 
 @app.patch("/tickets/{ticket_id}")
-def update_ticket(ticket_id: int, data: TicketUpdate, user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: Session = Depends(get_session)):
+def update_ticket(ticket_id: int, data: TicketUpdate, user: User = Depends(require_roles(*ROLES["ticket"])), session: Session = Depends(get_session)):
     t = session.get(Ticket, ticket_id)
     if not t:
         raise HTTPException(404, "Ticket não encontrado")
     t.status = data.status
     if data.assigned_to is not None:
         t.assigned_to = data.assigned_to
-    session.add(t); session.commit()
+    session.add(t)
     add_audit(session, user.id, "update", "ticket", t.id)
+    session.commit(); session.refresh(t)
     return t
 
 
+@app.post("/transitions")
+def batch_transitions(data: TransitionBatch, user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: Session = Depends(get_session)):
+    if len(data.items) > settings.transition_batch_max:
+        raise HTTPException(400, f"Máximo de {settings.transition_batch_max} itens por lote")
+    results = apply_transitions(session, user, data.items)
+    session.commit()
+    updated = sum(r["ok"] for r in results)
+    return {"updated": updated, "failed": len(results) - updated, "results": results}
+
+
 @app.post("/rounds")
 def create_round(data: RoundCreate, user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: Session = Depends(get_session)):
     employee_id = user.id if user.role == Role.funcionario else user.id
     r = Round(unit_id=data.unit_id, employee_id=employee_id, location=data.location, happened_at=data.happened_at, observation=data.observation)
-    session.add(r); session.commit(); session.refresh(r)
+    session.add(r); session.flush()
     add_audit(session, user.id, "create", "round", r.id)
+    session.commit(); session.refresh(r)
     return r
 
 
-@app.post("/rounds/{round_id}/photos")
-def upload_round_photo(round_id: int, files: list[UploadFile] = File(...), user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: Session = Depends(get_session)):
-    r = session.get(Round, round_id)
+# Declared by hand: upload_round_photo parses the body itself.
+PHOTOS_BODY = {"required": True, "content": {"multipart/form-data": {"schema": {"type": "object", "required": ["files"], "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}}}}}}
+
+
+@app.post("/rounds/{round_id}/photos", openapi_extra={"requestBody": PHOTOS_BODY})
+async def upload_round_photo(round_id: int, request: Request, user: User = Depends(require_roles(Role.admin, Role.funcionario)), session: AsyncSession = Depends(get_async_session)):
+    r = await session.get(Round, round_id)
     if not r:
         raise HTTPException(404, "Ronda não encontrada")
-    saved = []
-    for f in files:
-        ext = Path(f.filename).suffix
-        fname = f"round_{round_id}_{uuid4().hex}{ext}"
-        target = storage / fname
-        target.write_bytes(f.file.read())
-        meta = RoundPhoto(round_id=round_id, file_path=f"/storage/{fname}", uploaded_by=user.id)
-        up = UploadMeta(original_name=f.filename, file_path=meta.file_path, uploaded_by=user.id)
-        session.add(meta); session.add(up)
-        saved.append(meta.file_path)
-    session.commit()
-    add_audit(session, user.id, "upload", "round_photos", round_id, f"{len(saved)} fotos")
+    # The body is parsed here, after the checks above, so limits apply before it is spooled.
+    async with uploaded_files(request, "files", settings.upload_max_files, settings.upload_max_bytes) as files:
+        for f in files:
+            check_image(f)
+        stored = await store_uploads(files)
+        filenames = [f.filename for f in files]
+    # Retried uploads of a photo already attached to this round add nothing.
+    attached = set((await session.exec(select(RoundPhoto.blob_sha256).where(RoundPhoto.round_id == round_id, RoundPhoto.blob_sha256.in_([b.sha256 for b in stored])))).all())
+    photos, metas, fresh = [], [], []
+    for filename, blob in zip(filenames, stored):
+        if blob.sha256 in attached:
+            continue
+        attached.add(blob.sha256)
+        fresh.append(blob)
+        photos.append({"round_id": round_id, "file_path": blob.url, "blob_sha256": blob.sha256, "uploaded_by": user.id})
+        metas.append({"original_name": filename, "file_path": blob.url, "blob_sha256": blob.sha256, "uploaded_by": user.id})
+    saved = [blob.url for blob in stored]
+    if not photos:
+        return {"files": saved}
+    photo_ids = (await session.exec(insert(RoundPhoto).returning(RoundPhoto.id), params=photos)).scalars().all()
+    await session.exec(insert(UploadMeta), params=metas)
+    await session.run_sync(add_blob_refs, fresh + fresh)
+    add_audit(session, user.id, "upload", "round_photos", round_id, f"{len(photos)} fotos")
+    await session.commit()
+    for photo_id in photo_ids:
+        thumbnail_worker.enqueue(photo_id)
     return {"files": saved}
 
 
+@app.get("/rounds/{round_id}/photos")
+async def list_round_photos(round_id: int, user: User = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    r = await session.get(Round, round_id)
+    if not r or (user.role == Role.funcionario and r.employee_id != user.id) or (user.role == Role.morador and r.unit_id != user.unit_id):
+        raise HTTPException(404, "Ronda não encontrada")
+    return (await session.exec(select(RoundPhoto).where(RoundPhoto.round_id == round_id).order_by(RoundPhoto.id))).all()
+
+
 @app.get("/rounds")
-def list_rounds(user: User = Depends(get_current_user), session: Session = Depends(get_session)):
-    q = select(Round)
+async def list_rounds(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    unit_id: int | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
+):
+    q = select(*columns(Round))
     if user.role == Role.funcionario:
         q = q.where(Round.employee_id == user.id)
     if user.role == Role.morador:
         q = q.where(Round.unit_id == user.unit_id)
-    return session.exec(q).all()
+    if unit_id is not None:
+        q = q.where(Round.unit_id == unit_id)
+    if date_from is not None:
+        q = q.where(Round.happened_at >= date_from)
+    if date_to is not None:
+        q = q.where(Round.happened_at < date_to)
+    return await cached_response(request, session, user, ("round",), lambda s: paginate(s, q, Round, cursor=cursor, limit=limit, sort=Round.happened_at, descending=True))
 
 
 @app.post("/lock-windows")
 def create_lock_window(data: LockWindowCreate, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
     lock = LockWindow(**data.model_dump())
-    session.add(lock); session.commit(); session.refresh(lock)
+    session.add(lock); session.flush()
     add_audit(session, user.id, "create", "lock_window", lock.id)
+    session.commit()
+    _apply_lock_windows(session, user)
+    session.refresh(lock)
     return lock
 
 
+@app.patch("/lock-windows/{lock_id}")
+def update_lock_window(lock_id: int, data: LockWindowCreate, user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
+    lock = session.get(LockWindow, lock_id)
+    if not lock:
+        raise HTTPException(404, "Janela de bloqueio não encontrada")
+    lock.start_time, lock.end_time, lock.enabled = data.start_time, data.end_time, data.enabled
+    session.add(lock)
+    add_audit(session, user.id, "update", "lock_window", lock.id)
+    session.commit()
+    _apply_lock_windows(session, user)
+    session.refresh(lock)
+    return lock
+
+
+def _apply_lock_windows(session: Session, user: User) -> None:
+    invalidate_lock_schedule()
+    approved = reevaluate_pending_agendas(session, get_lock_schedule(session))
+    if approved:
+        add_audit(session, user.id, "reevaluate", "agenda", None, f"{approved} agendas aprovadas após mudança nas janelas de bloqueio")
+        session.commit()
+
+
 @app.get("/audit")
-def list_audit(user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    return session.exec(select(AuditEvent).order_by(AuditEvent.happened_at.desc())).all()
+async def list_audit(
+    request: Request,
+    cursor: str | None = None,
+    limit: int = PageLimit,
+    entity: str | None = None,
+    entity_id: int | None = None,
+    user_id: int | None = None,
+    action: str | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    user: User = Depends(require_roles(Role.admin)),
+    session: AsyncSession = Depends(get_async_session),
+):
+    filters = {"entity": entity, "entity_id": entity_id, "user_id": user_id, "action": action, "date_from": date_from, "date_to": date_to}
+    return await cached_response(request, session, user, ("auditevent",), lambda s: audit_page(s, cursor=cursor, limit=limit, **filters))
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if settings.metrics_token:
+        if request.headers.get("authorization") != f"Bearer {settings.metrics_token}":
+            raise HTTPException(401, "Token inválido")
+    elif request.client is None or request.client.host not in LOCAL_CLIENTS:
+        raise HTTPException(403, "Métricas disponíveis apenas localmente sem METRICS_TOKEN")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/events")
+async def stream_events(request: Request, token: str | None = None, last_event_id: int | None = None, session: AsyncSession = Depends(get_async_session)):
+    # EventSource cannot send headers, so the token may also come in the query string.
+    header = request.headers.get("authorization", "")
+    token = token or (header[7:] if header.lower().startswith("bearer ") else None)
+    if not token:
+        raise HTTPException(401, "Token inválido")
+    user = await get_current_user(token, session)
+    resume = request.headers.get("last-event-id") or last_event_id
+    try:
+        resume = int(resume) if resume else None
+    except ValueError:
+        resume = None
+    sub, backlog = broker.subscribe(user, resume)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(sse_stream(sub, backlog), media_type="text/event-stream", headers=headers)
 
 
 @app.get("/dashboard/finance")
-def dashboard_finance(user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    paid = session.exec(select(func.count(Payment.id)).where(Payment.status == PaymentStatus.pago)).one()
-    pending = session.exec(select(func.count(Payment.id)).where(Payment.status == PaymentStatus.pendente)).one()
-    late = session.exec(select(func.count(Payment.id)).where(Payment.status == PaymentStatus.atrasado)).one()
-    return {"paid": paid, "pending": pending, "late": late, "inadimplencia_mensal": late}
+async def dashboard_finance(
+    months: int = Query(12, ge=1, le=60),
+    user: User = Depends(require_roles(Role.admin)),
+    session: AsyncSession = Depends(get_async_session),
+):
+    key = (FINANCE, months)
+    data = cache_get(key)
+    if data is None:
+        data = await session.run_sync(finance_summary, months)
+        cache_put(key, data)
+    return data
 
 
 @app.get("/dashboard/operations")
-def dashboard_operations(user: User = Depends(require_roles(Role.admin)), session: Session = Depends(get_session)):
-    rounds = session.exec(select(func.count(Round.id))).one()
-    tickets_open = session.exec(select(func.count(Ticket.id)).where(Ticket.status == TicketStatus.aberto)).one()
-    coverages_pending = session.exec(select(func.count(Coverage.id)).where(Coverage.status == CoverageStatus.pendente)).one()
-    return {"rounds_period": rounds, "tickets_open": tickets_open, "coverages_pending": coverages_pending}
+async def dashboard_operations(
+    days: int = Query(30, ge=1, le=366),
+    user: User = Depends(require_roles(Role.admin)),
+    session: AsyncSession = Depends(get_async_session),
+):
+    key = (OPERATIONS, days)
+    data = cache_get(key)
+    if data is None:
+        data = await session.run_sync(operations_summary, days)
+        cache_put(key, data)
+    return data
+
+
+@app.post("/admin/import/{entity}")
+def bulk_import(
+    entity: BulkEntity,
+    file: UploadFile = File(...),
+    format: BulkFormat | None = None,
+    user: User = Depends(require_roles(Role.admin)),
+    session: Session = Depends(get_session),
+):
+    fmt = detect_format(format, file.filename, file.content_type)
+    return import_rows(session, entity, read_rows(file.file, fmt), user)
+
+
+@app.get("/admin/export/{entity}")
+def bulk_export(entity: BulkEntity, format: BulkFormat = BulkFormat.csv, user: User = Depends(require_roles(Role.admin))):
+    headers = {"Content-Disposition": f'attachment; filename="{entity.value}.{format.value}"'}
+    return StreamingResponse(export_rows(current_engines()[0], entity, format), media_type=MEDIA_TYPES[format], headers=headers)
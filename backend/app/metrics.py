@@ -0,0 +1,268 @@
+"""Per-route request metrics in Prometheus text format, and a slow-request profiler.
+
+``MetricsMiddleware`` gives every HTTP request a ``RequestStats`` in a
+context variable. Engine events add each SQL statement and commit to it,
+``get_current_user`` and ``add_audit`` report their share, and uploads their
+size; when the response is sent the totals are added to the registry under
+the route template (``/agenda/{agenda_id}/approve``), so label cardinality
+stays bounded. Metrics are per process: scrape every worker.
+
+With ``profile_slow_ms`` set, a sampler thread records the stacks of the
+threads serving each in-flight request every ``profile_interval_ms``.
+Requests slower than the threshold are written to ``profile_dir`` as
+collapsed stacks (one ``frame;frame;frame count`` line per stack), which
+``flamegraph.pl`` and speedscope read directly. Async requests share the
+event-loop thread, so under concurrency their samples include neighbours.
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .config import settings
+from .uploads import BASE_DIR
+
+# Clients /metrics answers without METRICS_TOKEN ("testclient" is Starlette's TestClient).
+LOCAL_CLIENTS = ("127.0.0.1", "::1", "testclient")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Long-lived or self-referential routes that would only skew the histograms.
+UNTIMED = {"/events", "/metrics"}
+
+
+class RequestStats:
+    __slots__ = ("queries", "query_seconds", "commits", "auth_seconds", "audit_events", "upload_bytes", "threads", "samples")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.commits = 0
+        self.auth_seconds = 0.0
+        self.audit_events = 0
+        self.upload_bytes = 0
+        self.threads = {threading.get_ident()}
+        self.samples: Counter[str] = Counter()
+
+
+current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def observe(field: str, amount: float = 1) -> None:
+    """Add ``amount`` to ``field`` of the current request, if there is one."""
+    stats = current.get()
+    if stats is not None:
+        setattr(stats, field, getattr(stats, field) + amount)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: dict[tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.requests: Counter[tuple[str, str, int]] = Counter()
+        self.totals: dict[str, Counter[tuple[str, str]]] = defaultdict(Counter)
+
+    def record(self, method: str, route: str, status: int, seconds: float, stats: RequestStats) -> None:
+        key = (method, route)
+        with self._lock:
+            self.latency[key].add(seconds)
+            self.requests[(method, route, status)] += 1
+            self.totals["db_queries"][key] += stats.queries
+            self.totals["db_seconds"][key] += stats.query_seconds
+            self.totals["db_commits"][key] += stats.commits
+            self.totals["auth_seconds"][key] += stats.auth_seconds
+            self.totals["audit_events"][key] += stats.audit_events
+            self.totals["upload_bytes"][key] += stats.upload_bytes
+
+    def render(self) -> str:
+        def labels(method: str, route: str, **extra) -> str:
+            pairs = {"method": method, "route": route, **extra}
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs.items()) + "}"
+
+        lines = [
+            "# HELP http_requests_total Requests by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{labels(method, route, status=status)} {count}")
+            lines += ["# HELP http_request_duration_seconds Request latency by route.", "# TYPE http_request_duration_seconds histogram"]
+            for (method, route), hist in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), hist.counts):
+                    cumulative += count
+                    lines.append(f"http_request_duration_seconds_bucket{labels(method, route, le=bound)} {cumulative}")
+                lines.append(f"http_request_duration_seconds_sum{labels(method, route)} {hist.sum:.6f}")
+                lines.append(f"http_request_duration_seconds_count{labels(method, route)} {cumulative}")
+            for name, help_text in TOTALS:
+                lines += [f"# HELP http_request_{name}_total {help_text}", f"# TYPE http_request_{name}_total counter"]
+                for (method, route), value in sorted(self.totals[name].items()):
+                    lines.append(f"http_request_{name}_total{labels(method, route)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+TOTALS = (
+    ("db_queries", "SQL statements executed while serving the route."),
+    ("db_seconds", "Time spent in SQL statements."),
+    ("db_commits", "Database commits."),
+    ("auth_seconds", "Time spent resolving the authenticated user."),
+    ("audit_events", "Audit events recorded."),
+    ("upload_bytes", "Bytes of uploaded files stored."),
+)
+
+registry = Registry()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = current.get()
+    if stats is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+        stats.threads.add(threading.get_ident())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = current.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started.pop()
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(context) -> None:
+    # after_cursor_execute never runs for a failed statement.
+    stats = current.get()
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        elapsed = time.perf_counter() - started.pop()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+
+@event.listens_for(Engine, "commit")
+def _committed(conn) -> None:
+    observe("commits")
+
+
+def _folded(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms: float, interval_ms: float, directory: Path):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._active: set[RequestStats] = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def begin(self, stats: RequestStats) -> None:
+        with self._lock:
+            self._active.add(stats)
+
+    def end(self, stats: RequestStats, method: str, route: str, seconds: float) -> None:
+        with self._lock:
+            self._active.discard(stats)
+        if seconds < self.threshold or not stats.samples:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        path = self.directory / f"{datetime.now():%Y%m%dT%H%M%S%f}-{method}-{slug}-{seconds * 1000:.0f}ms.folded"
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in stats.samples.most_common()))
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for stats in active:
+                for ident in list(stats.threads):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != own:
+                        stats.samples[_folded(frame)] += 1
+
+
+PROFILE_DIR = Path(settings.profile_dir) if settings.profile_dir else BASE_DIR / "profiles"
+profiler = SlowRequestProfiler(settings.profile_slow_ms, settings.profile_interval_ms, PROFILE_DIR) if settings.profile_slow_ms > 0 else None
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times each request and files its ``RequestStats``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNTIMED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        if profiler is not None:
+            profiler.begin(stats)
+        root_path = scope.get("root_path", "")
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - t0
+            current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                route = route.path
+            elif scope.get("root_path", "") != root_path:
+                # Static mounts: one series per mount, not per file.
+                route = scope["root_path"][len(root_path) :] + "/*"
+            else:
+                route = "unmatched"
+            registry.record(scope["method"], route, status, seconds, stats)
+            if profiler is not None:
+                profiler.end(stats, scope["method"], route, seconds)
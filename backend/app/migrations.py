@@ -0,0 +1,180 @@
+"""Versioned schema migrations and one-time data steps.
+
+Applied versions are recorded in ``schemamigration``. On startup a worker
+reads the highest recorded version and returns at once when it is current;
+otherwise it takes a database-wide lock (``BEGIN IMMEDIATE`` on SQLite, an
+advisory lock on PostgreSQL), re-reads the version and applies what is still
+pending, all in one transaction. Workers booting together therefore wait for
+the first one instead of racing it.
+
+The baseline creates every current model, so later migrations must tolerate
+objects that already exist (use ``checkfirst``) on databases created after
+them. Append new steps to ``MIGRATIONS``; never renumber.
+"""
+import argparse
+import time
+from contextlib import contextmanager
+from typing import Callable
+from sqlalchemy import Connection, func, inspect, insert, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import Session
+from .config import settings
+from .dashboards import ensure_payment_rollup
+from .db import create_db_and_tables
+from .httpcache import CACHED_TABLES
+from .models import Agenda, AgendaException, AuditEvent, AuditSegment, AuditSegmentKey, Payment, SchemaMigration, StreamEvent, TableVersion, Tenant
+from .seed import seed_data
+
+LOCK_KEY = 7_042_031  # arbitrary, shared by every worker
+LOCK_TIMEOUT = 120.0
+
+
+def _baseline(conn: Connection) -> None:
+    create_db_and_tables(conn)
+
+
+def _payment_rollup(conn: Connection) -> None:
+    with Session(bind=conn) as session:
+        ensure_payment_rollup(session)
+
+
+def _demo_seed(conn: Connection) -> None:
+    # In multi-tenant mode ``python -m app.tenants create`` sets each database up.
+    if not settings.seed_demo_data or settings.tenant_database_url:
+        return
+    with Session(bind=conn) as session:
+        seed_data(session)
+        session.commit()
+
+
+def _stream_events(conn: Connection) -> None:
+    StreamEvent.__table__.create(conn, checkfirst=True)
+
+
+def _table_versions(conn: Connection) -> None:
+    TableVersion.__table__.create(conn, checkfirst=True)
+    known = set(conn.execute(select(TableVersion.name)).scalars())
+    rows = [{"name": name, "version": 0} for name in CACHED_TABLES if name not in known]
+    if rows:
+        conn.execute(insert(TableVersion.__table__), rows)
+
+
+def _audit_archive(conn: Connection) -> None:
+    for index in AuditEvent.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    AuditSegment.__table__.create(conn, checkfirst=True)
+
+
+def _payment_status_index(conn: Connection) -> None:
+    for index in Payment.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _agenda_recurrence(conn: Connection) -> None:
+    existing = {column["name"] for column in inspect(conn).get_columns(Agenda.__tablename__)}
+    for column in Agenda.__table__.columns:
+        if column.name not in existing:
+            conn.execute(text(f"ALTER TABLE {Agenda.__tablename__} ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"))
+    for index in Agenda.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    AgendaException.__table__.create(conn, checkfirst=True)
+    _table_versions(conn)
+
+
+def _tenant_catalog(conn: Connection) -> None:
+    Tenant.__table__.create(conn, checkfirst=True)
+
+
+def _audit_segment_keys(conn: Connection) -> None:
+    from .archive import read_segment, segment_keys
+
+    AuditSegmentKey.__table__.create(conn, checkfirst=True)
+    # Segments archived before this step: read each one once to index it.
+    for segment_id, path in conn.execute(select(AuditSegment.id, AuditSegment.path)).all():
+        keys = segment_keys(segment_id, read_segment(path))
+        if keys:
+            conn.execute(insert(AuditSegmentKey.__table__), keys)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline", _baseline),
+    (2, "payment_rollup", _payment_rollup),
+    (3, "demo_seed", _demo_seed),
+    (4, "stream_events", _stream_events),
+    (5, "table_versions", _table_versions),
+    (6, "audit_archive", _audit_archive),
+    (7, "payment_status_index", _payment_status_index),
+    (8, "lockwindow_version", _table_versions),
+    (9, "agenda_recurrence", _agenda_recurrence),
+    (10, "tenant_catalog", _tenant_catalog),
+    (11, "audit_segment_keys", _audit_segment_keys),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table(SchemaMigration.__tablename__):
+        return 0
+    return conn.execute(select(func.max(SchemaMigration.version))).scalar() or 0
+
+
+@contextmanager
+def _locked(bind):
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    with bind.connect() as conn:
+        while True:
+            try:
+                if conn.dialect.name == "sqlite":
+                    conn.exec_driver_sql("BEGIN IMMEDIATE")
+                elif conn.dialect.name == "postgresql":
+                    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LOCK_KEY})
+                break
+            except OperationalError:
+                # SQLite gives up after busy_timeout; keep waiting for the
+                # worker that is migrating.
+                conn.rollback()
+                if time.monotonic() > deadline:
+                    raise
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def migrate(bind) -> list[str]:
+    """Apply pending migrations; returns the names applied by this call."""
+    with bind.connect() as conn:
+        if current_version(conn) >= LATEST:
+            return []
+    applied = []
+    with _locked(bind) as conn:
+        version = current_version(conn)
+        for number, name, step in MIGRATIONS:
+            if number <= version:
+                continue
+            step(conn)
+            conn.execute(insert(SchemaMigration.__table__).values(version=number, name=name))
+            applied.append(name)
+    return applied
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    args = parser.parse_args()
+
+    from .db import engine
+
+    if args.command == "upgrade":
+        applied = migrate(engine)
+        print(f"applied: {', '.join(applied)}" if applied else "already up to date")
+    with engine.connect() as conn:
+        print(f"schema version {current_version(conn)} of {LATEST}")
+
+
+if __name__ == "__main__":
+    main()
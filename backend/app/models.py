@@ -2,6 +2,7 @@ from __future__ import annotations
 from datetime import datetime, date, time
 from typing import Optional
 from enum import Enum
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 
 
@@ -34,11 +35,24 @@ class PaymentStatus(str, Enum):
 
 
 class Payment(SQLModel, table=True):
+    __table_args__ = (Index("ix_payment_status_due_date", "status", "due_date"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     unit_id: int = Field(foreign_key="unit.id", index=True)
-    due_date: date
+    due_date: date = Field(index=True)
     amount: float
-    status: PaymentStatus = PaymentStatus.pendente
+    status: PaymentStatus = Field(default=PaymentStatus.pendente, index=True)
+
+
+class PaymentMonthly(SQLModel, table=True):
+    """Per-month payment totals keyed by the first day of the due month."""
+
+    month: date = Field(primary_key=True)
+    paid: int = 0
+    pending: int = 0
+    late: int = 0
+    total_amount: float = 0.0
+    late_amount: float = 0.0
 
 
 class AgendaType(str, Enum):
@@ -54,7 +68,15 @@ class AgendaStatus(str, Enum):
     recusado = "recusado"
 
 
+class RecurrenceFreq(str, Enum):
+    daily = "daily"
+    weekly = "weekly"
+    monthly = "monthly"
+
+
 class Agenda(SQLModel, table=True):
+    __table_args__ = (Index("ix_agenda_unit_start_end", "unit_id", "start_at", "end_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     unit_id: int = Field(foreign_key="unit.id", index=True)
     requester_id: int = Field(foreign_key="user.id")
@@ -64,6 +86,22 @@ class Agenda(SQLModel, table=True):
     description: str
     status: AgendaStatus = AgendaStatus.pendente
     requires_approval: bool = False
+    # Recurring bookings: start_at/end_at hold the first occurrence; see app.recurrence.
+    recurrence: Optional[RecurrenceFreq] = None
+    recurrence_interval: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    recurrence_until: Optional[datetime] = None
+    series_end_at: Optional[datetime] = Field(default=None, index=True)
+
+
+class AgendaException(SQLModel, table=True):
+    """A cancelled occurrence of a recurring ``Agenda``."""
+
+    __table_args__ = (Index("ix_agendaexception_agenda_occurrence", "agenda_id", "occurrence_at", unique=True),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    agenda_id: int = Field(foreign_key="agenda.id")
+    occurrence_at: datetime
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class LockWindow(SQLModel, table=True):
@@ -85,7 +123,7 @@ class Coverage(SQLModel, table=True):
     from_agenda_id: int = Field(foreign_key="agenda.id")
     title: str
     assigned_to: Optional[int] = Field(default=None, foreign_key="user.id")
-    status: CoverageStatus = CoverageStatus.pendente
+    status: CoverageStatus = Field(default=CoverageStatus.pendente, index=True)
 
 
 class TicketStatus(str, Enum):
@@ -96,52 +134,130 @@ class TicketStatus(str, Enum):
 
 class Ticket(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    unit_id: int = Field(foreign_key="unit.id")
+    unit_id: int = Field(foreign_key="unit.id", index=True)
     opened_by: int = Field(foreign_key="user.id")
     assigned_to: Optional[int] = Field(default=None, foreign_key="user.id")
     title: str
     description: str
-    status: TicketStatus = TicketStatus.aberto
+    status: TicketStatus = Field(default=TicketStatus.aberto, index=True)
 
 
 class Round(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    unit_id: int = Field(foreign_key="unit.id")
+    unit_id: int = Field(foreign_key="unit.id", index=True)
     employee_id: int = Field(foreign_key="user.id")
     location: str
-    happened_at: datetime = Field(default_factory=datetime.utcnow)
+    happened_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     observation: str = ""
 
 
+class Blob(SQLModel, table=True):
+    """Content-addressed upload shared by every row that references it."""
+
+    sha256: str = Field(primary_key=True)
+    path: str
+    size: int
+    content_type: str = ""
+    ref_count: int = Field(default=0, index=True)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class RoundPhoto(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    round_id: int = Field(foreign_key="round.id")
+    round_id: int = Field(foreign_key="round.id", index=True)
     file_path: str
+    blob_sha256: Optional[str] = Field(default=None, foreign_key="blob.sha256", index=True)
     uploaded_by: int = Field(foreign_key="user.id")
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    thumb_path: Optional[str] = None
+    web_path: Optional[str] = None
 
 
 class UploadMeta(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     original_name: str
     file_path: str
+    blob_sha256: Optional[str] = Field(default=None, foreign_key="blob.sha256", index=True)
     uploaded_by: int = Field(foreign_key="user.id")
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 class AuditEvent(SQLModel, table=True):
+    __table_args__ = (Index("ix_auditevent_entity_entity_id", "entity", "entity_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    user_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
     action: str
     entity: str
     entity_id: Optional[int] = None
-    happened_at: datetime = Field(default_factory=datetime.utcnow)
+    happened_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     details: str = ""
 
 
+class AuditSegment(SQLModel, table=True):
+    """Compressed file of audit events moved out of ``auditevent``."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: str = Field(index=True)  # YYYY-MM partition the events belong to
+    path: str  # relative to the archive directory
+    first_id: int
+    last_id: int
+    first_at: datetime
+    last_at: datetime = Field(index=True)
+    rows: int
+    size: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class AuditSegmentKey(SQLModel, table=True):
+    """A filterable value (entity, action or user_id) present in an audit segment."""
+
+    __table_args__ = (Index("ix_auditsegmentkey_name_value", "name", "value"),)
+
+    segment_id: int = Field(foreign_key="auditsegment.id", primary_key=True)
+    name: str = Field(primary_key=True)
+    value: str = Field(primary_key=True)
+
+
 class PublicConfig(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     brand_name: str = "Vigilância Patrimonial"
     primary_color: str = "#14b8a6"
     secondary_color: str = "#1f2937"
     logo_path: str = "/logo.svg"
+    logo_blob: Optional[str] = Field(default=None, foreign_key="blob.sha256")
+
+
+class SchemaMigration(SQLModel, table=True):
+    """One row per applied migration; see ``app.migrations``."""
+
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class StreamEvent(SQLModel, table=True):
+    """Outbox of change events shared by workers when ``EVENT_BACKEND=database``."""
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    entity: str
+    op: str
+    payload: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TableVersion(SQLModel, table=True):
+    """Change counter per table, bumped by every transaction that writes to it."""
+
+    name: str = Field(primary_key=True)
+    version: int = 0
+
+
+class Tenant(SQLModel, table=True):
+    """A condominium served in multi-tenant mode; the catalog lives in the main database."""
+
+    slug: str = Field(primary_key=True)
+    name: str
+    host: Optional[str] = Field(default=None, unique=True)
+    active: bool = True
+    created_at: datetime = Field(default_factory=datetime.utcnow)
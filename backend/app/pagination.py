@@ -0,0 +1,61 @@
+import base64
+import json
+from datetime import date, datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+from sqlalchemy.engine import Row
+from sqlmodel import Session
+
+
+def encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, column) -> tuple:
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        python_type = column.type.python_type
+        if python_type is datetime:
+            value = datetime.fromisoformat(value)
+        elif python_type is date:
+            value = date.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError, NotImplementedError):
+        raise HTTPException(400, "Cursor inválido")
+
+
+def paginate(session: Session, query, model, *, cursor: str | None, limit: int, sort=None, descending: bool = False) -> dict:
+    """Run ``query`` as one keyset page ordered by ``(sort, id)``.
+
+    ``sort`` defaults to the primary key. The cursor holds the sort value and
+    id of the last row returned, so each page is an index range read instead
+    of an OFFSET scan. Column selects (``select(*columns(model))``) come back
+    as plain dicts, which serialize much faster than ORM instances.
+    """
+    id_col = model.id
+    sort = id_col if sort is None else sort
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        if sort is id_col:
+            query = query.where(id_col < row_id if descending else id_col > row_id)
+        elif descending:
+            query = query.where(or_(sort < value, and_(sort == value, id_col < row_id)))
+        else:
+            query = query.where(or_(sort > value, and_(sort == value, id_col > row_id)))
+    if sort is id_col:
+        order = (id_col.desc(),) if descending else (id_col,)
+    else:
+        order = (sort.desc(), id_col.desc()) if descending else (sort, id_col)
+    rows = session.exec(query.order_by(*order).limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort.key), last.id)
+    if rows and isinstance(rows[0], Row):
+        keys = rows[0]._fields
+        rows = [dict(zip(keys, row)) for row in rows]
+    return {"items": rows, "next_cursor": next_cursor}
@@ -0,0 +1,113 @@
+"""Password hashing and the process pool that runs it off the request path.
+
+Hashes are ``sha256_bcrypt$<bcrypt hash>``: the password is SHA-256
+prehashed so bcrypt's 72-byte limit does not apply. Plain bcrypt hashes from
+older releases are still accepted and replaced on the next login.
+"""
+import asyncio
+import base64
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import bcrypt
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from .config import settings
+
+PREFIX = "sha256_bcrypt$"
+
+
+def _prehash(password: str) -> bytes:
+    digest = hashlib.sha256(password.encode("utf-8")).digest()
+    return base64.b64encode(digest)
+
+
+def hash_password(password: str, rounds: int | None = None) -> str:
+    hashed = bcrypt.hashpw(_prehash(password), bcrypt.gensalt(rounds or settings.bcrypt_rounds)).decode("utf-8")
+    return f"{PREFIX}{hashed}"
+
+
+def verify_password(password: str, hash_: str) -> bool:
+    try:
+        if hash_.startswith(PREFIX):
+            return bcrypt.checkpw(_prehash(password), hash_[len(PREFIX):].encode("utf-8"))
+        # backward compatibility with plain bcrypt hashes
+        if hash_.startswith("$2"):
+            return bcrypt.checkpw(password.encode("utf-8"), hash_.encode("utf-8"))
+        return False
+    except ValueError:
+        return False
+
+
+def needs_rehash(hash_: str) -> bool:
+    """True for legacy hashes and hashes made with a different ``bcrypt_rounds``."""
+    if not hash_.startswith(PREFIX):
+        return True
+    # "$2b$12$<salt+hash>"
+    try:
+        return int(hash_[len(PREFIX):].split("$")[2]) != settings.bcrypt_rounds
+    except (IndexError, ValueError):
+        return True
+
+
+class PasswordPool:
+    """Runs bcrypt in worker processes with a bounded number of pending jobs.
+
+    When ``max_pending`` jobs are already queued or running, new requests are
+    rejected with 503 and ``Retry-After`` instead of piling up. With
+    ``workers=0`` hashing runs on the request threadpool, as before the pool
+    existed.
+    """
+
+    def __init__(self, workers: int | None, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        if self._executor is None and self.workers != 0:
+            # Spawned rather than forked: the app already runs background threads.
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HTTPException(503, "Servidor ocupado, tente novamente", headers={"Retry-After": "1"})
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        self._admit()
+        try:
+            if self._executor is None:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.wrap_future(self._executor.submit(fn, *args))
+        finally:
+            self._release()
+
+    async def hash(self, password: str) -> str:
+        return await self.run(hash_password, password, settings.bcrypt_rounds)
+
+    async def verify(self, password: str, hash_: str) -> bool:
+        return await self.run(verify_password, password, hash_)
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hash a batch from synchronous code (bulk import); not subject to ``max_pending``."""
+        if self._executor is None:
+            return [hash_password(p, settings.bcrypt_rounds) for p in passwords]
+        return list(self._executor.map(hash_password, passwords, repeat(settings.bcrypt_rounds)))
+
+
+password_pool = PasswordPool(settings.password_hash_workers, settings.password_hash_queue)
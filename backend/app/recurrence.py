@@ -0,0 +1,173 @@
+"""Recurring agenda entries, expanded lazily.
+
+A recurring booking is a single ``Agenda`` row: ``start_at``/``end_at`` hold
+the first occurrence, repeated daily, weekly or monthly every
+``recurrence_interval`` periods until ``recurrence_until``. ``series_end_at``
+keeps the end of the last occurrence, so the series that can touch a window
+are one indexed range read away, while single bookings keep using
+``ix_agenda_unit_start_end``. Occurrences are computed from the rule on
+demand, jumping straight to the first one inside the window, and the ones
+cancelled through ``AgendaException`` are skipped; nothing is materialized
+per occurrence.
+"""
+import heapq
+from calendar import monthrange
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+from .config import settings
+from .models import Agenda, AgendaException, AgendaType, RecurrenceFreq
+from .pagination import decode_cursor, encode_cursor
+
+STEP_DAYS = {RecurrenceFreq.daily: 1, RecurrenceFreq.weekly: 7}
+
+TICK = timedelta(microseconds=1)
+
+
+def _add_months(moment: datetime, months: int) -> datetime:
+    month = moment.month - 1 + months
+    year, month = moment.year + month // 12, month % 12 + 1
+    return moment.replace(year=year, month=month, day=min(moment.day, monthrange(year, month)[1]))
+
+
+def _months_between(first: datetime, moment: datetime) -> int:
+    return (moment.year - first.year) * 12 + moment.month - first.month
+
+
+def starts(row, since: datetime) -> Iterator[datetime]:
+    """Occurrence starts of ``row`` at or after ``since``, in order."""
+    first, until, interval = row.start_at, row.recurrence_until, row.recurrence_interval
+    if row.recurrence is None:
+        if first >= since:
+            yield first
+        return
+    if row.recurrence == RecurrenceFreq.monthly:
+        k = max(0, _months_between(first, since) // interval)
+        while True:
+            start = _add_months(first, k * interval)
+            if until is not None and start > until:
+                return
+            if start >= since:
+                yield start
+            k += 1
+    step = timedelta(days=STEP_DAYS[row.recurrence] * interval)
+    start = first + max(0, -((first - since) // step)) * step
+    while until is None or start <= until:
+        yield start
+        start += step
+
+
+def occurrences(row, start: datetime, end: datetime, cancelled=frozenset()) -> Iterator[tuple[datetime, datetime]]:
+    """``(start, end)`` of the occurrences of ``row`` overlapping [start, end), skipping ``cancelled`` starts."""
+    duration = row.end_at - row.start_at
+    for s in starts(row, start - duration + TICK):
+        if s >= end:
+            return
+        if s not in cancelled:
+            yield s, s + duration
+
+
+def last_end(row) -> datetime:
+    """End of the last occurrence of ``row``; ``recurrence_until`` is required."""
+    if row.recurrence is None:
+        return row.end_at
+    first, interval = row.start_at, row.recurrence_interval
+    if row.recurrence == RecurrenceFreq.monthly:
+        k = _months_between(first, row.recurrence_until) // interval * interval
+        last = _add_months(first, k)
+        if last > row.recurrence_until:
+            last = _add_months(first, k - interval)
+    else:
+        step = timedelta(days=STEP_DAYS[row.recurrence] * interval)
+        last = first + (row.recurrence_until - first) // step * step
+    return last + (row.end_at - row.start_at)
+
+
+def rule_error(data) -> tuple[str, str] | None:
+    """``(field, message)`` when the recurrence of a new booking is invalid."""
+    if data.recurrence is None:
+        return None
+    if data.type == AgendaType.saida:
+        return "recurrence", "Saídas não podem ser recorrentes"
+    if data.recurrence_until is None:
+        return "recurrence_until", "Recorrência exige data final (recurrence_until)"
+    if data.recurrence_until < data.start_at:
+        return "recurrence_until", "Fim da recorrência deve ser posterior ao início"
+    if data.recurrence_until - data.start_at > timedelta(days=settings.agenda_recurrence_max_days):
+        return "recurrence_until", f"Recorrência de no máximo {settings.agenda_recurrence_max_days} dias"
+    period = timedelta(days=28 * data.recurrence_interval if data.recurrence == RecurrenceFreq.monthly else STEP_DAYS[data.recurrence] * data.recurrence_interval)
+    if data.end_at - data.start_at > period:
+        return "end_at", "Duração maior que o intervalo da recorrência"
+    return None
+
+
+def overlaps(a, b) -> bool:
+    """Whether two bookings (single or recurring, exceptions ignored) share an instant."""
+    for s, e in occurrences(a, b.start_at, last_end(b)):
+        if next(occurrences(b, s, e), None) is not None:
+            return True
+    return False
+
+
+def cancelled_starts(session: Session, agenda_ids: list[int], since: datetime, until: datetime | None = None) -> dict[int, set[datetime]]:
+    """Cancelled occurrence starts per series, from ``since`` (and before ``until``)."""
+    if not agenda_ids:
+        return {}
+    q = select(AgendaException.agenda_id, AgendaException.occurrence_at).where(AgendaException.agenda_id.in_(agenda_ids), AgendaException.occurrence_at >= since)
+    if until is not None:
+        q = q.where(AgendaException.occurrence_at < until)
+    cancelled: dict[int, set[datetime]] = {}
+    for agenda_id, occurrence_at in session.exec(q).all():
+        cancelled.setdefault(agenda_id, set()).add(occurrence_at)
+    return cancelled
+
+
+def series_in(query, start: datetime, end: datetime | None):
+    """Narrow an ``Agenda`` query to the series with an occurrence ending after ``start`` and starting before ``end``."""
+    query = query.where(Agenda.series_end_at > start)
+    return query if end is None else query.where(Agenda.start_at < end)
+
+
+def _expand(row, since: datetime, until: datetime | None, cancelled, after: tuple | None) -> Iterator[dict]:
+    base = row._asdict()
+    duration = row.end_at - row.start_at
+    for s in starts(row, since):
+        if until is not None and s >= until:
+            return
+        if s in cancelled or (after is not None and (s, row.id) <= after):
+            continue
+        yield {**base, "start_at": s, "end_at": s + duration}
+
+
+def agenda_page(session: Session, query, *, cursor: str | None, limit: int, date_from: datetime | None, date_to: datetime | None) -> dict:
+    """Keyset page of ``query`` (``select(*columns(Agenda))``) by ``(start_at, id)``, with series expanded.
+
+    Single bookings are read as in ``paginate``; each series matching the
+    filters contributes its occurrences starting in [date_from, date_to)
+    after the cursor, generated only as far as the page needs.
+    """
+    singles = query.where(Agenda.recurrence == None)
+    series = query.where(Agenda.recurrence != None)
+    after = None
+    since = date_from
+    if cursor:
+        after = decode_cursor(cursor, Agenda.start_at)
+        singles = singles.where(or_(Agenda.start_at > after[0], and_(Agenda.start_at == after[0], Agenda.id > after[1])))
+        since = after[0] if since is None else max(since, after[0])
+    if date_from is not None:
+        singles = singles.where(Agenda.start_at >= date_from)
+    if date_to is not None:
+        singles = singles.where(Agenda.start_at < date_to)
+    since = since or datetime.min
+    rows = session.exec(singles.order_by(Agenda.start_at, Agenda.id).limit(limit + 1)).all()
+    series_rows = session.exec(series_in(series, since, date_to)).all()
+    cancelled = cancelled_starts(session, [row.id for row in series_rows], since, date_to)
+    streams = [(row._asdict() for row in rows)] + [_expand(row, since, date_to, cancelled.get(row.id, ()), after) for row in series_rows]
+    items = list(islice(heapq.merge(*streams, key=lambda item: (item["start_at"], item["id"])), limit + 1))
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["start_at"], items[-1]["id"])
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,135 @@
+"""Periodic payment bookkeeping: overdue transitions and monthly charges.
+
+Each run moves ``pendente`` payments past their due date (plus
+``payment_grace_days``) to ``atrasado`` with set-based UPDATEs of at most
+``payment_batch_size`` rows, each batch in its own short transaction, and
+then creates next month's charge for every unit that has none yet with a
+single ``INSERT ... SELECT``. One audit event summarises the run.
+
+Both steps only touch rows that still need it, so runs are idempotent and
+every worker can run the scheduler. On SQLite each statement takes the
+write lock before reading; on PostgreSQL the transaction holds an advisory
+lock so two workers never charge the same month twice.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from sqlalchemy import Date, insert, literal, text, update
+from sqlmodel import Session, func, select
+from .config import settings
+from .dashboards import FINANCE, _month, _next_month, refresh_payment_months
+from .db import engine
+from .models import Payment, PaymentStatus, Unit
+from .services import add_audit
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 7_042_032  # arbitrary, shared by every worker
+
+
+def mark_overdue(session: Session, today: date, batch_size: int) -> int:
+    """Move one batch of overdue ``pendente`` payments to ``atrasado``."""
+    cutoff = today - timedelta(days=settings.payment_grace_days)
+    overdue = select(Payment.id).where(Payment.status == PaymentStatus.pendente, Payment.due_date < cutoff).limit(batch_size)
+    due_dates = session.exec(
+        update(Payment)
+        .where(Payment.id.in_(overdue))
+        .values(status=PaymentStatus.atrasado)
+        .returning(Payment.due_date)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if due_dates:
+        # Statement writes bypass the flush hook that maintains the rollup.
+        refresh_payment_months(session.connection(), {_month(d) for d in due_dates})
+        session.info.setdefault("dashboards_touched", set()).add(FINANCE)
+    return len(due_dates)
+
+
+def create_charges(session: Session, month: date) -> int:
+    """Charge every unit without a payment due in ``month``.
+
+    The amount repeats the unit's latest charge; units without one are
+    charged ``payment_monthly_amount``.
+    """
+    due = month.replace(day=min(settings.payment_due_day, 28))
+    latest = select(Payment.amount).where(Payment.unit_id == Unit.id).order_by(Payment.due_date.desc(), Payment.id.desc()).limit(1).scalar_subquery()
+    charged = select(Payment.id).where(Payment.unit_id == Unit.id, Payment.due_date >= month, Payment.due_date < _next_month(month)).exists()
+    rows = select(
+        Unit.id,
+        literal(due, Date),
+        func.coalesce(latest, settings.payment_monthly_amount),
+        literal(PaymentStatus.pendente, Payment.__table__.c.status.type),
+    ).where(~charged)
+    created = session.exec(insert(Payment).from_select(["unit_id", "due_date", "amount", "status"], rows)).rowcount
+    if created:
+        refresh_payment_months(session.connection(), {month})
+        session.info.setdefault("dashboards_touched", set()).add(FINANCE)
+    return created
+
+
+class PaymentScheduler:
+    """Background thread that runs the payment bookkeeping every ``interval`` seconds."""
+
+    def __init__(self, bind, interval: float = 3600.0, batch_size: int = 1000):
+        self.bind = bind
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def _transaction(self):
+        with Session(self.bind) as session:
+            if session.connection().dialect.name == "postgresql":
+                session.exec(text("SELECT pg_advisory_xact_lock(:key)"), params={"key": LOCK_KEY})
+            yield session
+
+    def run(self, today: date | None = None) -> dict:
+        """One idempotent pass; returns how many payments were marked late and charged."""
+        today = today or date.today()
+        late = 0
+        while True:
+            with self._transaction() as session:
+                moved = mark_overdue(session, today, self.batch_size)
+                session.commit()
+            late += moved
+            if moved < self.batch_size:
+                break
+        month = _next_month(_month(today))
+        with self._transaction() as session:
+            charged = create_charges(session, month)
+            if late or charged:
+                add_audit(session, None, "schedule", "payment", None, f"{late} atrasados, {charged} cobranças de {month:%Y-%m}")
+            session.commit()
+        return {"late": late, "charged": charged, "month": month}
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="payment-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                result = self.run()
+                if result["late"] or result["charged"]:
+                    logger.info("Pagamentos: %(late)d atrasados, %(charged)d cobranças geradas", result)
+            except Exception:
+                logger.exception("Falha ao processar pagamentos")
+            self._stopping.wait(self.interval)
+
+
+payment_scheduler = PaymentScheduler(engine, settings.payment_schedule_interval, settings.payment_batch_size)
+
+
+if __name__ == "__main__":
+    print(payment_scheduler.run())
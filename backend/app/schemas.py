@@ -1,8 +1,8 @@
 from datetime import datetime, date, time
-from typing import Optional
+from typing import Annotated, Literal, Optional, Union
 from pydantic import BaseModel, Field
 from pydantic import BaseModel, EmailStr, Field
-from .models import Role, AgendaType, AgendaStatus, PaymentStatus, TicketStatus, CoverageStatus
+from .models import Role, AgendaType, AgendaStatus, RecurrenceFreq, PaymentStatus, TicketStatus, CoverageStatus
 
 
 class LoginRequest(BaseModel):
@@ -52,6 +52,13 @@ class AgendaCreate(BaseModel):
     start_at: datetime
     end_at: datetime
     description: str
+    recurrence: Optional[RecurrenceFreq] = None
+    recurrence_interval: int = Field(1, ge=1)
+    recurrence_until: Optional[datetime] = None
+
+
+class AgendaExceptionCreate(BaseModel):
+    occurrence_at: datetime
 
 
 class AgendaApprove(BaseModel):
@@ -63,6 +70,10 @@ class CoverageAssign(BaseModel):
     status: CoverageStatus = CoverageStatus.em_andamento
 
 
+class UserActive(BaseModel):
+    active: bool
+
+
 class TicketCreate(BaseModel):
     unit_id: int
     title: str
@@ -74,6 +85,26 @@ class TicketUpdate(BaseModel):
     assigned_to: Optional[int] = None
 
 
+class AgendaTransition(BaseModel):
+    entity: Literal["agenda"]
+    id: int
+    status: AgendaStatus
+
+
+class TicketTransition(TicketUpdate):
+    entity: Literal["ticket"]
+    id: int
+
+
+class CoverageTransition(CoverageAssign):
+    entity: Literal["coverage"]
+    id: int
+
+
+class TransitionBatch(BaseModel):
+    items: list[Annotated[Union[AgendaTransition, TicketTransition, CoverageTransition], Field(discriminator="entity")]] = Field(min_length=1)
+
+
 class RoundCreate(BaseModel):
     unit_id: int
     location: str
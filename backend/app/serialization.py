@@ -0,0 +1,24 @@
+"""orjson encoding for list responses and exports.
+
+List endpoints select plain columns instead of ORM entities, so pages are
+built from row tuples and encoded by orjson directly; ``jsonable_encoder``
+never walks them. Models that still reach the encoder (single objects,
+``/units``) are dumped through pydantic.
+"""
+import orjson
+from pydantic import BaseModel
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data) -> bytes:
+    return orjson.dumps(data, default=_default)
+
+
+def columns(model, exclude: tuple[str, ...] = ()) -> list:
+    """Column attributes of ``model`` in table order, for ``select(*columns(...))``."""
+    return [getattr(model, c.name) for c in model.__table__.columns if c.name not in exclude]
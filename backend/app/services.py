@@ -1,28 +1,116 @@
-from datetime import datetime, time
+from datetime import datetime
+from sqlalchemy import insert
 from sqlmodel import Session, select
-from .models import Agenda, LockWindow, AuditEvent
+from .audit import defer_audit
+from .config import settings
+from .lockwindows import LockSchedule
+from .metrics import observe
+from .models import Agenda, AgendaStatus, LockWindow, AuditEvent
+from .recurrence import cancelled_starts, last_end, occurrences, series_in
+from .serialization import columns
 
 
 def in_lock_window(start: datetime, end: datetime, lock: LockWindow) -> bool:
-    if not lock.enabled:
+    return LockSchedule([lock]).blocks(start, end)
+
+
+def has_overlap(session: Session, unit_id: int, start: datetime, end: datetime, exclude_id: int | None = None) -> bool:
+    """Return True if [start, end) intersects an active booking of the unit.
+
+    Active (non-``recusado``) single bookings of a unit never overlap each
+    other, so only two rows can conflict: one starting inside [start, end),
+    or the last one starting before ``start``. Both are single seeks on
+    ``ix_agenda_unit_start_end`` regardless of how much history the unit has.
+    Recurring series are checked separately, see ``app.recurrence``.
+    """
+    active = select(Agenda).where(Agenda.unit_id == unit_id, Agenda.status != AgendaStatus.recusado, Agenda.recurrence == None)
+    if exclude_id is not None:
+        active = active.where(Agenda.id != exclude_id)
+    inside = active.where(Agenda.start_at >= start, Agenda.start_at < end).limit(1)
+    if session.exec(inside).first():
+        return True
+    before = active.where(Agenda.start_at < start).order_by(Agenda.start_at.desc()).limit(1)
+    row = session.exec(before).first()
+    if row is not None and row.end_at > start:
+        return True
+    return _series_overlap(session, unit_id, [(start, end)], exclude_id)
+
+
+def _series_overlap(session: Session, unit_id: int, spans: list[tuple[datetime, datetime]], exclude_id: int | None) -> bool:
+    """Whether any of the sorted ``spans`` meets an occurrence of an active series of the unit."""
+    if not spans:
+        return False
+    q = select(*columns(Agenda)).where(Agenda.unit_id == unit_id, Agenda.status != AgendaStatus.recusado)
+    if exclude_id is not None:
+        q = q.where(Agenda.id != exclude_id)
+    series = session.exec(series_in(q, spans[0][0], spans[-1][1])).all()
+    if not series:
         return False
-    s, e = lock.start_time, lock.end_time
-    def inside(t: time) -> bool:
-        if s <= e:
-            return s <= t <= e
-        return t >= s or t <= e
-    return inside(start.time()) or inside(end.time())
-
-
-def has_overlap(session: Session, unit_id: int, start: datetime, end: datetime) -> bool:
-    rows = session.exec(select(Agenda).where(Agenda.unit_id == unit_id)).all()
-    for row in rows:
-        if start < row.end_at and end > row.start_at:
+    longest = max(row.end_at - row.start_at for row in series)
+    cancelled = cancelled_starts(session, [row.id for row in series], spans[0][0] - longest, spans[-1][1])
+    return any(_intersects(spans, list(occurrences(row, spans[0][0], spans[-1][1], cancelled.get(row.id, ())))) for row in series)
+
+
+def _intersects(a: list[tuple[datetime, datetime]], b: list[tuple[datetime, datetime]]) -> bool:
+    """Whether two sorted lists of disjoint intervals share an instant."""
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i][1] <= b[j][0]:
+            i += 1
+        elif b[j][1] <= a[i][0]:
+            j += 1
+        else:
             return True
     return False
 
 
+def has_conflict(session: Session, booking, exclude_id: int | None = None) -> bool:
+    """``has_overlap`` for a single or recurring booking (an ``Agenda`` or ``AgendaCreate``).
+
+    For a series, the single bookings inside its span are read with one
+    range query and swept against its occurrences in order.
+    """
+    if booking.recurrence is None:
+        return has_overlap(session, booking.unit_id, booking.start_at, booking.end_at, exclude_id)
+    start, end = booking.start_at, last_end(booking)
+    cancelled = cancelled_starts(session, [exclude_id], start).get(exclude_id, ()) if exclude_id is not None else ()
+    spans = list(occurrences(booking, start, end, cancelled))
+    active = select(Agenda.start_at, Agenda.end_at).where(Agenda.unit_id == booking.unit_id, Agenda.status != AgendaStatus.recusado, Agenda.recurrence == None)
+    if exclude_id is not None:
+        active = active.where(Agenda.id != exclude_id)
+    before = session.exec(active.where(Agenda.start_at < start).order_by(Agenda.start_at.desc()).limit(1)).all()
+    singles = before + session.exec(active.where(Agenda.start_at >= start, Agenda.start_at < end).order_by(Agenda.start_at)).all()
+    return _intersects(spans, singles) or _series_overlap(session, booking.unit_id, spans, exclude_id)
+
+
 def add_audit(session: Session, user_id: int | None, action: str, entity: str, entity_id: int | None = None, details: str = ""):
-    event = AuditEvent(user_id=user_id, action=action, entity=entity, entity_id=entity_id, details=details)
-    session.add(event)
-    session.commit()
+    """Record an audit event; the caller commits its own transaction.
+
+    In durable mode the event joins the caller's session, so it is written
+    by the same commit as the change it describes. In batched mode it is
+    handed to the audit sink when the session commits, and dropped if it
+    rolls back.
+    """
+    observe("audit_events")
+    if settings.audit_mode == "batched":
+        defer_audit(session, [{"user_id": user_id, "action": action, "entity": entity, "entity_id": entity_id, "details": details, "happened_at": datetime.utcnow()}])
+        return
+    session.add(AuditEvent(user_id=user_id, action=action, entity=entity, entity_id=entity_id, details=details))
+
+
+
+def add_audits(session: Session, user_id: int | None, events: list[tuple[str, str, int | None, str]]):
+    """Record ``(action, entity, entity_id, details)`` events with a single INSERT.
+
+    Same transaction rules as ``add_audit``; in batched mode the events go
+    to the audit sink on commit instead.
+    """
+    if not events:
+        return
+    observe("audit_events", len(events))
+    now = datetime.utcnow()
+    rows = [{"user_id": user_id, "action": action, "entity": entity, "entity_id": entity_id, "details": details, "happened_at": now} for action, entity, entity_id, details in events]
+    if settings.audit_mode == "batched":
+        defer_audit(session, rows)
+        return
+    session.execute(insert(AuditEvent), rows)
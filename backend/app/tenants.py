@@ -0,0 +1,284 @@
+"""Multi-tenant (multi-condominium) mode.
+
+With ``TENANT_DATABASE_URL`` set, every condominium has a database of its
+own (``sqlite:///tenants/{tenant}.db`` gives one SQLite file each) and
+``DATABASE_URL`` only holds the ``tenant`` catalog. ``TenantMiddleware``
+resolves the tenant of each request from the ``tid`` claim of its token or,
+without one, from the Host header (a host registered in the catalog, else
+its first label: ``aurora.example.com`` is ``aurora``) and sets
+``db.current_tenant``, which sessions, caches, storage, events and audit
+follow. Engines are opened on first use and kept in an LRU
+(``db.TenantEngines``), so an idle tenant holds no connections once evicted.
+
+``TenantJobs`` replaces the payment scheduler and audit archiver threads,
+running both over every active tenant, and does the startup thumbnail
+backfill of each one. Tenants are managed with::
+
+    python -m app.tenants create aurora --name "Residencial Aurora" --host aurora.example.com --admin-email admin@aurora.com.br --admin-password ...
+    python -m app.tenants list
+"""
+import argparse
+import logging
+import re
+import sys
+import threading
+import time as clock
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+from pydantic import ValidationError
+from sqlmodel import Session, select
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import JSONResponse
+from .archive import AuditArchiver, archive_dir
+from .config import settings
+from .db import current_tenant, engine, open_tenant_engine
+from .models import PublicConfig, Role, Tenant, User
+from .scheduler import PaymentScheduler
+from .schemas import UserCreate
+from .thumbnails import thumbnail_worker
+
+logger = logging.getLogger(__name__)
+
+SLUG = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+# Served without a tenant: nothing under them reads a tenant database.
+EXEMPT = ("/metrics", "/docs", "/redoc", "/openapi.json", "/public/", "/storage/")
+
+
+class TenantCatalog:
+    """Active tenants and their hosts, re-read from the main database every ``ttl`` seconds."""
+
+    def __init__(self, bind, ttl: float):
+        self.bind = bind
+        self.ttl = ttl
+        self._slugs: frozenset[str] = frozenset()
+        self._hosts: dict[str, str] = {}
+        self._loaded_at: float | None = None
+        self._lock = threading.Lock()
+
+    def stale(self) -> bool:
+        return self._loaded_at is None or clock.monotonic() - self._loaded_at >= self.ttl
+
+    def refresh(self) -> None:
+        with self._lock:
+            if not self.stale():
+                return
+            with Session(self.bind) as session:
+                rows = session.exec(select(Tenant.slug, Tenant.host).where(Tenant.active == True)).all()
+            self._slugs = frozenset(slug for slug, _ in rows)
+            self._hosts = {host.lower(): slug for slug, host in rows if host}
+            self._loaded_at = clock.monotonic()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def active(self) -> frozenset[str]:
+        self.refresh()
+        return self._slugs
+
+    def from_host(self, host: str) -> str | None:
+        host = host.rsplit(":", 1)[0].lower()
+        slug = self._hosts.get(host)
+        if slug is None:
+            label = host.split(".", 1)[0]
+            slug = label if label in self._slugs else None
+        return slug
+
+
+catalog = TenantCatalog(engine, settings.tenant_catalog_ttl)
+
+
+def _token_tenant(scope) -> str | None:
+    # /events may carry the token in the query string (EventSource sends no headers).
+    header = Headers(scope=scope).get("authorization", "")
+    token = header[7:] if header.lower().startswith("bearer ") else QueryParams(scope.get("query_string", b"")).get("token")
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm]).get("tid")
+    except JWTError:
+        # Rejected by get_current_user; the host still decides the tenant.
+        return None
+
+
+class TenantMiddleware:
+    """ASGI middleware that sets ``current_tenant`` for each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT):
+            await self.app(scope, receive, send)
+            return
+        if catalog.stale():
+            await run_in_threadpool(catalog.refresh)
+        from_token = _token_tenant(scope)
+        from_host = catalog.from_host(Headers(scope=scope).get("host", ""))
+        if from_token is not None and from_host is not None and from_token != from_host:
+            await JSONResponse({"detail": "Token inválido"}, status_code=401)(scope, receive, send)
+            return
+        tenant = from_token or from_host
+        if tenant is None or tenant not in catalog.active():
+            await JSONResponse({"detail": "Condomínio não encontrado"}, status_code=404)(scope, receive, send)
+            return
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
+
+
+class TenantJobs:
+    """Background thread running the payment scheduler and audit archiver for every active tenant.
+
+    Each pass opens an unpooled engine per tenant and disposes of it
+    afterwards, so background work does not churn the request engine cache.
+    An interval of 0 disables that job. The thread starts by queueing, for
+    every tenant, the photos still missing thumbnails.
+    """
+
+    def __init__(self, payment_interval: float, archive_interval: float):
+        self.payment_interval = payment_interval
+        self.archive_interval = archive_interval
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_tenant(self, tenant: str, payments: bool = True, archive: bool = True) -> dict:
+        bind = open_tenant_engine(tenant, pooled=False)
+        token = current_tenant.set(tenant)
+        result = {}
+        try:
+            if payments:
+                result["payments"] = PaymentScheduler(bind, batch_size=settings.payment_batch_size).run()
+            if archive:
+                result["archived"] = AuditArchiver(bind, archive_dir(tenant), settings.audit_retention_days, settings.audit_segment_rows).archive()
+        finally:
+            current_tenant.reset(token)
+            bind.dispose()
+        return result
+
+    def backfill(self) -> int:
+        queued = 0
+        for tenant in sorted(catalog.active()):
+            if self._stopping.is_set():
+                break
+            bind = open_tenant_engine(tenant, pooled=False)
+            token = current_tenant.set(tenant)
+            try:
+                queued += thumbnail_worker.backfill(bind)
+            except Exception:
+                logger.exception("Falha ao listar fotos sem miniatura do condomínio %s", tenant)
+            finally:
+                current_tenant.reset(token)
+                bind.dispose()
+        return queued
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="tenant-jobs", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            self.backfill()
+        except Exception:
+            logger.exception("Falha ao ler o catálogo de condomínios")
+        due = {"payments": 0.0, "archive": 0.0}
+        intervals = {"payments": self.payment_interval, "archive": self.archive_interval}
+        while any(intervals.values()) and not self._stopping.is_set():
+            now = clock.monotonic()
+            run = {job: bool(intervals[job]) and due[job] <= now for job in due}
+            if any(run.values()):
+                try:
+                    tenants = sorted(catalog.active())
+                except Exception:
+                    logger.exception("Falha ao ler o catálogo de condomínios")
+                    tenants = []
+                for tenant in tenants:
+                    if self._stopping.is_set():
+                        return
+                    try:
+                        self.run_tenant(tenant, run["payments"], run["archive"])
+                    except Exception:
+                        logger.exception("Falha nas tarefas do condomínio %s", tenant)
+                for job, ran in run.items():
+                    if ran:
+                        due[job] = now + intervals[job]
+            pending = [due[job] for job in due if intervals[job]]
+            self._stopping.wait(max(0.0, min(pending) - clock.monotonic()))
+
+
+tenant_jobs = TenantJobs(settings.payment_schedule_interval, settings.audit_archive_interval if settings.audit_retention_days > 0 else 0.0)
+
+
+def create_tenant(slug: str, name: str, host: str | None, admin_email: str, admin_password: str) -> Tenant:
+    """Register a tenant, create and migrate its database and add its first admin."""
+    from .migrations import migrate
+    from .passwords import hash_password
+
+    migrate(engine)
+    with Session(engine) as session:
+        tenant = Tenant(slug=slug, name=name, host=host.lower() if host else None)
+        session.add(tenant); session.commit(); session.refresh(tenant)
+    bind = open_tenant_engine(slug, pooled=False)
+    token = current_tenant.set(slug)
+    try:
+        with Session(bind) as session:
+            if not session.exec(select(User)).first():
+                session.add(User(name="Admin", email=admin_email, password_hash=hash_password(admin_password), role=Role.admin))
+            if not session.exec(select(PublicConfig)).first():
+                session.add(PublicConfig(brand_name=name))
+            session.commit()
+    finally:
+        current_tenant.reset(token)
+        bind.dispose()
+    catalog.invalidate()
+    return tenant
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.tenants")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="register a tenant and set up its database")
+    create.add_argument("slug")
+    create.add_argument("--name", required=True)
+    create.add_argument("--host")
+    create.add_argument("--admin-email", required=True)
+    create.add_argument("--admin-password", required=True)
+    commands.add_parser("list", help="list registered tenants")
+    args = parser.parse_args()
+
+    if not settings.tenant_database_url:
+        sys.exit("TENANT_DATABASE_URL não configurada")
+    from .migrations import migrate
+
+    migrate(engine)
+    if args.command == "create":
+        if not SLUG.match(args.slug):
+            sys.exit(f"Identificador inválido: {args.slug}")
+        try:
+            UserCreate(name="Admin", email=args.admin_email, password=args.admin_password, role=Role.admin)
+        except ValidationError as exc:
+            sys.exit(f"Administrador inválido: {exc}")
+        with Session(engine) as session:
+            if session.get(Tenant, args.slug) is not None:
+                sys.exit(f"Condomínio já existe: {args.slug}")
+        tenant = create_tenant(args.slug, args.name, args.host, args.admin_email, args.admin_password)
+        print(f"created {tenant.slug} ({tenant.name})")
+    else:
+        with Session(engine) as session:
+            for tenant in session.exec(select(Tenant).order_by(Tenant.slug)).all():
+                print(f"{tenant.slug}\t{tenant.name}\t{tenant.host or '-'}\t{'active' if tenant.active else 'inactive'}")
+
+
+if __name__ == "__main__":
+    main()
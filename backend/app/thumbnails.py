@@ -0,0 +1,151 @@
+import logging
+import queue
+import threading
+from pathlib import Path
+from uuid import uuid4
+from PIL import Image, ImageOps
+from sqlmodel import Session, select
+from .config import settings
+from .db import current_tenant, engine, tenant_engines
+from .models import RoundPhoto
+from .uploads import STORAGE_DIR, storage_prefix, storage_root
+
+logger = logging.getLogger(__name__)
+
+
+def _render(source: Path, target: Path, max_side: int, quality: int) -> None:
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp = target.with_name(f"{target.stem}.{uuid4().hex}.tmp")
+        image.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+        tmp.replace(target)
+
+
+def build_derivatives(photo: RoundPhoto) -> tuple[str, str]:
+    """Write the thumbnail and web variant of ``photo``; returns their URL paths."""
+    source = STORAGE_DIR / Path(photo.file_path).relative_to("/storage")
+    stem = source.stem
+    derived = storage_root() / "derived"
+    derived.mkdir(parents=True, exist_ok=True)
+    thumb = derived / f"{stem}_thumb.jpg"
+    web = derived / f"{stem}_web.jpg"
+    # Photos sharing a blob share its derivatives.
+    if not thumb.exists():
+        _render(source, thumb, settings.thumbnail_size, settings.thumbnail_quality)
+    if not web.exists():
+        _render(source, web, settings.web_variant_size, settings.web_variant_quality)
+    prefix = f"/storage/{storage_prefix()}derived"
+    return f"{prefix}/{thumb.name}", f"{prefix}/{web.name}"
+
+
+class ThumbnailWorker:
+    """Background threads that build photo derivatives from a local queue.
+
+    Failed jobs are retried with exponential backoff up to ``max_attempts``;
+    photos still missing derivatives after that are picked up again by the
+    next startup backfill. Jobs carry the tenant that queued them.
+    """
+
+    def __init__(self, bind, workers: int = 1, max_attempts: int = 3, retry_delay: float = 2.0):
+        self.bind = bind
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._jobs: queue.Queue[tuple[str | None, int, int] | None] = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._timers: set[threading.Timer] = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def enqueue(self, photo_id: int, attempt: int = 1, tenant: str | None = None) -> None:
+        if not self._stopping.is_set():
+            self._jobs.put((tenant or current_tenant.get(), photo_id, attempt))
+
+    def _bind(self, tenant: str | None):
+        return self.bind if tenant is None else tenant_engines.get(tenant)[0]
+
+    def backfill(self, bind=None) -> int:
+        """Queue the photos of the current tenant that still lack derivatives.
+
+        ``bind`` reads the list through another engine of that tenant (the
+        tenant jobs pass an unpooled one); the jobs still use the cached engine.
+        """
+        with Session(bind or self._bind(current_tenant.get())) as session:
+            ids = session.exec(select(RoundPhoto.id).where((RoundPhoto.thumb_path == None) | (RoundPhoto.web_path == None))).all()
+        for photo_id in ids:
+            self.enqueue(photo_id)
+        return len(ids)
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stopping.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"thumbnails-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        with self._lock:
+            for timer in self._timers:
+                timer.cancel()
+            self._timers.clear()
+        for _ in self._threads:
+            self._jobs.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def join(self) -> None:
+        """Block until every queued job has been processed (used by tools and benchmarks)."""
+        self._jobs.join()
+
+    def process(self, photo_id: int, tenant: str | None = None) -> None:
+        token = current_tenant.set(tenant)
+        try:
+            with Session(self._bind(tenant)) as session:
+                photo = session.get(RoundPhoto, photo_id)
+                if photo is None:
+                    return
+                photo.thumb_path, photo.web_path = build_derivatives(photo)
+                session.add(photo)
+                session.commit()
+        finally:
+            current_tenant.reset(token)
+
+    def _retry_later(self, tenant: str | None, photo_id: int, attempt: int) -> None:
+        timer = threading.Timer(self.retry_delay * 2 ** (attempt - 1), self._requeue, (tenant, photo_id, attempt + 1))
+        timer.daemon = True
+        with self._lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def _requeue(self, tenant: str | None, photo_id: int, attempt: int) -> None:
+        with self._lock:
+            self._timers.discard(threading.current_thread())
+        self.enqueue(photo_id, attempt, tenant)
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                if job is None:
+                    return
+                tenant, photo_id, attempt = job
+                try:
+                    self.process(photo_id, tenant)
+                except Exception:
+                    if attempt >= self.max_attempts:
+                        logger.exception("Derivados da foto %s falharam após %s tentativas", photo_id, attempt)
+                    else:
+                        logger.warning("Derivados da foto %s falharam (tentativa %s), nova tentativa agendada", photo_id, attempt)
+                        self._retry_later(tenant, photo_id, attempt)
+            finally:
+                self._jobs.task_done()
+
+
+thumbnail_worker = ThumbnailWorker(engine, workers=settings.thumbnail_workers, max_attempts=settings.thumbnail_max_attempts)
@@ -0,0 +1,127 @@
+"""Batch state transitions for agenda, tickets and coverages.
+
+``apply_transitions`` applies a list of items (entity, id, target status
+and, for tickets and coverages, the assignee) inside the caller's
+transaction. One SELECT per entity reads the current rows; valid items are
+grouped by their target values and each group is written with a single
+``UPDATE ... WHERE id IN (...) RETURNING``; the audit events of the whole
+batch go in one INSERT. Every item gets its own result, and a failing item
+never stops the others.
+"""
+from collections import defaultdict
+from sqlalchemy import update
+from sqlmodel import Session, select
+from .dashboards import OPERATIONS
+from .events import record, removal
+from .models import Agenda, AgendaStatus, Coverage, Role, Ticket, User
+from .serialization import columns
+from .recurrence import overlaps
+from .services import add_audits, has_conflict
+
+# Roles allowed per entity, shared with the single-item endpoints.
+ROLES = {
+    "agenda": (Role.admin,),
+    "ticket": (Role.admin, Role.funcionario),
+    "coverage": (Role.admin, Role.funcionario),
+}
+
+MODELS = {"agenda": Agenda, "ticket": Ticket, "coverage": Coverage}
+
+ACTIONS = {"agenda": "approve", "ticket": "update", "coverage": "update"}
+
+NOT_FOUND = {"agenda": "Agenda não encontrada", "ticket": "Ticket não encontrado", "coverage": "Cobertura não encontrada"}
+
+CONFLICT = "Conflito de agenda para a unidade (interval overlap)"
+
+
+def _values(item) -> tuple:
+    values = [("status", item.status)]
+    # Like the single-item endpoints: coverages always take the assignee, tickets only when given.
+    if item.entity == "coverage" or getattr(item, "assigned_to", None) is not None:
+        values.append(("assigned_to", item.assigned_to))
+    return tuple(values)
+
+
+def _failed(item, error: str) -> dict:
+    return {"entity": item.entity, "id": item.id, "ok": False, "error": error}
+
+
+def _write(session: Session, entity: str, values: tuple, entries: list, results: list, audits: list) -> None:
+    model = MODELS[entity]
+    statement = update(model).where(model.id.in_([item.id for _, item in entries])).values(**dict(values)).returning(*columns(model))
+    rows = session.exec(statement.execution_options(synchronize_session=False)).all()
+    record(session, entity, "update", [model.model_validate(row._asdict()).model_dump(mode="json") for row in rows])
+    details = dict(values)["status"].value if entity == "agenda" else ""
+    for i, item in entries:
+        results[i] = {"entity": entity, "id": item.id, "ok": True, "status": item.status.value}
+        audits.append((ACTIONS[entity], entity, item.id, details))
+
+
+def apply_transitions(session: Session, user: User, items: list) -> list[dict]:
+    """Apply ``items`` (``schemas.TransitionBatch.items``); returns one result per item, in order.
+
+    The caller commits. Bookings leaving ``recusado`` are checked for
+    overlaps after every other write of the batch, so a rejection in the
+    same batch frees its slot first, and against each other.
+    """
+    results: list[dict | None] = [None] * len(items)
+    pending: dict[str, list] = defaultdict(list)
+    seen = set()
+    for i, item in enumerate(items):
+        if user.role not in ROLES[item.entity]:
+            results[i] = _failed(item, "Sem permissão para este recurso")
+        elif (item.entity, item.id) in seen:
+            results[i] = _failed(item, "Item repetido no lote")
+        else:
+            seen.add((item.entity, item.id))
+            pending[item.entity].append((i, item))
+
+    assignees = {item.assigned_to for entries in pending.values() for _, item in entries if getattr(item, "assigned_to", None) is not None}
+    active = set(session.exec(select(User.id).where(User.id.in_(assignees), User.active == True)).all()) if assignees else set()
+
+    groups: dict[tuple, list] = defaultdict(list)
+    removed: list[dict] = []
+    reinstated = []
+    for entity, entries in pending.items():
+        model = MODELS[entity]
+        current = {row.id: row for row in session.exec(select(*columns(model)).where(model.id.in_([item.id for _, item in entries]))).all()}
+        for i, item in entries:
+            row = current.get(item.id)
+            assignee = getattr(item, "assigned_to", None)
+            if row is None:
+                results[i] = _failed(item, NOT_FOUND[entity])
+            elif assignee is not None and assignee not in active:
+                results[i] = _failed(item, "Responsável não encontrado ou inativo")
+            elif entity == "agenda" and row.status == AgendaStatus.recusado and item.status != AgendaStatus.recusado:
+                reinstated.append((i, item, row))
+            else:
+                values = _values(item)
+                if entity != "agenda" and "assigned_to" in dict(values):
+                    removed.append(removal(entity, item.id, row.assigned_to, dict(values)["assigned_to"]))
+                groups[(entity, values)].append((i, item))
+
+    # Sent ahead of the updates, so a row moving between lists ends up in the new one.
+    for entity in ("ticket", "coverage"):
+        rows = [item["data"] for item in removed if item is not None and item["entity"] == entity]
+        if rows:
+            record(session, entity, "remove", rows)
+    audits: list[tuple] = []
+    for (entity, values), entries in groups.items():
+        _write(session, entity, values, entries, results, audits)
+
+    taken: dict[int, list] = defaultdict(list)
+    accepted: dict[tuple, list] = defaultdict(list)
+    for i, item, row in reinstated:
+        slots = taken[row.unit_id]
+        if any(overlaps(row, other) for other in slots) or has_conflict(session, row, exclude_id=row.id):
+            results[i] = _failed(item, CONFLICT)
+        else:
+            slots.append(row)
+            accepted[_values(item)].append((i, item))
+    for values, entries in accepted.items():
+        _write(session, "agenda", values, entries, results, audits)
+
+    add_audits(session, user.id, audits)
+    if any(entity != "agenda" for _, entity, _, _ in audits):
+        session.info.setdefault("dashboards_touched", set()).add(OPERATIONS)
+    return results
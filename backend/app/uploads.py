@@ -0,0 +1,77 @@
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import HTTPException, Request, UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from .config import settings
+from .db import current_tenant
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+STORAGE_DIR = Path(settings.storage_dir) if settings.storage_dir else BASE_DIR / "storage"
+CHUNK_SIZE = 1024 * 1024
+# Allowance per part for its multipart headers and boundary.
+PART_OVERHEAD = 16 * 1024
+
+
+def storage_prefix() -> str:
+    """Path of the current tenant's files relative to ``STORAGE_DIR`` ("" in single-tenant mode)."""
+    tenant = current_tenant.get()
+    return "" if tenant is None else f"tenants/{tenant}/"
+
+
+def storage_root() -> Path:
+    return STORAGE_DIR / storage_prefix()
+
+# Leading bytes of each accepted image format.
+SIGNATURES = {
+    "image/jpeg": lambda head: head.startswith(b"\xff\xd8\xff"),
+    "image/png": lambda head: head.startswith(b"\x89PNG\r\n\x1a\n"),
+    "image/webp": lambda head: head[:4] == b"RIFF" and head[8:12] == b"WEBP",
+    "image/heic": lambda head: head[4:8] == b"ftyp",
+}
+
+
+def check_image(upload: UploadFile) -> None:
+    content_type = (upload.content_type or "").lower()
+    sniff = SIGNATURES.get(content_type)
+    if sniff is None:
+        raise HTTPException(415, f"Tipo de arquivo não suportado: {content_type or 'desconhecido'}")
+    head = upload.file.read(12)
+    upload.file.seek(0)
+    if not sniff(head):
+        raise HTTPException(415, f"Conteúdo de {upload.filename} não corresponde a {content_type}")
+
+
+@asynccontextmanager
+async def uploaded_files(request: Request, field: str, max_files: int, max_bytes: int):
+    """The files sent under ``field``, refused before spooling when over the limits.
+
+    ``Content-Length`` is checked before the body is read and the parser
+    stops at the ``max_files``-th part, so an oversized request never lands
+    on disk. Each file's size is checked too, so callers can store them all
+    without failing halfway.
+    """
+    try:
+        length = int(request.headers["content-length"])
+    except KeyError:
+        raise HTTPException(411, "Content-Length obrigatório")
+    except ValueError:
+        raise HTTPException(400, "Content-Length inválido")
+    if length > max_files * (max_bytes + PART_OVERHEAD):
+        raise HTTPException(413, f"Envio excede o limite de {max_files} arquivos de {max_bytes} bytes")
+    parser = MultiPartParser(request.headers, request.stream(), max_files=max_files)
+    try:
+        form = await parser.parse()
+    except MultiPartException as exc:
+        if parser._current_files > max_files:
+            raise HTTPException(413, f"Envie no máximo {max_files} arquivos por vez")
+        raise HTTPException(400, exc.message)
+    try:
+        files = [value for value in form.getlist(field) if not isinstance(value, str)]
+        if not files:
+            raise HTTPException(422, "Nenhum arquivo enviado")
+        for upload in files:
+            if upload.size is not None and upload.size > max_bytes:
+                raise HTTPException(413, f"Arquivo excede o limite de {max_bytes} bytes")
+        yield files
+    finally:
+        await form.close()
@@ -0,0 +1,88 @@
+"""Create latency of POST /agenda's conflict check as per-unit history grows.
+
+Run from ``backend/``::
+
+    python -m bench.agenda_overlap
+"""
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import Agenda, AgendaStatus, AgendaType, Unit, User, Role
+from app.services import has_overlap
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+PROBES = 200
+
+
+def legacy_has_overlap(session: Session, unit_id: int, start: datetime, end: datetime) -> bool:
+    rows = session.exec(select(Agenda).where(Agenda.unit_id == unit_id)).all()
+    for row in rows:
+        if start < row.end_at and end > row.start_at:
+            return True
+    return False
+
+
+def _seed(session: Session, unit_id: int, user_id: int, count: int, origin: datetime) -> None:
+    rows = []
+    for i in range(count):
+        start = origin + timedelta(hours=2 * i)
+        rows.append(
+            dict(
+                unit_id=unit_id,
+                requester_id=user_id,
+                type=AgendaType.visita,
+                start_at=start,
+                end_at=start + timedelta(hours=1),
+                description="hist",
+                status=AgendaStatus.recusado if i % 10 == 0 else AgendaStatus.aprovado,
+                requires_approval=False,
+            )
+        )
+    session.exec(insert(Agenda), params=rows)
+    session.commit()
+
+
+def _create_latency(session: Session, check, unit_id: int, user_id: int, origin: datetime) -> float:
+    elapsed = 0.0
+    for i in range(PROBES):
+        start = origin + timedelta(hours=2 * i)
+        end = start + timedelta(hours=1)
+        t0 = time.perf_counter()
+        if not check(session, unit_id, start, end):
+            session.add(Agenda(unit_id=unit_id, requester_id=user_id, type=AgendaType.visita, start_at=start, end_at=end, description="probe"))
+            session.commit()
+        elapsed += time.perf_counter() - t0
+    return elapsed / PROBES * 1000
+
+
+def run(size: int, check) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            unit = Unit(code="A1", owner_name="bench")
+            user = User(name="bench", email="bench@vp.local", password_hash="-", role=Role.admin)
+            session.add(unit); session.add(user); session.commit()
+            origin = datetime(2020, 1, 1)
+            _seed(session, unit.id, user.id, size, origin)
+            future = origin + timedelta(hours=2 * size + 24)
+            latency = _create_latency(session, check, unit.id, user.id, future)
+        engine.dispose()
+        return latency
+
+
+def main() -> None:
+    print(f"{'rows/unit':>10} {'legacy ms':>10} {'indexed ms':>11}")
+    for size in SIZES:
+        legacy = run(size, legacy_has_overlap) if size <= 10_000 else float("nan")
+        indexed = run(size, has_overlap)
+        print(f"{size:>10} {legacy:>10.3f} {indexed:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
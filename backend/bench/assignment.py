@@ -0,0 +1,105 @@
+"""Coverage assignment latency with 500 guards and 50k open items.
+
+Compares picking the least-loaded guard with aggregate queries on every
+assignment against the in-memory load index (both strategies), and times
+an index reload and a rebalance after deactivating 50 guards. Run from
+``backend/``::
+
+    python -m bench.assignment
+"""
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+GUARDS = 500
+COVERAGES = 30_000
+TICKETS = 15_000
+ROUNDS = 5_000
+PROBES = 500
+
+
+def _ms(samples: list[float]) -> str:
+    q = statistics.quantiles(samples, n=100, method="inclusive")
+    return f"{q[49] * 1000:>8.3f} {q[98] * 1000:>8.3f}"
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from sqlalchemy import func, insert, update
+        from sqlmodel import Session, select
+        from app import assignment
+        from app.db import engine
+        from app.migrations import migrate
+        from app.models import Agenda, AgendaType, Coverage, CoverageStatus, Role, Round, Ticket, TicketStatus, Unit, User
+
+        migrate(engine)
+        with Session(engine) as session:
+            conn = session.connection()
+            conn.execute(insert(User), [{"name": f"Guarda {n}", "email": f"g{n}@example.com", "password_hash": "-", "role": Role.funcionario, "active": True} for n in range(GUARDS)])
+            guards = session.exec(select(User.id).where(User.role == Role.funcionario)).all()
+            units = session.exec(select(Unit.id)).all()
+            start = datetime(2030, 1, 1)
+            conn.execute(insert(Agenda), [{"unit_id": units[0], "requester_id": 1, "type": AgendaType.saida, "start_at": start, "end_at": start + timedelta(hours=1), "description": "bench", "status": "aprovado"}])
+            agenda = session.exec(select(func.max(Agenda.id))).one()
+            conn.execute(insert(Coverage), [{"unit_id": units[n % len(units)], "from_agenda_id": agenda, "title": "c", "assigned_to": guards[n * 7 % len(guards)], "status": CoverageStatus.pendente} for n in range(COVERAGES)])
+            conn.execute(insert(Ticket), [{"unit_id": units[0], "opened_by": 1, "assigned_to": guards[n * 3 % len(guards)], "title": "t", "description": "", "status": TicketStatus.aberto} for n in range(TICKETS)])
+            conn.execute(insert(Round), [{"unit_id": units[0], "employee_id": guards[n % len(guards)], "location": "x", "happened_at": datetime.utcnow()} for n in range(ROUNDS)])
+            session.commit()
+
+        with Session(engine) as session:
+            # Baseline: the same least-loaded choice computed by the database on each call.
+            def query_least_loaded(unit_id: int) -> int:
+                loads = dict.fromkeys(session.exec(select(User.id).where(User.role == Role.funcionario, User.active == True)).all(), 0.0)
+                for guard, count in session.exec(select(Coverage.assigned_to, func.count()).where(Coverage.status != CoverageStatus.concluida).group_by(Coverage.assigned_to)).all():
+                    if guard in loads:
+                        loads[guard] += count
+                for guard, count in session.exec(select(Ticket.assigned_to, func.count()).where(Ticket.status != TicketStatus.resolvido).group_by(Ticket.assigned_to)).all():
+                    if guard in loads:
+                        loads[guard] += count
+                return min(loads.items(), key=lambda item: (item[1], item[0]))[0]
+
+            query_samples = []
+            for n in range(PROBES // 10):
+                t0 = time.perf_counter()
+                query_least_loaded(n)
+                query_samples.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            assignment.load_index.reload(session)
+            reload_s = time.perf_counter() - t0
+
+            results = {}
+            for name, strategy_cls in assignment.STRATEGIES.items():
+                assignment.strategy = strategy_cls()
+                samples = []
+                for n in range(PROBES):
+                    cov = Coverage(unit_id=units[n % len(units)], from_agenda_id=agenda, title="bench")
+                    t0 = time.perf_counter()
+                    assignment.assign_coverages(session, [cov])
+                    samples.append(time.perf_counter() - t0)
+                results[name] = samples
+            session.rollback()
+
+        with Session(engine) as session:
+            assignment.strategy = assignment.STRATEGIES["least_loaded"]()
+            session.exec(update(User).where(User.id.in_(guards[:50])).values(active=False))
+            t0 = time.perf_counter()
+            moved = assignment.rebalance(session)
+            session.commit()
+            rebalance_s = time.perf_counter() - t0
+
+        print(f"{GUARDS} guards, {COVERAGES + TICKETS + ROUNDS} open items")
+        print(f"{'assignment':>22} {'p50 ms':>8} {'p99 ms':>8}")
+        print(f"{'per-call queries':>22} {_ms(query_samples)}")
+        for name, samples in results.items():
+            print(f"{'index, ' + name:>22} {_ms(samples)}")
+        print(f"index reload: {reload_s * 1000:.1f} ms")
+        print(f"rebalance after deactivating 50 guards: {moved} coverages in {rebalance_s:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
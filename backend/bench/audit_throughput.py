@@ -0,0 +1,65 @@
+"""Throughput of a write endpoint's "entity + audit event" under each audit path.
+
+Run from ``backend/``::
+
+    python -m bench.audit_throughput
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from app.audit import AuditSink
+from app.models import AuditEvent, Unit
+
+WRITES = 2_000
+
+
+def legacy(session: Session, sink: AuditSink, i: int) -> None:
+    unit = Unit(code=f"U{i}", owner_name="bench")
+    session.add(unit); session.commit(); session.refresh(unit)
+    session.add(AuditEvent(user_id=None, action="create", entity="unit", entity_id=unit.id))
+    session.commit()
+
+
+def durable(session: Session, sink: AuditSink, i: int) -> None:
+    unit = Unit(code=f"U{i}", owner_name="bench")
+    session.add(unit); session.flush()
+    session.add(AuditEvent(user_id=None, action="create", entity="unit", entity_id=unit.id))
+    session.commit()
+
+
+def batched(session: Session, sink: AuditSink, i: int) -> None:
+    unit = Unit(code=f"U{i}", owner_name="bench")
+    session.add(unit); session.commit()
+    sink.enqueue(user_id=None, action="create", entity="unit", entity_id=unit.id, details="")
+
+
+def run(write) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        SQLModel.metadata.create_all(engine)
+        sink = AuditSink(engine)
+        sink.start()
+        t0 = time.perf_counter()
+        with Session(engine) as session:
+            for i in range(WRITES):
+                write(session, sink, i)
+        sink.stop()
+        elapsed = time.perf_counter() - t0
+        with Session(engine) as session:
+            stored = session.exec(select(func.count(AuditEvent.id))).one()
+        engine.dispose()
+        return WRITES / elapsed, stored
+
+
+def main() -> None:
+    print(f"{'path':>8} {'writes/s':>10} {'audit rows':>11}")
+    for write in (legacy, durable, batched):
+        rate, stored = run(write)
+        print(f"{write.__name__:>8} {rate:>10.0f} {stored:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Requests/s on /me and /agenda with the authenticated-user cache on and off.
+
+Run from ``backend/``::
+
+    python -m bench.auth_cache
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+REQUESTS = 2_000
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from fastapi.testclient import TestClient
+        from app.auth import create_access_token, user_cache
+        from app.config import settings
+        from app.main import app
+
+        with TestClient(app) as client:
+            headers = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+            print(f"{'endpoint':>8} {'cache':>6} {'req/s':>8}")
+            for path in ("/me", "/agenda"):
+                for enabled in (False, True):
+                    settings.user_cache_enabled = enabled
+                    user_cache.clear()
+                    client.get(path, headers=headers)
+                    t0 = time.perf_counter()
+                    for _ in range(REQUESTS):
+                        client.get(path, headers=headers)
+                    rate = REQUESTS / (time.perf_counter() - t0)
+                    print(f"{path:>8} {'on' if enabled else 'off':>6} {rate:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
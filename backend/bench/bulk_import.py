@@ -0,0 +1,57 @@
+"""Onboarding 600 units with 12 months of payments: one POST per row vs bulk import.
+
+Run from ``backend/``::
+
+    python -m bench.bulk_import
+"""
+import os
+import tempfile
+import time
+from pathlib import Path
+
+UNITS = 600
+MONTHS = 12
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from fastapi.testclient import TestClient
+        from sqlmodel import Session, select
+        from app.auth import create_access_token
+        from app.db import engine
+        from app.main import app
+        from app.models import Unit
+
+        with TestClient(app) as client:
+            headers = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+
+            t0 = time.perf_counter()
+            for i in range(UNITS):
+                unit = client.post("/units", json={"code": f"S-{i}", "owner_name": f"Dono {i}"}, headers=headers).json()
+                for m in range(MONTHS):
+                    client.post("/payments", json={"unit_id": unit["id"], "due_date": f"2025-{m + 1:02d}-10", "amount": 450.0}, headers=headers)
+            single = time.perf_counter() - t0
+
+            units = "code,owner_name\n" + "".join(f"B-{i},Dono {i}\n" for i in range(UNITS))
+            t0 = time.perf_counter()
+            client.post("/admin/import/units", files={"file": ("units.csv", units)}, headers=headers)
+            with Session(engine) as session:
+                ids = session.exec(select(Unit.id).where(Unit.code.like("B-%"))).all()
+            payments = "unit_id,due_date,amount\n" + "".join(f"{uid},2025-{m + 1:02d}-10,450.0\n" for uid in ids for m in range(MONTHS))
+            client.post("/admin/import/payments", files={"file": ("payments.csv", payments)}, headers=headers)
+            bulk = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            size = len(client.get("/admin/export/payments", headers=headers).content)
+            export = time.perf_counter() - t0
+
+            rows = UNITS * (MONTHS + 1)
+            print(f"{'mode':>10} {'rows':>7} {'seconds':>8} {'rows/s':>8}")
+            print(f"{'single':>10} {rows:>7} {single:>8.2f} {rows / single:>8.0f}")
+            print(f"{'bulk':>10} {rows:>7} {bulk:>8.2f} {rows / bulk:>8.0f}")
+            print(f"export payments: {size} bytes in {export:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
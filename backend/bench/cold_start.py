@@ -0,0 +1,69 @@
+"""Time from launching uvicorn to the first successful request.
+
+Measures a boot on an empty database, a reboot on the same database, and
+4 workers booting in parallel on an empty database (then checks the demo
+data was seeded exactly once). Run from ``backend/``::
+
+    python -m bench.cold_start
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.server import _free_port
+
+RUNS = 3
+
+
+def _boot(db: Path, workers: int = 1) -> float:
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db}")
+    t0 = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/public-config").status_code == 200:
+                    return time.perf_counter() - t0
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.01)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    fresh, warm, parallel = [], [], []
+    for _ in range(RUNS):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Path(tmp) / "bench.db"
+            fresh.append(_boot(db))
+            warm.append(_boot(db))
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Path(tmp) / "bench.db"
+            parallel.append(_boot(db, workers=4))
+            # Give the slower workers time to finish their startup before counting.
+            time.sleep(2)
+            with sqlite3.connect(db) as conn:
+                users = conn.execute("SELECT count(*) FROM user").fetchone()[0]
+            if users != 3:
+                print(f"parallel boot seeded {users} users (expected 3)")
+    print(f"{'boot':>22} {'best s':>7} {'mean s':>7}")
+    for name, samples in (("empty database", fresh), ("existing database", warm), ("4 workers, empty db", parallel)):
+        print(f"{name:>22} {min(samples):>7.2f} {sum(samples) / len(samples):>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
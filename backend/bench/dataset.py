@@ -0,0 +1,128 @@
+"""Synthetic dataset for benchmarks, added on top of the demo seed.
+
+Rows are bulk-inserted with fixed random seeds, so the same scale always
+produces the same database. Every synthetic user shares one password hash
+(``PASSWORD``) and uses an ``example.com`` address so it can log in.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+from sqlmodel import Session, func, select
+
+PASSWORD = "senha123"
+
+SCALES = {
+    "small": {"units": 50, "users": 200, "agendas": 2_000, "audit": 20_000},
+    "medium": {"units": 500, "users": 2_000, "agendas": 50_000, "audit": 500_000},
+    "large": {"units": 2_000, "users": 10_000, "agendas": 200_000, "audit": 2_000_000},
+}
+
+CHUNK = 10_000
+
+
+def _insert(session: Session, model, rows) -> None:
+    rows = list(rows)
+    for start in range(0, len(rows), CHUNK):
+        session.connection().execute(insert(model), rows[start : start + CHUNK])
+
+
+def seed_synthetic(bind, units: int, users: int, agendas: int, audit: int, seed: int = 42) -> dict:
+    """Insert the synthetic rows into a migrated database; returns ids the scenarios need."""
+    from app.dashboards import _month, refresh_payment_months
+    from app.models import Agenda, AgendaStatus, AgendaType, AuditEvent, Payment, PaymentStatus, Role, Round, Ticket, Unit, User
+    from app.passwords import hash_password
+
+    rng = random.Random(seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    today = date.today()
+    with Session(bind) as session:
+        _insert(session, Unit, ({"code": f"S{n:05d}", "owner_name": f"Proprietário {n}"} for n in range(units)))
+        unit_ids = session.exec(select(Unit.id).where(Unit.code.like("S%")).order_by(Unit.id)).all()
+
+        password_hash = hash_password(PASSWORD)
+        guards = max(1, users // 10)
+        _insert(
+            session,
+            User,
+            (
+                {
+                    "name": f"Usuário {n}",
+                    "email": f"user{n}@example.com",
+                    "password_hash": password_hash,
+                    "role": Role.funcionario if n < guards else Role.morador,
+                    "unit_id": None if n < guards else unit_ids[n % units],
+                    "active": True,
+                }
+                for n in range(users)
+            ),
+        )
+        guard_ids = session.exec(select(User.id).where(User.role == Role.funcionario, User.email.like("user%")).order_by(User.id)).all()
+
+        # Back-to-back two-hour bookings per unit, ending a day ago, never overlapping.
+        per_unit = max(1, agendas // units)
+        _insert(
+            session,
+            Agenda,
+            (
+                {
+                    "unit_id": unit_id,
+                    "requester_id": guard_ids[k % len(guard_ids)],
+                    "type": AgendaType.visita,
+                    "start_at": now - timedelta(days=1, hours=2 * (k + 1)),
+                    "end_at": now - timedelta(days=1, hours=2 * k + 1),
+                    "description": "sintético",
+                    "status": AgendaStatus.aprovado,
+                    "requires_approval": False,
+                }
+                for unit_id in unit_ids
+                for k in range(per_unit)
+            ),
+        )
+
+        months = [today.replace(day=10) - timedelta(days=30 * m) for m in range(12)]
+        _insert(
+            session,
+            Payment,
+            (
+                {"unit_id": unit_id, "due_date": due, "amount": 450.0 + unit_id % 5 * 25, "status": rng.choice([PaymentStatus.pago, PaymentStatus.pago, PaymentStatus.atrasado])}
+                for unit_id in unit_ids
+                for due in months[1:]
+            ),
+        )
+        refresh_payment_months(session.connection(), {_month(d) for d in months})
+
+        _insert(
+            session,
+            Ticket,
+            (
+                {"unit_id": unit_id, "opened_by": 1, "assigned_to": rng.choice(guard_ids), "title": "Sintético", "description": "", "status": rng.choice(["aberto", "em_atendimento", "resolvido"])}
+                for unit_id in unit_ids
+                for _ in range(2)
+            ),
+        )
+        _insert(
+            session,
+            Round,
+            ({"unit_id": rng.choice(unit_ids), "employee_id": guard, "location": "Portaria", "happened_at": now - timedelta(hours=rng.randint(1, 72))} for guard in guard_ids for _ in range(3)),
+        )
+
+        entities = ["agenda", "ticket", "payment", "coverage", "user", "round"]
+        _insert(
+            session,
+            AuditEvent,
+            (
+                {
+                    "user_id": rng.choice(guard_ids),
+                    "action": rng.choice(["create", "update", "login"]),
+                    "entity": rng.choice(entities),
+                    "entity_id": rng.randint(1, max(agendas, 1)),
+                    "happened_at": now - timedelta(seconds=rng.randint(0, 60 * 86400)),
+                    "details": "",
+                }
+                for _ in range(audit)
+            ),
+        )
+        session.commit()
+        agenda_count = session.exec(select(func.count(Agenda.id))).one()
+    return {"unit_ids": unit_ids, "guard_ids": guard_ids, "users": users, "agendas": agenda_count}
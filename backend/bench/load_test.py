@@ -0,0 +1,80 @@
+"""p50/p99 latency of hot endpoints under 50 and 200 concurrent clients.
+
+Starts the app under a local uvicorn on a throwaway database and drives it
+with ``httpx``. Run from ``backend/``::
+
+    python -m bench.load_test [--workers N]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from bench.server import local_server
+
+CONCURRENCY = [50, 200]
+REQUESTS_PER_CLIENT = 10
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else float("nan")
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(pct) - 1]
+
+
+async def _drive(base_url: str, headers: dict, clients: int, request) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        async def worker(n: int) -> None:
+            nonlocal errors
+            for i in range(REQUESTS_PER_CLIENT):
+                t0 = time.perf_counter()
+                response = await request(client, n, i)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if response.status_code >= 500:
+                    errors += 1
+        await asyncio.gather(*(worker(n) for n in range(clients)))
+    return latencies, errors
+
+
+def _scenarios(clients: int):
+    origin = datetime(2040, 1, 1) + timedelta(days=365 * clients)
+
+    async def create_agenda(client, n, i):
+        start = origin + timedelta(hours=2 * (n * REQUESTS_PER_CLIENT + i))
+        body = {"unit_id": 1, "type": "visita", "start_at": start.isoformat(), "end_at": (start + timedelta(hours=1)).isoformat(), "description": "load"}
+        return await client.post("/agenda", json=body)
+
+    return {
+        "GET /me": lambda client, n, i: client.get("/me"),
+        "GET /agenda": lambda client, n, i: client.get("/agenda"),
+        "GET /dashboard/finance": lambda client, n, i: client.get("/dashboard/finance"),
+        "POST /agenda": create_agenda,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    with local_server(workers=args.workers) as (base_url, _):
+        from app.auth import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+        print(f"{'endpoint':>22} {'clients':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'5xx':>5}")
+        for clients in CONCURRENCY:
+            for name, request in _scenarios(clients).items():
+                t0 = time.perf_counter()
+                latencies, errors = asyncio.run(_drive(base_url, headers, clients, request))
+                rate = len(latencies) / (time.perf_counter() - t0)
+                print(f"{name:>22} {clients:>8} {_percentile(latencies, 50):>8.1f} {_percentile(latencies, 99):>8.1f} {rate:>8.0f} {errors:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Login throughput under 100 concurrent logins, with hashing inline vs in the process pool.
+
+While the logins run, a few clients keep calling ``GET /me`` and the
+synchronous ``POST /tickets`` to show how the rest of the API fares. Rejected
+logins (503) are retried after ``Retry-After``. Run from ``backend/``::
+
+    python -m bench.login_burst [--logins 100] [--rounds 12]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from bench.server import local_server
+
+BACKGROUND_CLIENTS = 5
+
+
+def _p(samples: list[float], pct: int) -> float:
+    if len(samples) < 2:
+        return samples[0] if samples else float("nan")
+    return statistics.quantiles(samples, n=100, method="inclusive")[pct - 1]
+
+
+async def _burst(base_url: str, headers: dict, logins: int) -> dict:
+    login_ms: list[float] = []
+    other_ms: list[float] = []
+    rejected = 0
+    done = asyncio.Event()
+    limits = httpx.Limits(max_connections=logins + BACKGROUND_CLIENTS)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def login(n: int) -> None:
+            nonlocal rejected
+            t0 = time.perf_counter()
+            while True:
+                r = await client.post("/auth/login", json={"email": f"guard{n}@example.com", "password": "senha123"})
+                if r.status_code != 503:
+                    break
+                rejected += 1
+                await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+            r.raise_for_status()
+            login_ms.append((time.perf_counter() - t0) * 1000)
+
+        async def background(n: int) -> None:
+            while not done.is_set():
+                t0 = time.perf_counter()
+                if n % 2:
+                    await client.get("/me", headers=headers)
+                else:
+                    await client.post("/tickets", json={"unit_id": 1, "title": "bench", "description": "login burst"}, headers=headers)
+                other_ms.append((time.perf_counter() - t0) * 1000)
+
+        others = [asyncio.create_task(background(n)) for n in range(BACKGROUND_CLIENTS)]
+        t0 = time.perf_counter()
+        await asyncio.gather(*(login(n) for n in range(logins)))
+        elapsed = time.perf_counter() - t0
+        done.set()
+        await asyncio.gather(*others)
+    return {
+        "logins_per_s": logins / elapsed,
+        "login_p50": _p(login_ms, 50),
+        "login_p95": _p(login_ms, 95),
+        "other_p50": _p(other_ms, 50),
+        "other_p99": _p(other_ms, 99),
+        "rejected": rejected,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    users = "name,email,password,role\n" + "".join(f"Guarda {n},guard{n}@example.com,senha123,funcionario\n" for n in range(args.logins))
+    print(f"{'hashing':>8} {'logins/s':>9} {'login p50':>10} {'login p95':>10} {'other p50':>10} {'other p99':>10} {'503':>5}")
+    for label, workers in (("inline", "0"), ("pool", "")):
+        env = {"BCRYPT_ROUNDS": str(args.rounds)}
+        if workers:
+            env["PASSWORD_HASH_WORKERS"] = workers
+        with local_server(**env) as (base_url, _):
+            from app.auth import create_access_token
+
+            headers = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+            httpx.post(f"{base_url}/admin/import/users", files={"file": ("users.csv", users)}, headers=headers, timeout=600).raise_for_status()
+            r = asyncio.run(_burst(base_url, headers, args.logins))
+        print(f"{label:>8} {r['logins_per_s']:>9.1f} {r['login_p50']:>10.0f} {r['login_p95']:>10.0f} {r['other_p50']:>10.1f} {r['other_p99']:>10.1f} {r['rejected']:>5}")
+
+
+if __name__ == "__main__":
+    main()
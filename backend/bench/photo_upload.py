@@ -0,0 +1,52 @@
+"""Peak server RSS and throughput for 20 concurrent 8 MB round photo uploads.
+
+Run from ``backend/``::
+
+    python -m bench.photo_upload
+"""
+import asyncio
+import os
+import tempfile
+import time
+
+import httpx
+
+from bench.server import local_server, peak_rss_kb
+
+CLIENTS = 20
+PHOTO_BYTES = 8 * 1024 * 1024
+
+
+async def _upload_all(base_url: str, headers: dict, photo: bytes) -> list[float]:
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=120) as client:
+        response = await client.post("/rounds", json={"unit_id": 1, "location": "bench", "happened_at": "2030-01-01T00:00:00"})
+        round_id = response.json()["id"]
+
+        async def one(n: int) -> float:
+            t0 = time.perf_counter()
+            response = await client.post(f"/rounds/{round_id}/photos", files=[("files", (f"p{n}.jpg", photo, "image/jpeg"))])
+            response.raise_for_status()
+            return time.perf_counter() - t0
+
+        return await asyncio.gather(*(one(n) for n in range(CLIENTS)))
+
+
+def main() -> None:
+    photo = b"\xff\xd8\xff\xe0" + os.urandom(PHOTO_BYTES - 4)
+    with tempfile.TemporaryDirectory() as storage_dir, local_server(STORAGE_DIR=storage_dir) as (base_url, server):
+        from app.auth import create_access_token
+
+        headers = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+        idle_rss = peak_rss_kb(server.pid)
+        t0 = time.perf_counter()
+        latencies = asyncio.run(_upload_all(base_url, headers, photo))
+        elapsed = time.perf_counter() - t0
+        peak_rss = peak_rss_kb(server.pid)
+    print(f"uploads: {CLIENTS} x {PHOTO_BYTES // (1024 * 1024)} MB")
+    print(f"throughput: {CLIENTS * PHOTO_BYTES / elapsed / (1024 * 1024):.1f} MB/s")
+    print(f"max latency: {max(latencies) * 1000:.0f} ms")
+    print(f"peak RSS: {idle_rss / 1024:.0f} MB idle -> {peak_rss / 1024:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Encoding a page of payments: ORM entities + jsonable_encoder vs column rows + orjson.
+
+For 1k, 10k and 100k rows reports query+encode time and the peak Python
+allocation (``tracemalloc``), plus the NDJSON export of the same table.
+Run from ``backend/``::
+
+    python -m bench.serialization
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def _measure(fn) -> tuple[float, float, int]:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, size
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        from fastapi.encoders import jsonable_encoder
+        from sqlalchemy import insert
+        from sqlmodel import Session, select
+        from app.bulk import BulkEntity, BulkFormat, export_rows
+        from app.db import engine
+        from app.migrations import migrate
+        from app.models import Payment, PaymentStatus
+        from app.serialization import columns, dumps
+
+        migrate(engine)
+        with Session(engine) as session:
+            start = date(2020, 1, 1)
+            rows = [{"unit_id": 1, "due_date": start + timedelta(days=n % 3650), "amount": 450.0 + n % 7, "status": PaymentStatus.pendente} for n in range(SIZES[-1])]
+            session.connection().execute(insert(Payment), rows)
+            session.commit()
+
+        def legacy(limit: int):
+            def run() -> int:
+                with Session(engine) as session:
+                    items = session.exec(select(Payment).order_by(Payment.id).limit(limit)).all()
+                    return len(json.dumps(jsonable_encoder({"items": items, "next_cursor": None})).encode())
+            return run
+
+        def columnar(limit: int):
+            def run() -> int:
+                with Session(engine) as session:
+                    result = session.exec(select(*columns(Payment)).order_by(Payment.id).limit(limit)).all()
+                    keys = result[0]._fields
+                    return len(dumps({"items": [dict(zip(keys, row)) for row in result], "next_cursor": None}))
+            return run
+
+        def export() -> int:
+            return sum(len(chunk) for chunk in export_rows(engine, BulkEntity.payments, BulkFormat.ndjson))
+
+        print(f"{'rows':>7} {'path':>10} {'seconds':>8} {'peak MB':>8} {'bytes':>10}")
+        for limit in SIZES:
+            for label, fn in (("legacy", legacy(limit)), ("orjson", columnar(limit))):
+                elapsed, peak, size = _measure(fn)
+                print(f"{limit:>7} {label:>10} {elapsed:>8.3f} {peak:>8.1f} {size:>10}")
+        elapsed, peak, size = _measure(export)
+        print(f"{SIZES[-1]:>7} {'ndjson':>10} {elapsed:>8.3f} {peak:>8.1f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
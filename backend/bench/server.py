@@ -0,0 +1,61 @@
+"""Run the app under a local uvicorn on a throwaway database for benchmarks."""
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import httpx
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/public-config").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+def peak_rss_kb(pid: int) -> int:
+    """Peak resident set size of ``pid`` in KiB (Linux only)."""
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1])
+    return 0
+
+
+@contextmanager
+def local_server(workers: int = 1, **env_overrides: str):
+    """Yield ``(base_url, process)`` for a uvicorn serving ``app.main:app``.
+
+    ``DATABASE_URL`` points at a temporary SQLite file that is removed on exit,
+    and is also exported to this process so tokens can be minted locally.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{Path(tmp) / 'bench.db'}", **env_overrides)
+        os.environ.update(env)
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning", "--timeout-keep-alive", "120"],
+            env=env,
+        )
+        try:
+            _wait_ready(base_url)
+            yield base_url, server
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,221 @@
+"""Benchmark suite for the API hot paths, with JSON output and baseline comparison.
+
+Seeds a synthetic dataset (``bench.dataset``) at the chosen scale, then
+drives each endpoint with ``--concurrency`` clients for ``--requests``
+requests, either in-process through an ASGI transport or against a local
+uvicorn. Reports requests/s and p50/p95/p99 per endpoint as JSON; with
+``--baseline`` the run is compared against a stored result and the exit
+status is 1 when an endpoint regressed beyond ``--threshold``. Run from
+``backend/``::
+
+    python -m bench.suite --scale small --output bench-results.json
+    python -m bench.suite --scale small --mode uvicorn --baseline bench-results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from bench.dataset import PASSWORD, SCALES, seed_synthetic
+from bench.server import local_server
+
+
+def _photo(n: int) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), (n % 256, n // 256 % 256, 90)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _scenarios(data: dict, admin: dict):
+    units, users, guards = data["unit_ids"], data["users"], data["guard_ids"]
+    origin = datetime(2040, 1, 1)
+
+    async def login(client, i):
+        return await client.post("/auth/login", json={"email": f"user{i % users}@example.com", "password": PASSWORD})
+
+    async def create_agenda(client, i):
+        # Distinct units and slots, so every request runs the full overlap check and succeeds.
+        start = origin + timedelta(hours=2 * (i // len(units)))
+        body = {"unit_id": units[i % len(units)], "type": "visita", "start_at": start.isoformat(), "end_at": (start + timedelta(hours=1)).isoformat(), "description": "bench"}
+        return await client.post("/agenda", json=body, headers=admin)
+
+    async def upload_photo(client, i):
+        return await client.post(f"/rounds/{data['round_id']}/photos", files=[("files", (f"p{i}.jpg", _photo(i), "image/jpeg"))], headers=admin)
+
+    return {
+        "POST /auth/login": login,
+        "GET /me": lambda client, i: client.get("/me", headers=admin),
+        "POST /agenda": create_agenda,
+        "GET /agenda": lambda client, i: client.get(f"/agenda?unit_id={units[i % len(units)]}", headers=admin),
+        "GET /audit": lambda client, i: client.get(f"/audit?user_id={guards[i % len(guards)]}", headers=admin),
+        "GET /payments": lambda client, i: client.get(f"/payments?unit_id={units[i % len(units)]}", headers=admin),
+        "GET /dashboard/finance": lambda client, i: client.get("/dashboard/finance", headers=admin),
+        "GET /dashboard/operations": lambda client, i: client.get("/dashboard/operations", headers=admin),
+        "POST /rounds/{id}/photos": upload_photo,
+    }
+
+
+async def _drive(client: httpx.AsyncClient, request, offset: int, count: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(offset, offset + count))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            response = await request(client, i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {"requests": count, "errors": errors, "rps": round(count / elapsed, 1), "p50": round(q[49], 2), "p95": round(q[94], 2), "p99": round(q[98], 2)}
+
+
+async def _run(client: httpx.AsyncClient, data: dict, args) -> dict:
+    from app.auth import create_access_token
+
+    admin = {"Authorization": f"Bearer {create_access_token('admin@vp.local', user_id=1)}"}
+    response = await client.post("/rounds", json={"unit_id": data["unit_ids"][0], "location": "bench", "happened_at": "2030-01-01T00:00:00"}, headers=admin)
+    data["round_id"] = response.json()["id"]
+    results = {}
+    for name, request in _scenarios(data, admin).items():
+        if args.only and name not in args.only:
+            continue
+        if args.warmup:
+            await _drive(client, request, 0, args.warmup, min(args.concurrency, args.warmup))
+        results[name] = await _drive(client, request, args.warmup, args.requests, args.concurrency)
+        print(f"{name:>26} {results[name]['rps']:>8.1f} {results[name]['p50']:>8.1f} {results[name]['p95']:>8.1f} {results[name]['p99']:>8.1f} {results[name]['errors']:>5}", file=sys.stderr)
+    return results
+
+
+def _seed(scale: dict) -> dict:
+    from app.db import engine
+
+    t0 = time.perf_counter()
+    data = seed_synthetic(engine, **scale)
+    print(f"seeded {scale} in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return data
+
+
+async def _in_process(scale: dict, args) -> dict:
+    from app.main import app
+
+    await app.router.startup()
+    try:
+        data = _seed(scale)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await _run(client, data, args)
+    finally:
+        await app.router.shutdown()
+
+
+async def _uvicorn(base_url: str, scale: dict, args) -> dict:
+    data = _seed(scale)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        return await _run(client, data, args)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Endpoints whose p95 grew or throughput dropped by more than ``threshold``."""
+    regressions = []
+    for key in ("mode", "workers", "scale", "concurrency", "bcrypt_rounds", "cpus"):
+        if current["meta"].get(key) != baseline["meta"].get(key):
+            print(f"warning: baseline was run with {key}={baseline['meta'].get(key)!r}, this run with {current['meta'].get(key)!r}", file=sys.stderr)
+    print(f"{'endpoint':>26} {'rps':>8} {'base':>8} {'p95 ms':>8} {'base':>8}", file=sys.stderr)
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        print(f"{name:>26} {result['rps']:>8.1f} {base['rps']:>8.1f} {result['p95']:>8.1f} {base['p95']:>8.1f}", file=sys.stderr)
+        if result["p95"] > base["p95"] * (1 + threshold) or result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(name)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for key in SCALES["small"]:
+        parser.add_argument(f"--{key}", type=int, help=f"override the {key} count of the scale")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--only", action="append", help="run only this endpoint (repeatable)")
+    parser.add_argument("--output", type=Path, help="write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="compare against a stored result")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    scale = {key: getattr(args, key) or value for key, value in SCALES[args.scale].items()}
+    # Background jobs would write while endpoints are measured.
+    env = {"BCRYPT_ROUNDS": str(args.bcrypt_rounds), "PAYMENT_SCHEDULE_INTERVAL": "0", "AUDIT_RETENTION_DAYS": "0"}
+    print(f"{'endpoint':>26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'4xx+':>5}", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as tmp:
+        env["STORAGE_DIR"] = str(Path(tmp) / "storage")
+        if args.mode == "inprocess":
+            os.environ.update(env, DATABASE_URL=f"sqlite:///{Path(tmp) / 'bench.db'}")
+            results = asyncio.run(_in_process(scale, args))
+        else:
+            with local_server(workers=args.workers, **env) as (base_url, _):
+                results = asyncio.run(_uvicorn(base_url, scale, args))
+
+    report = {
+        "meta": {
+            "mode": args.mode,
+            "workers": args.workers if args.mode == "uvicorn" else None,
+            "scale": scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "bcrypt_rounds": args.bcrypt_rounds,
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    if args.baseline:
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Memory and open files per idle tenant in multi-tenant mode.
+
+Creates ``--tenants`` condominiums, each with its own SQLite file, and
+serves one round of requests (login, agenda, dashboard, public config) to
+every one of them in-process. Reports the growth in RSS, in Python heap
+(``tracemalloc``) and in open file descriptors per tenant left idle with
+its engines cached, after the engines are disposed, and with the engine
+cache capped at ``--cache``. Run from ``backend/`` (Linux only)::
+
+    python -m bench.tenants --tenants 100 --cache 16
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+PASSWORD = "bench123"
+
+
+def _rss_kb() -> int:
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return 0
+
+
+def _fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+def _sample() -> tuple[int, int, int]:
+    gc.collect()
+    return _rss_kb(), tracemalloc.get_traced_memory()[0], _fds()
+
+
+def _visit(client, slug: str) -> None:
+    host = {"host": f"{slug}.bench.local"}
+    token = client.post("/auth/login", json={"email": f"admin@{slug}.com.br", "password": PASSWORD}, headers=host).json()["access_token"]
+    headers = {**host, "Authorization": f"Bearer {token}"}
+    for path in ("/agenda", "/dashboard/operations", "/public-config"):
+        assert client.get(path, headers=headers).status_code == 200, path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--cache", type=int, default=16, help="engine cache size for the capped round")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{Path(tmp) / 'catalog.db'}",
+            TENANT_DATABASE_URL=f"sqlite:///{Path(tmp) / 'tenants'}/{{tenant}}.db",
+            TENANT_ENGINE_CACHE=str(args.tenants + 1),
+            STORAGE_DIR=str(Path(tmp) / "storage"),
+            BCRYPT_ROUNDS="4",
+            PAYMENT_SCHEDULE_INTERVAL="0",
+            AUDIT_RETENTION_DAYS="0",
+        )
+        from fastapi.testclient import TestClient
+        from app.db import tenant_engines
+        from app.main import app
+        from app.tenants import create_tenant
+
+        slugs = [f"t{n:04d}" for n in range(args.tenants + 1)]
+        t0 = time.perf_counter()
+        for slug in slugs:
+            create_tenant(slug, f"Condomínio {slug}", None, f"admin@{slug}.com.br", PASSWORD)
+        print(f"created {len(slugs)} tenants in {time.perf_counter() - t0:.1f}s")
+
+        with TestClient(app) as client:
+            # The first tenant pays for lazy imports and warm-up, not for tenancy.
+            _visit(client, slugs[0])
+            tracemalloc.start()
+            base = _sample()
+            t0 = time.perf_counter()
+            for slug in slugs[1:]:
+                _visit(client, slug)
+            elapsed = time.perf_counter() - t0
+            cached = _sample()
+            client.portal.call(tenant_engines.dispose)
+            disposed = _sample()
+            tenant_engines.maxsize = args.cache
+            for slug in slugs[1:]:
+                _visit(client, slug)
+            capped = _sample()
+            tracemalloc.stop()
+
+        n = args.tenants
+        print(f"first visit of {n} tenants: {elapsed / n * 1000:.1f} ms each (opens and migrates the database)")
+        print(f"{'state':>24} {'RSS KiB/tenant':>15} {'heap KiB/tenant':>16} {'fds/tenant':>11}")
+        for name, (rss, heap, fds) in (("engines cached", cached), ("engines disposed", disposed), (f"cache capped at {args.cache}", capped)):
+            print(f"{name:>24} {(rss - base[0]) / n:>15.1f} {(heap - base[1]) / 1024 / n:>16.1f} {(fds - base[2]) / n:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
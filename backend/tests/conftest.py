@@ -0,0 +1,37 @@
+import os
+import tempfile
+from pathlib import Path
+
+# Settings are read when ``app`` is first imported: point every path at a
+# scratch directory and turn off the background jobs before that happens.
+_scratch = Path(tempfile.mkdtemp(prefix="vp-tests-"))
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{_scratch / 'app.db'}",
+    STORAGE_DIR=str(_scratch / "storage"),
+    AUDIT_ARCHIVE_DIR=str(_scratch / "audit_archive"),
+    PROFILE_DIR=str(_scratch / "profiles"),
+    SEED_DEMO_DATA="false",
+    PAYMENT_SCHEDULE_INTERVAL="0",
+    AUDIT_RETENTION_DAYS="0",
+    BCRYPT_ROUNDS="4",
+    PASSWORD_HASH_WORKERS="0",
+)
+
+import pytest
+from sqlmodel import Session, create_engine
+from app.migrations import migrate
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A migrated, empty SQLite database of its own."""
+    bind = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    migrate(bind)
+    yield bind
+    bind.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    with Session(engine) as session:
+        yield session
@@ -0,0 +1,86 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from sqlmodel import select
+from app import archive
+from app.archive import AuditArchiver, audit_page
+from app.models import AuditEvent, AuditSegment, AuditSegmentKey
+
+NOW = datetime(2026, 6, 1)
+
+
+@pytest.fixture
+def archived(engine, session, tmp_path, monkeypatch):
+    """600 events over 200 days, the older ones moved to segments of 50 rows."""
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path / "archive")
+    archive._read_file.cache_clear()
+    rng = random.Random(7)
+    rows = [
+        {
+            "user_id": rng.choice([None, 1, 2]),
+            "action": rng.choice(["create", "update", "delete"]),
+            "entity": rng.choice(["agenda", "ticket", "unit"]),
+            "entity_id": rng.randint(1, 5),
+            "happened_at": NOW - timedelta(days=200) + timedelta(hours=8 * n),
+            "details": "",
+        }
+        for n in range(600)
+    ]
+    session.exec(insert(AuditEvent), params=rows)
+    session.commit()
+    moved = AuditArchiver(engine, tmp_path / "archive", retention_days=30, segment_rows=50).archive(now=NOW)
+    assert 0 < moved < 600
+    return session
+
+
+def _expected(session, **filters) -> list[int]:
+    rows = [row for segment in session.exec(select(AuditSegment)).all() for row in archive.read_segment(segment.path)]
+    rows += [row.model_dump() for row in session.exec(select(AuditEvent)).all()]
+    rows = [row for row in rows if all(row[name] == value for name, value in filters.items())]
+    return [row["id"] for row in sorted(rows, key=lambda row: (row["happened_at"], row["id"]), reverse=True)]
+
+
+def _walk(session, limit: int, **filters) -> list[int]:
+    ids, cursor = [], None
+    while True:
+        page = audit_page(session, cursor=cursor, limit=limit, **filters)
+        assert len(page["items"]) <= limit
+        ids += [row["id"] for row in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+def test_limit_dividing_live_rows_reaches_archive(archived):
+    live = len(archived.exec(select(AuditEvent.id)).all())
+    expected = _expected(archived)
+    for limit in (1, live, next(n for n in range(7, live) if live % n == 0)):
+        assert _walk(archived, limit) == expected
+
+
+@pytest.mark.parametrize("limit", [1, 3, 20, 50, 1000])
+@pytest.mark.parametrize("filters", [{"entity": "ticket"}, {"action": "delete", "user_id": 2}, {"entity": "unit", "entity_id": 3}, {}])
+def test_pages_match_full_listing(archived, limit, filters):
+    assert _walk(archived, limit, **filters) == _expected(archived, **filters)
+
+
+def test_filters_skip_segments_without_matching_keys(archived, monkeypatch):
+    opened = []
+    read = archive.read_segment
+    monkeypatch.setattr(archive, "read_segment", lambda path: opened.append(path) or read(path))
+    audit_page(archived, cursor=None, limit=10, entity="nothing")
+    assert opened == []
+    audit_page(archived, cursor=None, limit=10_000, entity="ticket")
+    keyed = archived.exec(select(AuditSegmentKey.segment_id).where(AuditSegmentKey.name == "entity", AuditSegmentKey.value == "ticket")).all()
+    assert len(opened) == len(set(keyed))
+
+
+def test_missing_segment_is_not_cached(archived, tmp_path):
+    segment = archived.exec(select(AuditSegment)).first()
+    target = tmp_path / "archive" / segment.path
+    moved = target.with_suffix(".bak")
+    target.rename(moved)
+    assert archive.read_segment(segment.path) == ()
+    moved.rename(target)
+    assert len(archive.read_segment(segment.path)) == segment.rows
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import select
+from app import assignment
+from app.assignment import LeastLoaded, LoadIndex, RoundRobin, assign_coverages, load_index, rebalance
+from app.models import Agenda, AgendaType, Coverage, CoverageStatus, Role, Round, Ticket, Unit, User
+
+
+@pytest.fixture
+def guards(session):
+    """Three active guards (ids 2-4), one inactive (5), a unit and a departure."""
+    load_index.invalidate()
+    load_index.positions.clear()
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.add(User(name="Ana", email="ana@x.com.br", password_hash="x", role=Role.morador, unit_id=1))
+    for name in ("Bruno", "Carla", "Davi", "Edu"):
+        session.add(User(name=name, email=f"{name.lower()}@x.com.br", password_hash="x", role=Role.funcionario, active=name != "Edu"))
+    now = datetime.now()
+    session.add(Agenda(unit_id=1, requester_id=1, type=AgendaType.saida, start_at=now, end_at=now + timedelta(hours=1), description=""))
+    session.commit()
+    yield session
+    load_index.invalidate()
+
+
+def _coverages(n: int, unit_id: int = 1) -> list[Coverage]:
+    return [Coverage(unit_id=unit_id, from_agenda_id=1, title=f"Cobertura {i}") for i in range(n)]
+
+
+def test_least_loaded_breaks_ties_by_id():
+    index = LoadIndex(60)
+    assert LeastLoaded().choose(index, 1) is None
+    index.loads = {7: 1.0, 3: 0.5, 5: 0.5}
+    assert LeastLoaded().choose(index, 1) == 3
+
+
+def test_round_robin_cycles_per_unit():
+    index = LoadIndex(60)
+    assert RoundRobin().choose(index, 1) is None
+    index.guards = [10, 20, 30]
+    strategy = RoundRobin()
+    assert [strategy.choose(index, 1) for _ in range(4)] == [20, 30, 10, 20]
+    assert [strategy.choose(index, 2) for _ in range(2)] == [30, 10]
+
+
+def test_reload_weights_open_work(guards):
+    guards.add(Ticket(unit_id=1, opened_by=1, assigned_to=2, title="t", description=""))
+    guards.add(Coverage(unit_id=1, from_agenda_id=1, title="c", assigned_to=3))
+    guards.add(Coverage(unit_id=1, from_agenda_id=1, title="c", assigned_to=3, status=CoverageStatus.concluida))
+    guards.add(Round(unit_id=1, employee_id=4, location="hall"))
+    guards.add(Round(unit_id=1, employee_id=4, location="hall", happened_at=datetime.utcnow() - timedelta(days=3)))
+    guards.commit()
+    load_index.reload(guards)
+    assert load_index.loads == {2: 1.0, 3: 1.0, 4: 0.25}
+
+
+def test_least_loaded_spreads_new_coverages(guards):
+    coverages = _coverages(7)
+    assign_coverages(guards, coverages)
+    assert [cov.assigned_to for cov in coverages] == [2, 3, 4, 2, 3, 4, 2]
+    guards.add_all(coverages)
+    guards.commit()
+    # Reserved coverages are not counted again when they are committed.
+    assert load_index.loads == {2: 3.0, 3: 2.0, 4: 2.0}
+    load_index.reload(guards)
+    assert load_index.loads == {2: 3.0, 3: 2.0, 4: 2.0}
+
+
+def test_committed_updates_adjust_loads(guards):
+    coverage = _coverages(1)[0]
+    assign_coverages(guards, [coverage])
+    guards.add(coverage)
+    guards.commit()
+    coverage.status = CoverageStatus.concluida
+    guards.add(coverage)
+    guards.commit()
+    assert load_index.loads == {2: 0.0, 3: 0.0, 4: 0.0}
+
+
+def test_rolled_back_reservations_reload_the_index(guards):
+    assign_coverages(guards, _coverages(2))
+    assert load_index.loads[2] == 1.0
+    guards.rollback()
+    assign_coverages(guards, [])
+    load_index.ensure(guards)
+    assert load_index.loads == {2: 0.0, 3: 0.0, 4: 0.0}
+
+
+def test_preassigned_coverages_are_kept(guards):
+    coverages = _coverages(2)
+    coverages[0].assigned_to = 4
+    assign_coverages(guards, coverages)
+    assert [cov.assigned_to for cov in coverages] == [4, 2]
+
+
+def test_rebalance_moves_unassigned_and_inactive_only(guards):
+    guards.add_all([
+        Coverage(unit_id=1, from_agenda_id=1, title="sem guarda"),
+        Coverage(unit_id=1, from_agenda_id=1, title="inativo", assigned_to=5),
+        Coverage(unit_id=1, from_agenda_id=1, title="ativo", assigned_to=3),
+        Coverage(unit_id=1, from_agenda_id=1, title="concluída", status=CoverageStatus.concluida),
+    ])
+    guards.commit()
+    assert rebalance(guards, batch_size=1) == 2
+    guards.commit()
+    assigned = dict(guards.exec(select(Coverage.title, Coverage.assigned_to)).all())
+    assert assigned == {"sem guarda": 2, "inativo": 4, "ativo": 3, "concluída": None}
+
+
+def test_no_strategy_leaves_coverages_alone(guards, monkeypatch):
+    monkeypatch.setattr(assignment, "strategy", None)
+    coverages = _coverages(1)
+    assign_coverages(guards, coverages)
+    assert coverages[0].assigned_to is None
+    guards.add(Coverage(unit_id=1, from_agenda_id=1, title="sem guarda"))
+    guards.commit()
+    assert rebalance(guards) == 0
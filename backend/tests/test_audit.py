@@ -0,0 +1,92 @@
+import orjson
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+from app import archive, audit
+from app.audit import AuditSink, defer_audit
+from app.models import AuditEvent, Unit
+
+
+@pytest.fixture
+def broken(engine):
+    """Makes every audit INSERT on ``engine`` fail while ``broken["on"]`` is set."""
+    state = {"on": True}
+
+    def fail(conn, cursor, statement, *args):
+        if state["on"] and statement.startswith("INSERT INTO auditevent"):
+            raise RuntimeError("database is locked")
+
+    event.listen(engine, "before_cursor_execute", fail)
+    yield state
+    event.remove(engine, "before_cursor_execute", fail)
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", tmp_path / "archive")
+    return tmp_path / "archive"
+
+
+def _actions(engine) -> list[str]:
+    with Session(engine) as session:
+        return session.exec(select(AuditEvent.action).order_by(AuditEvent.id)).all()
+
+
+def _dead_letters(directory) -> list[str]:
+    return [orjson.loads(line)["action"] for path in sorted((directory / "deadletter").glob("*.ndjson")) for line in path.read_bytes().splitlines()]
+
+
+def test_failed_flush_keeps_rows_in_order(engine, broken, archive_dir):
+    sink = AuditSink(engine, max_attempts=3)
+    for n in range(3):
+        sink.enqueue(action=f"a{n}", entity="unit")
+    assert sink.flush() == 0
+    sink.enqueue(action="a3", entity="unit")
+    broken["on"] = False
+    assert sink.flush() == 4
+    assert _actions(engine) == ["a0", "a1", "a2", "a3"]
+    assert not (archive_dir / "deadletter").exists()
+
+
+def test_batch_goes_to_dead_letter_after_max_attempts(engine, broken, archive_dir):
+    sink = AuditSink(engine, max_attempts=2)
+    sink.enqueue(action="bad", entity="unit")
+    sink.flush()
+    assert sink._backoff() == 2 * sink.flush_interval
+    sink.flush()
+    assert len(sink._pending) == 0 and not sink._failures
+    assert _dead_letters(archive_dir) == ["bad"]
+    broken["on"] = False
+    sink.enqueue(action="good", entity="unit")
+    assert sink.flush() == 1
+    assert _actions(engine) == ["good"]
+
+
+def test_full_queue_spills_to_dead_letter(engine, archive_dir):
+    sink = AuditSink(engine, max_pending=2)
+    for n in range(3):
+        sink.enqueue(action=f"a{n}", entity="unit")
+    assert _dead_letters(archive_dir) == ["a2"]
+    assert sink.flush() == 2
+
+
+def test_stop_does_not_raise_and_keeps_unwritten_rows(engine, broken, archive_dir):
+    sink = AuditSink(engine)
+    sink.enqueue(action="late", entity="unit")
+    sink.stop()
+    assert _dead_letters(archive_dir) == ["late"]
+
+
+def test_rows_reach_the_sink_only_on_commit(engine, monkeypatch):
+    sink = AuditSink(engine)
+    monkeypatch.setattr(audit, "audit_sink", sink)
+    with Session(engine) as session:
+        session.add(Unit(code="A1", owner_name="Ana"))
+        defer_audit(session, [{"action": "rolled_back", "entity": "unit"}])
+        session.flush()
+        session.rollback()
+        defer_audit(session, [{"action": "committed", "entity": "unit"}])
+        assert not sink._pending
+        session.commit()
+    sink.flush()
+    assert _actions(engine) == ["committed"]
@@ -0,0 +1,37 @@
+from sqlmodel import Session
+from app.auth import user_cache
+from app.models import Role, User
+
+
+def _cache(user: User) -> tuple:
+    key = (None, user.id)
+    user_cache.put(key, user)
+    return key
+
+
+def test_user_write_evicts_on_commit_only(engine):
+    with Session(engine) as session:
+        user = User(name="Ana", email="ana@x.com.br", password_hash="x", role=Role.funcionario)
+        session.add(user)
+        session.commit()
+        key = _cache(user)
+        user.active = False
+        session.add(user)
+        session.flush()
+        assert user_cache.get(key).active
+        session.commit()
+    assert user_cache.get(key) is None
+
+
+def test_rolled_back_write_keeps_entry(engine):
+    with Session(engine) as session:
+        user = User(name="Bia", email="bia@x.com.br", password_hash="x", role=Role.funcionario)
+        session.add(user)
+        session.commit()
+        key = _cache(user)
+        user.name = "Beatriz"
+        session.add(user)
+        session.flush()
+        session.rollback()
+        session.commit()
+    assert user_cache.get(key).name == "Bia"
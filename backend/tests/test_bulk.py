@@ -0,0 +1,126 @@
+import io
+import pytest
+from sqlalchemy import insert
+from sqlmodel import select
+from app import bulk
+from app.bulk import BulkEntity, BulkFormat, import_rows, read_rows
+from app.config import settings
+from app.models import Agenda, AuditEvent, Payment, Role, Unit, User
+
+
+@pytest.fixture
+def admin(session):
+    user = User(name="Admin", email="admin@x.com.br", password_hash="x", role=Role.admin)
+    session.add(user)
+    session.commit()
+    return user
+
+
+def _import(session, admin, entity: BulkEntity, text: str, fmt: BulkFormat, batch_size: int = 2) -> dict:
+    return import_rows(session, entity, read_rows(io.BytesIO(text.encode("utf-8")), fmt), admin, batch_size=batch_size)
+
+
+def _lines(report: dict) -> dict[int, list]:
+    return {error["line"]: [(e["field"], e["message"]) for e in error["errors"]] for error in report["errors"]}
+
+
+def test_csv_units_report_bad_rows_by_line(session, admin):
+    session.add(Unit(code="900", owner_name="Zé"))
+    session.commit()
+    text = "code,owner_name\n101,Ana\n102\n101,Bia\n900,Caio\n103,Duda,extra\n104,Edu\n"
+    report = _import(session, admin, BulkEntity.units, text, BulkFormat.csv)
+    assert (report["inserted"], report["failed"]) == (2, 4)
+    errors = _lines(report)
+    assert sorted(errors) == [3, 4, 5, 6]
+    assert errors[3][0][0] == "owner_name"
+    assert errors[4] == [("code", "Código de unidade já cadastrado")]
+    assert errors[5] == [("code", "Código de unidade já cadastrado")]
+    assert errors[6] == [(None, "Colunas a mais na linha")]
+    assert session.exec(select(Unit.code).order_by(Unit.code)).all() == ["101", "104", "900"]
+    # One audit event per committed batch with rows.
+    assert len(session.exec(select(AuditEvent).where(AuditEvent.action == "import")).all()) == 2
+
+
+def test_ndjson_skips_blank_lines_and_reports_bad_json(session, admin):
+    text = '{"code": "101", "owner_name": "Ana"}\n\nnot json\n[1, 2]\n{"code": "102", "owner_name": "Bia"}\n'
+    report = _import(session, admin, BulkEntity.units, text, BulkFormat.ndjson)
+    assert report["inserted"] == 2
+    assert _lines(report) == {3: [(None, "JSON inválido")], 4: [(None, "Cada linha deve ser um objeto JSON")]}
+
+
+def test_payments_for_unknown_units_fail(session, admin):
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.commit()
+    text = "unit_id,due_date,amount\n1,2026-01-10,100\n7,2026-01-10,100\n1,2026-13-10,100\n1,2026-02-10,100\n"
+    report = _import(session, admin, BulkEntity.payments, text, BulkFormat.csv)
+    assert report["inserted"] == 2
+    errors = _lines(report)
+    assert errors[3] == [("unit_id", "Unidade não encontrada")]
+    assert errors[4][0][0] == "due_date"
+    assert len(session.exec(select(Payment)).all()) == 2
+
+
+def test_users_are_hashed_and_duplicates_rejected(session, admin):
+    text = "\n".join([
+        '{"name": "Ana", "email": "ana@x.com.br", "password": "segredo1", "role": "morador"}',
+        '{"name": "Ana 2", "email": "ana@x.com.br", "password": "segredo2", "role": "morador"}',
+        '{"name": "Bia", "email": "admin@x.com.br", "password": "segredo3", "role": "morador"}',
+        '{"name": "Caio", "email": "caio", "password": "segredo4", "role": "morador"}',
+        '{"name": "Duda", "email": "duda@x.com.br", "password": "curta", "role": "morador"}',
+    ])
+    report = _import(session, admin, BulkEntity.users, text, BulkFormat.ndjson)
+    assert (report["inserted"], report["failed"]) == (1, 4)
+    errors = _lines(report)
+    assert errors[2] == errors[3] == [("email", "E-mail já cadastrado")]
+    assert errors[4][0][0] == "email" and errors[5][0][0] == "password"
+    ana = session.exec(select(User).where(User.email == "ana@x.com.br")).one()
+    assert ana.password_hash not in ("", "segredo1")
+
+
+def test_agenda_rows_conflicting_in_same_batch_fail(session, admin):
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.commit()
+    text = (
+        "unit_id,type,start_at,end_at,description\n"
+        "1,visita,2030-01-01T10:00,2030-01-01T11:00,a\n"
+        "1,visita,2030-01-01T10:30,2030-01-01T11:30,b\n"
+        "1,visita,2030-01-01T12:00,2030-01-01T11:00,c\n"
+        "1,visita,2030-01-01T11:00,2030-01-01T12:00,d\n"
+    )
+    report = _import(session, admin, BulkEntity.agenda, text, BulkFormat.csv, batch_size=10)
+    assert report["inserted"] == 2
+    assert _lines(report) == {3: [("start_at", "Conflito de agenda para a unidade (interval overlap)")], 4: [("end_at", "Data final deve ser posterior à inicial")]}
+    assert session.exec(select(Agenda.description).order_by(Agenda.id)).all() == ["a", "d"]
+
+
+def test_failed_commit_reports_whole_batch_once(session, admin, monkeypatch):
+    write = bulk.WRITERS[BulkEntity.units]
+
+    def racing(session, batch, report, user):
+        lines = write(session, batch, report, user)
+        # Another request inserts one of the codes before this batch commits.
+        session.exec(insert(Unit), params=[{"code": "102", "owner_name": "Outro"}])
+        return lines
+
+    monkeypatch.setitem(bulk.WRITERS, BulkEntity.units, racing)
+    text = "code,owner_name\n900,Zé\n101,Ana\n102,Bia\n900,Caio\n"
+    report = _import(session, admin, BulkEntity.units, text, BulkFormat.csv, batch_size=4)
+    assert (report["inserted"], report["failed"]) == (0, 4)
+    assert _lines(report) == {line: [(None, "Conflito ao gravar o lote")] for line in (2, 3, 4, 5)}
+    assert session.exec(select(Unit)).all() == []
+
+
+def test_error_list_is_truncated(session, admin, monkeypatch):
+    monkeypatch.setattr(settings, "bulk_max_errors", 3)
+    report = _import(session, admin, BulkEntity.units, "code\n" + "1\n" * 10, BulkFormat.csv)
+    assert report["failed"] == 10
+    assert len(report["errors"]) == 3
+    assert report["errors_truncated"]
+
+
+@pytest.mark.parametrize("fmt", [BulkFormat.csv, BulkFormat.ndjson])
+def test_invalid_utf8_stops_with_one_error(fmt):
+    rows = list(read_rows(io.BytesIO(b"\xff\xfe\n"), fmt))
+    assert len(rows) == 1
+    line, row, error = rows[0]
+    assert row is None and error.startswith("Arquivo inválido")
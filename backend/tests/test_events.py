@@ -0,0 +1,73 @@
+from sqlalchemy import insert
+from sqlmodel import Session
+from app.events import DatabaseBackend, EventBroker, visible
+from app.models import Role, StreamEvent, Ticket, Unit, User
+
+
+class Collector(EventBroker):
+    def __init__(self):
+        super().__init__(100)
+        self.delivered: list[int] = []
+
+    def deliver(self, items):
+        self.delivered += [item["id"] for item in items]
+
+
+def _event(session, row_id: int) -> None:
+    session.exec(insert(StreamEvent), params=[{"id": row_id, "entity": "ticket", "op": "update", "payload": "{}"}])
+    session.commit()
+
+
+def test_poll_delivers_ids_committed_out_of_order(engine):
+    broker = Collector()
+    backend = DatabaseBackend(broker, engine, poll_interval=1, retention=1000)
+    with Session(engine) as session:
+        _event(session, 1)
+        _event(session, 3)
+        backend.poll()
+        assert broker.delivered == [1, 3]
+        _event(session, 2)
+        _event(session, 4)
+        backend.poll()
+    assert broker.delivered == [1, 3, 2, 4]
+    assert backend._gaps == {} and backend.last_id() == 4
+
+
+def test_gaps_are_given_up_after_timeout(engine):
+    backend = DatabaseBackend(Collector(), engine, poll_interval=1, retention=1000, gap_timeout=0)
+    with Session(engine) as session:
+        _event(session, 5)
+    backend.poll()
+    assert list(backend._gaps) == [1, 2, 3, 4]
+    backend.poll()
+    assert backend._gaps == {}
+
+
+def _users():
+    return {n: User(id=n, name=str(n), email=f"{n}@x.com.br", password_hash="", role=Role.funcionario) for n in (1, 2, 3)}
+
+
+def test_reassigned_ticket_is_removed_from_previous_lists(engine, monkeypatch):
+    from app import events
+
+    recorded = []
+    monkeypatch.setattr(events.broker.backend, "record", lambda session, items: recorded.extend(items))
+    with Session(engine) as session:
+        session.add(Unit(id=1, code="A1", owner_name="Ana"))
+        for user in _users().values():
+            session.add(user)
+        ticket = Ticket(unit_id=1, opened_by=1, title="t", description="")
+        session.add(ticket)
+        session.commit()
+        ticket_id = ticket.id
+        ticket.assigned_to = 2
+        session.add(ticket)
+        session.flush()
+        ticket.assigned_to = 3
+        session.add(ticket)
+        session.commit()
+    removals = [item for item in recorded if item["op"] == "remove"]
+    assert [item["data"] for item in removals] == [{"id": ticket_id, "from": None, "to": 2}, {"id": ticket_id, "from": 2, "to": 3}]
+    users = _users()
+    assert [n for n in users if visible(users[n], removals[0])] == [1, 3]
+    assert [n for n in users if visible(users[n], removals[1])] == [2]
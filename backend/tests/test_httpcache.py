@@ -0,0 +1,31 @@
+from sqlalchemy import event
+from sqlmodel import Session
+from app.httpcache import table_versions
+from app.models import AuditEvent, Unit
+
+
+def test_commit_bumps_written_tables_once(engine):
+    updates = []
+
+    def track(conn, cursor, statement, *args):
+        if statement.startswith("UPDATE tableversion"):
+            updates.append(statement)
+
+    event.listen(engine, "before_cursor_execute", track)
+    with Session(engine) as session:
+        session.add(Unit(code="A1", owner_name="Ana"))
+        session.flush()
+        session.add(AuditEvent(action="create", entity="unit"))
+        assert updates == []
+        session.commit()
+        assert table_versions(session, ("unit", "auditevent", "agenda")) == (1, 1, 0)
+    event.remove(engine, "before_cursor_execute", track)
+    assert len(updates) == 1
+
+
+def test_rollback_bumps_nothing(session):
+    session.add(Unit(code="A1", owner_name="Ana"))
+    session.flush()
+    session.rollback()
+    session.commit()
+    assert table_versions(session, ("unit",)) == (0,)
@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, time, timedelta
+import pytest
+from sqlmodel import select
+from app.lockwindows import LockSchedule, reevaluate_pending_agendas
+from app.models import Agenda, AgendaStatus, AgendaType, LockWindow, Role, Unit, User
+
+DAY = datetime(2026, 3, 10)
+
+
+def _schedule(*spans, disabled=()) -> LockSchedule:
+    windows = [LockWindow(start_time=time(*s), end_time=time(*e)) for s, e in spans]
+    windows += [LockWindow(start_time=time(*s), end_time=time(*e), enabled=False) for s, e in disabled]
+    return LockSchedule(windows)
+
+
+def _locked_minute(spans, moment: datetime) -> bool:
+    minute = moment.hour * 60 + moment.minute
+    for (sh, sm), (eh, em) in spans:
+        s, e = sh * 60 + sm, eh * 60 + em
+        if (s <= minute < e) if s < e else (s > e and (minute >= s or minute < e)):
+            return True
+    return False
+
+
+def test_overlapping_and_touching_windows_merge():
+    schedule = _schedule(((8, 0), (10, 0)), ((9, 0), (11, 0)), ((11, 0), (12, 0)), ((14, 0), (15, 0)))
+    assert schedule.intervals[:2] == [(8 * 3600, 12 * 3600), (14 * 3600, 15 * 3600)]
+    assert len(schedule.intervals) == 4
+
+
+def test_window_wrapping_midnight_is_split():
+    schedule = _schedule(((22, 0), (6, 0)))
+    assert schedule.intervals[:2] == [(0, 6 * 3600), (22 * 3600, 86400)]
+    assert schedule.blocks(DAY.replace(hour=23), DAY.replace(hour=23, minute=30))
+    assert schedule.blocks(DAY.replace(hour=5), DAY.replace(hour=5, minute=30))
+    assert not schedule.blocks(DAY.replace(hour=12), DAY.replace(hour=13))
+
+
+def test_disabled_and_empty_windows_never_block():
+    schedule = _schedule(((10, 0), (10, 0)), disabled=[((0, 0), (23, 59))])
+    assert schedule.intervals == []
+    assert not schedule.blocks(DAY, DAY + timedelta(days=3))
+
+
+def test_booking_edges_are_half_open():
+    schedule = _schedule(((10, 0), (12, 0)))
+    assert not schedule.blocks(DAY.replace(hour=9), DAY.replace(hour=10))
+    assert not schedule.blocks(DAY.replace(hour=12), DAY.replace(hour=13))
+    assert schedule.blocks(DAY.replace(hour=9), DAY.replace(hour=10, microsecond=1))
+    assert not schedule.blocks(DAY.replace(hour=11), DAY.replace(hour=11))
+
+
+def test_booking_spanning_window_and_midnight():
+    schedule = _schedule(((2, 0), (3, 0)))
+    # Starts after today's window, ends after tomorrow's has begun.
+    assert schedule.blocks(DAY.replace(hour=20), DAY.replace(hour=2, minute=30) + timedelta(days=1))
+    assert not schedule.blocks(DAY.replace(hour=20), DAY.replace(hour=1, minute=59) + timedelta(days=1))
+    assert schedule.blocks(DAY.replace(hour=1), DAY.replace(hour=4))
+    assert schedule.blocks(DAY.replace(hour=3, minute=1), DAY.replace(hour=3) + timedelta(days=1))
+
+
+def test_full_day_booking_always_blocks():
+    schedule = _schedule(((2, 0), (2, 1)))
+    assert schedule.blocks(DAY.replace(hour=3), DAY.replace(hour=3) + timedelta(days=1))
+
+
+def test_blocks_matches_brute_force():
+    rng = random.Random(3)
+    for _ in range(40):
+        spans = [((rng.randrange(24), rng.choice([0, 30])), (rng.randrange(24), rng.choice([0, 30]))) for _ in range(rng.randint(1, 4))]
+        schedule = _schedule(*spans)
+        for _ in range(50):
+            start = DAY + timedelta(minutes=rng.randrange(24 * 60))
+            end = start + timedelta(minutes=rng.randint(1, 23 * 60))
+            minutes = int((end - start).total_seconds() // 60)
+            expected = any(_locked_minute(spans, start + timedelta(minutes=m)) for m in range(minutes))
+            assert schedule.blocks(start, end) == expected, (spans, start, end)
+        assert schedule.blocks_many([(DAY, DAY + timedelta(hours=1))]) == [schedule.blocks(DAY, DAY + timedelta(hours=1))]
+
+
+def test_split_marks_locked_pieces():
+    schedule = _schedule(((22, 0), (6, 0)), ((12, 0), (13, 0)))
+    pieces = schedule.split(DAY.replace(hour=10), DAY.replace(hour=8) + timedelta(days=1))
+    night = DAY + timedelta(days=1)
+    assert pieces == [
+        (DAY.replace(hour=10), DAY.replace(hour=12), False),
+        (DAY.replace(hour=12), DAY.replace(hour=13), True),
+        (DAY.replace(hour=13), DAY.replace(hour=22), False),
+        # The wrapping window stays one piece across midnight.
+        (DAY.replace(hour=22), night.replace(hour=6), True),
+        (night.replace(hour=6), night.replace(hour=8), False),
+    ]
+
+
+@pytest.mark.parametrize("hour", [0, 7, 23])
+def test_split_without_windows_is_one_free_piece(hour):
+    start = DAY.replace(hour=hour)
+    assert _schedule().split(start, start + timedelta(hours=5)) == [(start, start + timedelta(hours=5), False)]
+
+
+def test_reevaluate_approves_only_unblocked_visits(session):
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.add(User(name="Ana", email="ana@x.com.br", password_hash="x", role=Role.morador, unit_id=1))
+    day = datetime.combine(datetime.now().date() + timedelta(days=2), time())
+    bookings = [
+        (AgendaType.visita, day.replace(hour=23), day.replace(hour=23, minute=30)),
+        (AgendaType.visita, day.replace(hour=14), day.replace(hour=15)),
+        (AgendaType.mudanca, day.replace(hour=9), day.replace(hour=10)),
+        (AgendaType.visita, day.replace(hour=9) - timedelta(days=5), day.replace(hour=10) - timedelta(days=5)),
+    ]
+    session.add_all(Agenda(unit_id=1, requester_id=1, type=kind, start_at=s, end_at=e, description="", requires_approval=True) for kind, s, e in bookings)
+    session.commit()
+    assert reevaluate_pending_agendas(session, _schedule(((22, 0), (6, 0))), batch_size=1) == 1
+    session.commit()
+    statuses = session.exec(select(Agenda.status).order_by(Agenda.id)).all()
+    assert statuses == [AgendaStatus.pendente, AgendaStatus.aprovado, AgendaStatus.pendente, AgendaStatus.pendente]
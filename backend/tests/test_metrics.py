@@ -0,0 +1,36 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+from app.metrics import RequestStats, current
+
+
+def test_failed_query_does_not_leak_start_time(engine):
+    token = current.set(RequestStats())
+    try:
+        with Session(engine) as session:
+            conn = session.connection()
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    session.exec(text("SELECT * FROM missing_table"))
+                session.rollback()
+                conn = session.connection()
+            session.exec(text("SELECT 1"))
+            assert not conn.info.get("query_started")
+        assert current.get().queries == 4
+    finally:
+        current.reset(token)
+
+
+def test_metrics_without_token_only_for_local_clients():
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from app.main import metrics
+
+    def request(host: str) -> Request:
+        return Request({"type": "http", "method": "GET", "path": "/metrics", "headers": [], "client": (host, 4000)})
+
+    assert metrics(request("127.0.0.1")).status_code == 200
+    with pytest.raises(HTTPException) as exc:
+        metrics(request("203.0.113.7"))
+    assert exc.value.status_code == 403
@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlmodel import select
+from app.models import Payment, PaymentStatus, Unit
+from app.pagination import paginate
+from app.serialization import columns
+
+
+@pytest.fixture
+def payments(session):
+    """90 payments sharing 10 due dates, so the sort column has ties."""
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.commit()
+    rows = [{"unit_id": 1, "due_date": date(2026, 1, 1) + timedelta(days=n % 10), "amount": float(n), "status": PaymentStatus.pendente} for n in range(90)]
+    session.exec(insert(Payment), params=rows)
+    session.commit()
+    return session
+
+
+def _walk(session, query, limit: int, **options) -> list:
+    items, cursor = [], None
+    while True:
+        page = paginate(session, query, Payment, cursor=cursor, limit=limit, **options)
+        assert len(page["items"]) <= limit
+        items += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+@pytest.mark.parametrize("limit", [1, 9, 10, 90, 200])
+@pytest.mark.parametrize("descending", [False, True])
+def test_id_pages_cover_table_once(payments, limit, descending):
+    ids = [row.id for row in _walk(payments, select(Payment), limit, descending=descending)]
+    assert ids == sorted(range(1, 91), reverse=descending)
+
+
+@pytest.mark.parametrize("limit", [1, 7, 10, 90])
+@pytest.mark.parametrize("descending", [False, True])
+def test_ties_on_sort_column_break_by_id(payments, limit, descending):
+    rows = _walk(payments, select(Payment), limit, sort=Payment.due_date, descending=descending)
+    keys = [(row.due_date, row.id) for row in rows]
+    assert keys == sorted(keys, reverse=descending)
+    assert len(set(keys)) == 90
+
+
+def test_column_select_returns_dicts(payments):
+    page = paginate(payments, select(*columns(Payment)).where(Payment.amount >= 80), Payment, cursor=None, limit=5)
+    assert [item["amount"] for item in page["items"]] == [80.0, 81.0, 82.0, 83.0, 84.0]
+    rest = paginate(payments, select(*columns(Payment)).where(Payment.amount >= 80), Payment, cursor=page["next_cursor"], limit=5)
+    assert [item["amount"] for item in rest["items"]] == [85.0, 86.0, 87.0, 88.0, 89.0]
+    assert rest["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", ["nope", "WzFd", "WyJ4IiwgMV0="])
+def test_invalid_cursor_is_400(payments, cursor):
+    with pytest.raises(HTTPException) as exc:
+        paginate(payments, select(Payment), Payment, cursor=cursor, limit=5, sort=Payment.due_date)
+    assert exc.value.status_code == 400
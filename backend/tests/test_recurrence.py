@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlmodel import select
+from app.models import Agenda, AgendaException, AgendaType, RecurrenceFreq, Role, Unit, User
+from app.recurrence import agenda_page, last_end, occurrences, overlaps, rule_error
+from app.schemas import AgendaCreate
+from app.serialization import columns
+
+START = datetime(2026, 1, 31, 10, 0)
+
+
+def _booking(freq=None, until=None, interval=1, hours=1, start=START, type=AgendaType.visita) -> AgendaCreate:
+    return AgendaCreate(unit_id=1, type=type, start_at=start, end_at=start + timedelta(hours=hours), description="", recurrence=freq, recurrence_interval=interval, recurrence_until=until)
+
+
+def _starts(row, start, end, cancelled=frozenset()) -> list[datetime]:
+    return [s for s, _ in occurrences(row, start, end, cancelled)]
+
+
+def test_single_booking_has_one_occurrence():
+    row = _booking()
+    assert list(occurrences(row, START - timedelta(days=1), START + timedelta(days=1))) == [(START, START + timedelta(hours=1))]
+    assert _starts(row, START + timedelta(hours=1), START + timedelta(days=1)) == []
+    assert last_end(row) == row.end_at
+
+
+def test_weekly_every_two_weeks_jumps_to_window():
+    row = _booking(RecurrenceFreq.weekly, until=START + timedelta(days=70), interval=2)
+    window = START + timedelta(days=30)
+    assert _starts(row, window, window + timedelta(days=30)) == [START + timedelta(days=d) for d in (42, 56)]
+    assert last_end(row) == START + timedelta(days=70, hours=1)
+
+
+def test_occurrence_overlapping_window_start_is_included():
+    row = _booking(RecurrenceFreq.daily, until=START + timedelta(days=5), hours=3)
+    window = START + timedelta(days=2, hours=2)
+    assert _starts(row, window, window + timedelta(hours=1)) == [START + timedelta(days=2)]
+    # Ending exactly at the window start is not an overlap.
+    assert _starts(row, START + timedelta(days=2, hours=3), START + timedelta(days=2, hours=4)) == []
+
+
+def test_monthly_clamps_to_month_end():
+    row = _booking(RecurrenceFreq.monthly, until=datetime(2026, 6, 1))
+    assert [s.date().isoformat() for s in _starts(row, datetime(2026, 1, 1), datetime(2027, 1, 1))] == [
+        "2026-01-31", "2026-02-28", "2026-03-31", "2026-04-30", "2026-05-31",
+    ]
+    assert last_end(row) == datetime(2026, 5, 31, 11, 0)
+    assert _starts(row, datetime(2026, 4, 1), datetime(2026, 4, 30)) == []
+
+
+@pytest.mark.parametrize("freq", list(RecurrenceFreq))
+@pytest.mark.parametrize("interval", [1, 3])
+def test_last_end_matches_expansion(freq, interval):
+    row = _booking(freq, until=START + timedelta(days=200), interval=interval)
+    every = _starts(row, START - timedelta(days=1), row.recurrence_until + timedelta(days=400))
+    assert every[0] == START and every[-1] <= row.recurrence_until
+    assert last_end(row) == every[-1] + timedelta(hours=1)
+
+
+def test_cancelled_starts_are_skipped():
+    row = _booking(RecurrenceFreq.daily, until=START + timedelta(days=3))
+    assert _starts(row, START, START + timedelta(days=10), {START + timedelta(days=1)}) == [START, START + timedelta(days=2), START + timedelta(days=3)]
+
+
+@pytest.mark.parametrize(
+    "booking, field",
+    [
+        (_booking(RecurrenceFreq.weekly, type=AgendaType.saida, until=START + timedelta(days=7)), "recurrence"),
+        (_booking(RecurrenceFreq.weekly), "recurrence_until"),
+        (_booking(RecurrenceFreq.weekly, until=START - timedelta(days=1)), "recurrence_until"),
+        (_booking(RecurrenceFreq.daily, until=START + timedelta(days=5000)), "recurrence_until"),
+        (_booking(RecurrenceFreq.daily, until=START + timedelta(days=5), hours=25), "end_at"),
+        (_booking(RecurrenceFreq.weekly, until=START + timedelta(days=7)), None),
+        (_booking(), None),
+    ],
+)
+def test_rule_error(booking, field):
+    error = rule_error(booking)
+    assert (error[0] if error else None) == field
+
+
+def test_overlaps_between_series_and_singles():
+    weekly = _booking(RecurrenceFreq.weekly, until=START + timedelta(days=60))
+    assert overlaps(weekly, _booking(start=START + timedelta(days=14, minutes=30)))
+    assert not overlaps(weekly, _booking(start=START + timedelta(days=15)))
+    assert not overlaps(weekly, _booking(start=START + timedelta(days=70)))
+    daily = _booking(RecurrenceFreq.daily, start=START + timedelta(days=20, hours=-1), until=START + timedelta(days=30), hours=1)
+    assert not overlaps(weekly, daily)
+    assert overlaps(weekly, _booking(RecurrenceFreq.daily, start=daily.start_at + timedelta(minutes=1), until=daily.recurrence_until))
+
+
+@pytest.fixture
+def agenda(session):
+    """Two singles, a weekly series with one cancelled occurrence and a daily one."""
+    session.add(Unit(code="101", owner_name="Ana"))
+    session.add(User(name="Ana", email="ana@x.com.br", password_hash="x", role=Role.morador, unit_id=1))
+    rows = [
+        _booking(start=START + timedelta(days=3)),
+        _booking(start=START + timedelta(days=7)),
+        _booking(RecurrenceFreq.weekly, until=START + timedelta(days=35)),
+        _booking(RecurrenceFreq.daily, start=START + timedelta(days=6), until=START + timedelta(days=9)),
+    ]
+    for data in rows:
+        session.add(Agenda(**data.model_dump(), requester_id=1, series_end_at=last_end(data) if data.recurrence else None))
+    session.add(AgendaException(agenda_id=3, occurrence_at=START + timedelta(days=14)))
+    session.commit()
+    return session
+
+
+def _walk(session, limit: int, date_from=None, date_to=None) -> list[tuple]:
+    items, cursor = [], None
+    while True:
+        page = agenda_page(session, select(*columns(Agenda)), cursor=cursor, limit=limit, date_from=date_from, date_to=date_to)
+        assert len(page["items"]) <= limit
+        items += [(item["start_at"], item["id"]) for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+def test_agenda_page_expands_series_in_order(agenda):
+    day = lambda n: START + timedelta(days=n)
+    expected = [(day(0), 3), (day(3), 1), (day(6), 4), (day(7), 2), (day(7), 3), (day(7), 4), (day(8), 4), (day(9), 4), (day(21), 3), (day(28), 3), (day(35), 3)]
+    for limit in (1, 2, 3, 11, 50):
+        assert _walk(agenda, limit) == expected
+    assert _walk(agenda, 2, date_from=day(7), date_to=day(9)) == [(day(7), 2), (day(7), 3), (day(7), 4), (day(8), 4)]
@@ -0,0 +1,89 @@
+import hashlib
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from app.auth import create_access_token
+from app.blobs import blob_relpath
+from app.config import settings
+from app.db import engine
+from app.main import app
+from app.migrations import migrate
+from app.models import Role, Round, RoundPhoto, Unit, User
+from app.uploads import STORAGE_DIR
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture(scope="module")
+def client():
+    migrate(engine)
+    with Session(engine) as session:
+        admin = User(name="Admin", email="upload-admin@x.com.br", password_hash="x", role=Role.admin)
+        unit = Unit(code="UP1", owner_name="Ana")
+        session.add(admin); session.add(unit); session.flush()
+        session.add(Round(unit_id=unit.id, employee_id=admin.id, location="Portaria"))
+        session.commit()
+        token = create_access_token(admin.email, user_id=admin.id)
+    return TestClient(app, headers={"Authorization": f"Bearer {token}"})
+
+
+def _round() -> int:
+    with Session(engine) as session:
+        return session.exec(select(Round.id)).first()
+
+
+def test_photos_are_stored(client):
+    response = client.post(f"/rounds/{_round()}/photos", files=[("files", ("a.png", PNG + b"a", "image/png")), ("files", ("b.png", PNG + b"b", "image/png"))])
+    assert response.status_code == 200, response.text
+    assert len(response.json()["files"]) == 2
+
+
+def test_too_many_files_are_refused_while_parsing(client, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_files", 2)
+    files = [("files", (f"{n}.png", PNG + bytes([n]), "image/png")) for n in range(3)]
+    response = client.post(f"/rounds/{_round()}/photos", files=files)
+    assert response.status_code == 413
+
+
+def test_content_length_over_the_limit_is_refused_before_reading(client, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_files", 1)
+    monkeypatch.setattr(settings, "upload_max_bytes", 10)
+    response = client.post(f"/rounds/{_round()}/photos", files=[("files", ("a.png", PNG * 400, "image/png"))])
+    assert response.status_code == 413
+
+
+def test_oversized_file_stores_nothing(client, monkeypatch):
+    monkeypatch.setattr(settings, "upload_max_bytes", len(PNG) + 1)
+    before = {path for path in STORAGE_DIR.rglob("*") if path.is_file()}
+    with Session(engine) as session:
+        photos = len(session.exec(select(RoundPhoto.id)).all())
+    files = [("files", ("ok.png", PNG + b"c", "image/png")), ("files", ("big.png", PNG + b"toolarge", "image/png"))]
+    response = client.post(f"/rounds/{_round()}/photos", files=files)
+    assert response.status_code == 413
+    assert {path for path in STORAGE_DIR.rglob("*") if path.is_file()} == before
+    with Session(engine) as session:
+        assert len(session.exec(select(RoundPhoto.id)).all()) == photos
+
+
+def test_failed_store_removes_files_created_by_the_request(client, monkeypatch):
+    from app import blobs
+
+    real = blobs._store
+    calls = []
+
+    def flaky(source, *args):
+        calls.append(1)
+        if len(calls) == 2:
+            raise OSError("disco cheio")
+        return real(source, *args)
+
+    monkeypatch.setattr(blobs, "_store", flaky)
+    files = [("files", ("d.png", PNG + b"d", "image/png")), ("files", ("e.png", PNG + b"e", "image/png"))]
+    with pytest.raises(OSError):
+        client.post(f"/rounds/{_round()}/photos", files=files)
+    assert not (STORAGE_DIR / blob_relpath(hashlib.sha256(PNG + b"d").hexdigest(), ".png")).exists()
+
+
+def test_logo_must_be_an_image(client):
+    response = client.post("/admin/public-config/logo", files={"file": ("logo.svg", b"<svg/>", "image/svg+xml")})
+    assert response.status_code == 415
@@ -0,0 +1,21 @@
+import { useEffect, useRef } from 'react'
+import { api } from './client'
+
+export type ChangeEvent = { entity: string; op: string; data: any }
+
+// Subscribes to /events for the given entities. The browser reconnects on its
+// own and sends Last-Event-ID, so missed events are replayed; a "reset" event
+// means they could not be and the caller should reload.
+export function useEvents(entities: string[], onEvent: (e: ChangeEvent) => void) {
+  const handler = useRef(onEvent)
+  handler.current = onEvent
+  const key = entities.join(',')
+  useEffect(() => {
+    const token = localStorage.getItem('token')
+    if (!token || !key) return
+    const source = new EventSource(`${api.defaults.baseURL}/events?token=${encodeURIComponent(token)}`)
+    const listener = (msg: MessageEvent) => handler.current({ entity: msg.type, ...JSON.parse(msg.data) })
+    for (const name of [...key.split(','), 'reset']) source.addEventListener(name, listener as EventListener)
+    return () => source.close()
+  }, [key])
+}
@@ -1,8 +1,43 @@
 import { useEffect, useState } from 'react'
 import { api } from '../api/client'
+import { ChangeEvent, useEvents } from '../api/events'
+
+type Page = { items: any[]; next_cursor: string | null }
+const isPage = (d: any): d is Page => d && Array.isArray(d.items) && 'next_cursor' in d
+
+// Lists kept current by the event stream instead of re-fetching.
+const STREAMED: Record<string, string> = { '/agenda': 'agenda', '/tickets': 'ticket', '/coverages': 'coverage' }
 
 export default function ListPage({ title, endpoint }: { title: string; endpoint: string }) {
-  const [data, setData] = useState<any[]>([])
-  useEffect(() => { api.get(endpoint).then(r=>setData(r.data)).catch(()=>setData([])) }, [endpoint])
-  return <div><h2>{title}</h2><pre>{JSON.stringify(data, null, 2)}</pre></div>
+  const [data, setData] = useState<any>([])
+  const [cursor, setCursor] = useState<string | null>(null)
+  const [loading, setLoading] = useState(false)
+
+  const load = (next: string | null) => {
+    setLoading(true)
+    api.get(endpoint, { params: next ? { cursor: next } : {} })
+      .then(r => {
+        if (isPage(r.data)) { setData((prev: any) => next ? [...prev, ...r.data.items] : r.data.items); setCursor(r.data.next_cursor) }
+        else { setData(r.data); setCursor(null) }
+      })
+      .catch(() => { if (!next) setData([]) })
+      .finally(() => setLoading(false))
+  }
+  useEffect(() => { setData([]); setCursor(null); load(null) }, [endpoint])
+
+  const apply = (e: ChangeEvent) => {
+    if (e.entity === 'reset') return load(null)
+    // Reassigned away from this user: the row no longer belongs in the list.
+    if (e.op === 'remove') return setData((prev: any[]) => prev.filter(item => item.id !== e.data.id))
+    // Occurrences of a recurring booking share its id and differ in start_at/end_at: reload instead of patching.
+    if (e.data?.recurrence || (Array.isArray(data) && data.filter(item => item.id === e.data?.id).length > 1)) return load(null)
+    setData((prev: any[]) => {
+      const i = prev.findIndex(item => item.id === e.data.id)
+      if (i >= 0) return prev.map(item => item.id === e.data.id ? e.data : item)
+      return e.op === 'create' ? [...prev, e.data] : prev
+    })
+  }
+  useEvents(STREAMED[endpoint] ? [STREAMED[endpoint]] : [], apply)
+
+  return <div><h2>{title}</h2><pre>{JSON.stringify(data, null, 2)}</pre>{cursor && <button disabled={loading} onClick={() => load(cursor)}>Carregar mais</button>}</div>
 }